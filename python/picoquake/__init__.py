@@ -1,6 +1,73 @@
-from .interface import PicoQuake
-from .configuration import SampleRate, Filter, AccRange, GyroRange
-from .data import AcquisitionData, IMUSample
-from .plot import *
+"""
+PicoQuake USB vibration sensor library.
+
+Names are imported lazily on first access, so importing the package does not load
+the serial and plotting modules until they are used.
+"""
+
+import sys
+from importlib import import_module
+from types import ModuleType
+from typing import TYPE_CHECKING
 
 __version__ = "1.2.0"  # change also in pyproject.toml
+
+_EXPORTS = {
+    "interface": ("PicoQuake",),
+    "pool": ("DevicePool", "connect_many"),
+    "configuration": ("SampleRate", "Filter", "AccRange", "GyroRange", "Config", "ConfigEnum"),
+    "data": ("AcquisitionData", "AcquisitionMetadata", "IMUSample", "SampleArray", "DeviceInfo", "Status",
+             "State", "Gap", "PacketID", "CommandID", "CHANNELS", "parse_channels", "quantization_scales"),
+    "clock": ("ClockFit",),
+    "analisys": ("running_rms",),
+    "utils": ("get_axis_combinations",),
+    "plot": ("plot", "plot_psd", "plot_fft", "plot_spectrogram"),
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+__all__ = list(_MODULES)
+_SUBMODULES = ("analisys", "batch", "catalog", "cli", "clock", "configuration", "data", "decimation", "discovery",
+               "exceptions", "features", "filtering", "interface", "latency", "messages", "msg", "overview", "plot",
+               "pool", "protocol", "simulator", "spectral", "transport", "utils")
+
+if TYPE_CHECKING:
+    from .interface import PicoQuake
+    from .pool import DevicePool, connect_many
+    from .configuration import SampleRate, Filter, AccRange, GyroRange, Config, ConfigEnum
+    from .data import (AcquisitionData, AcquisitionMetadata, IMUSample, SampleArray, DeviceInfo, Status,
+                       State, Gap, PacketID, CommandID, CHANNELS, parse_channels, quantization_scales)
+    from .clock import ClockFit
+    from .analisys import running_rms
+    from .utils import get_axis_combinations
+    from .plot import plot, plot_psd, plot_fft, plot_spectrogram
+
+
+def __getattr__(name: str):
+    module_name = _MODULES.get(name)
+    if module_name is None:
+        if name in _SUBMODULES:
+            return import_module(f".{name}", __name__)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = import_module(f".{module_name}", __name__)
+    # importing a submodule sets it as attribute, e.g. 'plot' would be the module instead of the function
+    for export in _EXPORTS[module_name]:
+        globals()[export] = getattr(module, export)
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES) | set(_SUBMODULES))
+
+
+class _Package(ModuleType):
+    """
+    Keeps exported names which shadow submodules, e.g. 'plot', bound to the export.
+    The import system sets a submodule as attribute of the package after loading it.
+    """
+
+    def __setattr__(self, name: str, value):
+        if isinstance(value, ModuleType) and value.__name__ == f"{__name__}.{name}" and name in _MODULES:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -3,8 +3,15 @@ This module implements various data analysis functions.
 """
 
 from typing import List, Tuple, Union
+from itertools import chain
+from operator import attrgetter
 
-from .data import IMUSample
+from .data import IMUSample, SampleArray
+from .utils import import_numpy
+
+# below this number of values, converting lists to arrays costs more than computing in Python,
+# e.g. the RMS window of a trigger checked on each poll
+_NUMPY_MIN_LENGTH = 256
 
 
 def mean(data: Union[List[float], List[int]]) -> float:
@@ -12,7 +19,7 @@ def mean(data: Union[List[float], List[int]]) -> float:
     Calculate the mean of a list of values.
     
     Args:
-    data: List of values.
+    data: List of values or NumPy array.
 
     Returns:
     The mean of the values.
@@ -20,6 +27,8 @@ def mean(data: Union[List[float], List[int]]) -> float:
 
     if len(data) == 0:
         return 0
+    if _is_array(data):
+        return float(data.mean())
     return sum(data) / len(data)
 
 
@@ -28,24 +37,67 @@ def detrend(data: Union[List[float], List[int]]) -> Union[List[float], List[int]
     Remove the trend from a list of values.
     
     Args:
-    data: List of values.
+    data: List of values or NumPy array.
 
     Returns:
-    List with the trend removed.
+    List with the trend removed. NumPy array if an array was provided.
     """
 
+    if _is_array(data):
+        return detrend_array(data)
     m = mean(data)
     return [x - m for x in data]
 
 
+def detrend_array(data):
+    """
+    Remove the trend from each column of an array. Requires NumPy.
+
+    Args:
+    data: Array of shape (N,) or (N, k).
+
+    Returns:
+    Float array with the mean of each column removed.
+    """
+    import numpy as np
+    a = np.asarray(data, dtype=np.float64)
+    if a.shape[0] == 0:
+        return a
+    return a - a.mean(axis=0)
+
+
+def rms_array(data, de_trend: bool=False) -> float:
+    """
+    Calculate the root mean square of an array in one reduction. Requires NumPy.
+
+    Args:
+    data: Array of shape (N,) or (N, k).
+          For shape (N, k), the squares of the k columns are summed for each row.
+    de_trend: If True, remove the trend from each column.
+
+    Returns:
+    The root mean square of the values.
+    """
+    import numpy as np
+    a = np.asarray(data, dtype=np.float64)
+    if a.shape[0] == 0:
+        return 0
+    if de_trend:
+        a = a - a.mean(axis=0)
+    a = a.ravel()
+    return float(np.sqrt(np.dot(a, a) / len(data)))
+
+
 def rms(data: Union[Union[List[float], List[int]], Tuple[Union[List[float], List[int]], ...]],
         de_trend: bool=False) -> float:
     """
     Calculate the root mean square of a list of values.
+    Uses NumPy if available, except for short lists.
     
     Args:
-    data: List of values or a tuple of lists of values. 
+    data: List of values, a tuple of lists of values or a NumPy array.
           If a tuple is provided, the squares of the values in each list are summed.
+          For an array of shape (N, k), the squares of the k columns are summed.
     de_trend: If True, remove the trend from the data.
 
     Returns:
@@ -53,26 +105,38 @@ def rms(data: Union[Union[List[float], List[int]], Tuple[Union[List[float], List
     """
     if len(data) == 0:
         return 0
+    if _is_array(data):
+        return rms_array(data, de_trend)
     if isinstance(data, tuple):
-        new_data = [x.copy() for x in data]
+        columns = data
     elif isinstance(data, list):
-        new_data = [data.copy()]
+        columns = (data,)
     else:
         raise ValueError("Invalid data type. Must be a list or a tuple of lists.")
-    if len(set([len(x) for x in new_data])) != 1:
+    if len(set([len(x) for x in columns])) != 1:
         raise ValueError("All lists must have the same length.")
-    length = len(new_data[0])
-    if de_trend:
-        new_data = [detrend(x) for x in new_data]
-    return (sum([sum([x[i] ** 2 for x in new_data]) for i in range(length)]) / length) ** 0.5
+    np = import_numpy() if len(columns[0]) >= _NUMPY_MIN_LENGTH else None
+    if np is not None:
+        return rms_array(np.array(columns, dtype=np.float64).T, de_trend)
+    return _rms_python(columns, de_trend)
+
+
+def _rms_python(columns: Tuple[List[float], ...], de_trend: bool) -> float:
+    total = 0.0
+    for x in columns:
+        m = mean(x) if de_trend else 0.0
+        total += sum((v - m) * (v - m) for v in x)
+    return (total / len(columns[0])) ** 0.5
 
 
-def imu_rms(samples: List[IMUSample], axes: str, de_trend: bool=False) -> Tuple[float, float]:
+def imu_rms(samples: Union[List[IMUSample], SampleArray], axes: str, de_trend: bool=False) -> Tuple[float, float]:
     """
     Calculate the root mean square of the acceleration and angular velocity components for the specified axes.
+    Channels which were not acquired are skipped, RMS is 0 if none of the channels is present.
+    Uses NumPy if available, except for few samples. The RMS of all axes is then calculated in one reduction.
     
     Args:
-    samples: List of IMU samples.
+    samples: List of IMU samples or `SampleArray`.
     axes: String with the axes to calculate the RMS values. Must be a combination of 'x', 'y', and 'z'.
     de_trend: If True, remove the trend from the data.
 
@@ -83,49 +147,157 @@ def imu_rms(samples: List[IMUSample], axes: str, de_trend: bool=False) -> Tuple[
     if len(samples) == 0:
         return (0, 0)
 
-    acc_data = []
-    gyro_data = []
-    if 'x' in axes:
-        acc_x = [s.acc_x for s in samples]
-        acc_data.append(acc_x)
-        gyro_x = [s.gyro_x for s in samples]
-        gyro_data.append(gyro_x)
-    if 'y' in axes:
-        acc_y = [s.acc_y for s in samples]
-        acc_data.append(acc_y)
-        gyro_y = [s.gyro_y for s in samples]
-        gyro_data.append(gyro_y)
-    if 'z' in axes:
-        acc_z = [s.acc_z for s in samples]
-        acc_data.append(acc_z)
-        gyro_z = [s.gyro_z for s in samples]
-        gyro_data.append(gyro_z)
-
-    rms_acc = rms(tuple(acc_data), de_trend)
-    rms_gyro = rms(tuple(gyro_data), de_trend)
-    return (rms_acc, rms_gyro)
-
-
-def running_rms(data: Union[List[float], List[int]], window_size: int, de_trend:bool=False) -> List[float]:
+    if isinstance(samples, SampleArray):
+        values = samples.to_array()
+        acc_cols = [samples.channels.index(f"acc_{ax}") for ax in "xyz"
+                    if ax in axes and f"acc_{ax}" in samples.channels]
+        gyro_cols = [samples.channels.index(f"gyro_{ax}") for ax in "xyz"
+                     if ax in axes and f"gyro_{ax}" in samples.channels]
+        return (rms_array(values[:, acc_cols], de_trend) if acc_cols else 0,
+                rms_array(values[:, gyro_cols], de_trend) if gyro_cols else 0)
+
+    # channels which were not acquired are skipped
+    first = samples[0]
+    acc_names = [f"acc_{ax}" for ax in "xyz" if ax in axes and getattr(first, f"acc_{ax}") is not None]
+    gyro_names = [f"gyro_{ax}" for ax in "xyz" if ax in axes and getattr(first, f"gyro_{ax}") is not None]
+    names = acc_names + gyro_names
+    if not names:
+        return (0, 0)
+
+    np = import_numpy() if len(samples) >= _NUMPY_MIN_LENGTH else None
+    if np is None:
+        acc_data = tuple(list(map(attrgetter(name), samples)) for name in acc_names)
+        gyro_data = tuple(list(map(attrgetter(name), samples)) for name in gyro_names)
+        return (_rms_python(acc_data, de_trend) if acc_names else 0,
+                _rms_python(gyro_data, de_trend) if gyro_names else 0)
+
+    # one array of all channels, filled without intermediate lists
+    getter = attrgetter(*names) if len(names) > 1 else lambda s: (getattr(s, names[0]),)
+    block = np.fromiter(chain.from_iterable(map(getter, samples)), dtype=np.float64,
+                        count=len(samples) * len(names)).reshape(len(samples), len(names))
+    n_acc = len(acc_names)
+    return (rms_array(block[:, :n_acc], de_trend) if acc_names else 0,
+            rms_array(block[:, n_acc:], de_trend) if gyro_names else 0)
+
+
+def running_rms(data: Union[List[float], List[int]], window_size: int, de_trend:bool=False,
+                align: str="trailing") -> List[float]:
     """
     Calculate the running root mean square of a list of values.
+    Runs in linear time using prefix sums of the values and their squares.
+    Sums are re-anchored every block of samples to keep float64 accumulation accurate.
     
     Args:
-    data: List of values.
+    data: List of values or NumPy array.
     window_size: Size of the window for the running RMS calculation.
-    de_trend: If True, remove the trend from the data.
+    de_trend: If True, remove the mean of each window.
+    align: Position of the window relative to the output sample:
+           'trailing' uses the `window_size` samples before it,
+           'centered' the samples around it, and 'leading' the sample and the ones after it.
+           Windows are truncated at the edges of the data.
 
     Returns:
-    List with the running root mean square of the values.
+    List with the running root mean square of the values. NumPy array if an array was provided.
     """
-    
-    ret = []
-    for i in range(len(data)):
-        start_idx = max(0, i - window_size)
-        stop_idx = min(len(data), i)
-        window = data[start_idx:stop_idx]
-        if len(window) == 0:
-            ret.append(0)
+
+    if align not in _ALIGN_OFFSETS:
+        raise ValueError(f"Invalid align: {align}. Must be 'trailing', 'centered' or 'leading'.")
+    offset = _ALIGN_OFFSETS[align](window_size)
+    np = import_numpy()
+    if np is None:
+        return _running_rms_python(data, window_size, de_trend, offset)
+    ret = _running_rms_numpy(np, np.asarray(data, dtype=np.float64), window_size, de_trend, offset)
+    return ret if _is_array(data) else ret.tolist()
+
+
+_ALIGN_OFFSETS = {
+    "trailing": lambda w: -w,
+    "centered": lambda w: -(w // 2),
+    "leading": lambda w: 0,
+}
+
+_RMS_BLOCK = 1 << 14
+
+
+def _running_rms_numpy(np, x, window_size: int, de_trend: bool, offset: int):
+    """
+    Running RMS over windows `[i + offset, i + offset + window_size)`.
+    Prefix sums are computed per block of outputs, relative to the block mean.
+    """
+    n = len(x)
+    out = np.zeros(n)
+    if window_size <= 0:
+        return out
+    block = max(_RMS_BLOCK, window_size)
+    for b0 in range(0, n, block):
+        b1 = min(n, b0 + block)
+        seg0 = max(0, b0 + offset)
+        seg1 = min(n, b1 - 1 + offset + window_size)
+        if seg1 <= seg0:
+            continue
+        ref = x[seg0:seg1].mean()
+        d = x[seg0:seg1] - ref
+        s1 = np.concatenate(([0.0], np.cumsum(d)))
+        s2 = np.concatenate(([0.0], np.cumsum(d * d)))
+        idx = np.arange(b0, b1)
+        lo = np.clip(idx + offset, 0, n)
+        hi = np.clip(idx + offset + window_size, 0, n)
+        cnt = hi - lo
+        valid = cnt > 0
+        lo = lo[valid] - seg0
+        hi = hi[valid] - seg0
+        cnt = cnt[valid]
+        m1 = (s1[hi] - s1[lo]) / cnt
+        m2 = (s2[hi] - s2[lo]) / cnt
+        if de_trend:
+            ms = m2 - m1 * m1
         else:
-            ret.append(rms(data[start_idx:stop_idx], de_trend))
-    return ret
+            ms = m2 + 2 * ref * m1 + ref * ref
+        out[b0:b1][valid] = np.sqrt(np.maximum(ms, 0.0))
+    return out
+
+
+def _running_rms_python(data, window_size: int, de_trend: bool, offset: int) -> List[float]:
+    """
+    Pure Python version of `_running_rms_numpy`.
+    """
+    n = len(data)
+    out = [0.0] * n
+    if window_size <= 0:
+        return out
+    block = max(_RMS_BLOCK, window_size)
+    for b0 in range(0, n, block):
+        b1 = min(n, b0 + block)
+        seg0 = max(0, b0 + offset)
+        seg1 = min(n, b1 - 1 + offset + window_size)
+        if seg1 <= seg0:
+            continue
+        ref = sum(data[seg0:seg1]) / (seg1 - seg0)
+        s1 = [0.0]
+        s2 = [0.0]
+        acc1 = acc2 = 0.0
+        for i in range(seg0, seg1):
+            d = data[i] - ref
+            acc1 += d
+            acc2 += d * d
+            s1.append(acc1)
+            s2.append(acc2)
+        for i in range(b0, b1):
+            lo = min(max(i + offset, 0), n)
+            hi = min(max(i + offset + window_size, 0), n)
+            cnt = hi - lo
+            if cnt <= 0:
+                continue
+            m1 = (s1[hi - seg0] - s1[lo - seg0]) / cnt
+            m2 = (s2[hi - seg0] - s2[lo - seg0]) / cnt
+            if de_trend:
+                ms = m2 - m1 * m1
+            else:
+                ms = m2 + 2 * ref * m1 + ref * ref
+            out[i] = max(ms, 0.0) ** 0.5
+    return out
+
+
+def _is_array(data) -> bool:
+    """Checks if data is a NumPy array, without importing NumPy."""
+    return type(data).__module__ == "numpy" and hasattr(data, "ndim")
@@ -0,0 +1,334 @@
+"""
+This module implements batch analysis of many recordings, distributed over a pool of processes.
+Each recording is loaded once and all selected outputs are produced from it.
+"""
+
+import csv
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from .catalog import DATA_PATTERNS, _iter_files
+from .data import AcquisitionData, SampleArray
+
+logger = logging.getLogger(__name__)
+
+OUTPUTS = ("plot", "psd", "fft", "features")
+"""Available outputs of a recording."""
+
+OUTPUT_SUFFIXES = {"plot": "_plot.png", "psd": "_psd.png", "fft": "_fft.png", "features": "_features.csv"}
+"""Filename suffixes of the outputs, appended to the name of the recording without extension."""
+
+SUMMARY_FIELDS = ("path", "mtime", "start_time", "short_id", "sample_rate", "num_samples", "duration",
+                  "integrity", "skipped_samples", "rms_x", "rms_y", "rms_z", "peak_x", "peak_y", "peak_z", "error")
+"""Columns of the summary CSV file."""
+
+_CHUNK_SIZE = 1 << 18
+
+
+@dataclass
+class BatchResult:
+    """
+    Result of processing one recording.
+
+    Attributes:
+        path: Path of the recording.
+        written: Outputs that were written.
+        skipped: Outputs that were up to date and skipped.
+        summary: Row of the summary table, keys from `SUMMARY_FIELDS`. Empty if the recording was not loaded.
+        error: Error message if loading the recording or producing an output failed.
+    """
+    path: str
+    written: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    summary: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def find_files(inputs: Union[str, Sequence[str]], recursive: bool = False) -> List[str]:
+    """
+    Expands files, directories and glob patterns to a sorted list of recordings.
+    Directories are searched for `DATA_PATTERNS`, outputs of batch processing are excluded.
+
+    Args:
+        inputs: Paths of files or directories, or glob patterns.
+        recursive: If True, subdirectories are searched as well.
+
+    Returns:
+        Absolute paths of the recordings, without duplicates.
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in DATA_PATTERNS:
+                paths.update(_iter_files(item, pattern, recursive))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(p for p in glob.glob(item, recursive=recursive) if os.path.isfile(p))
+    return sorted(os.path.abspath(p) for p in paths
+                  if not any(p.endswith(suffix) for suffix in OUTPUT_SUFFIXES.values()))
+
+
+def output_path(path: str, output: str, output_dir: Optional[str] = None) -> str:
+    """
+    Returns the path of an output of a recording.
+
+    Args:
+        path: Path of the recording.
+        output: Output name, see `OUTPUTS`.
+        output_dir: Directory of the outputs. Defaults to the directory of the recording.
+    """
+    base = os.path.splitext(path)[0]
+    if output_dir is not None:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return base + OUTPUT_SUFFIXES[output]
+
+
+def process_file(path: str, outputs: Sequence[str] = OUTPUTS, output_dir: Optional[str] = None,
+                 incremental: bool = False, freq_min: float = 0, freq_max: Optional[float] = None,
+                 feature_window: float = 1.0) -> BatchResult:
+    """
+    Loads a recording once and produces the selected outputs.
+    Errors are logged and returned in the result, so one bad recording does not stop the batch.
+
+    Args:
+        path: Path of the recording.
+        outputs: Outputs to produce, see `OUTPUTS`.
+        output_dir: Directory of the outputs. Defaults to the directory of the recording.
+        incremental: If True, outputs newer than the recording are skipped.
+        freq_min: Lowest frequency of PSD and FFT plots.
+        freq_max: Highest frequency of PSD and FFT plots. Defaults to the Nyquist frequency.
+        feature_window: Window length of the feature table in seconds.
+
+    Returns:
+        The result.
+    """
+    result = BatchResult(path)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    pending = []
+    for output in outputs:
+        if incremental and _is_up_to_date(output_path(path, output, output_dir), path):
+            result.skipped.append(output)
+        else:
+            pending.append(output)
+    try:
+        data = AcquisitionData.from_file(path, mmap=True)
+        result.summary = summarize(data)
+    except Exception as e:
+        logger.exception(f"Failed to load {path}")
+        result.error = str(e)
+        result.summary = {"path": path, "error": result.error}
+        return result
+
+    errors = []
+    for output in pending:
+        target = output_path(path, output, output_dir)
+        try:
+            _write_output(data, output, target, freq_min, freq_max, feature_window)
+            result.written.append(output)
+        except Exception as e:
+            logger.exception(f"Failed to write {target}")
+            errors.append(f"{output}: {e}")
+    if errors:
+        result.error = "; ".join(errors)
+        result.summary["error"] = result.error
+    return result
+
+
+def summarize(data: AcquisitionData) -> Dict[str, str]:
+    """
+    Returns the summary row of a recording: metadata, RMS with the mean removed and peak absolute value
+    of each acceleration axis. Samples are processed in chunks. Requires NumPy.
+
+    Args:
+        data: Acquisition data.
+
+    Returns:
+        Row with keys from `SUMMARY_FIELDS`. Values of axes that were not acquired are empty.
+    """
+    import numpy as np
+    row = {
+        "path": data.csv_path or "",
+        "mtime": repr(os.path.getmtime(data.csv_path)) if data.csv_path else "",
+        "start_time": data.start_time.isoformat(sep=' '),
+        "short_id": data.device.short_id.upper(),
+        "sample_rate": f"{data.sample_rate:g}",
+        "num_samples": str(data.num_samples),
+        "duration": f"{data.duration:g}",
+        "integrity": str(data.integrity),
+        "skipped_samples": str(data.skipped_samples),
+        "error": "",
+    }
+    channels = [f"acc_{ax}" for ax in "xyz" if f"acc_{ax}" in data.channels]
+    samples = data.samples
+    if not isinstance(samples, SampleArray):
+        samples = SampleArray.from_samples(samples, channels=data.channels)
+    columns = [samples.channels.index(c) for c in channels]
+    total = np.zeros(len(columns))
+    total_square = np.zeros(len(columns))
+    peak = np.zeros(len(columns))
+    for i in range(0, len(samples), _CHUNK_SIZE):
+        values = samples[i:i + _CHUNK_SIZE].to_array()[:, columns]
+        total += values.sum(axis=0)
+        total_square += np.einsum("ij,ij->j", values, values)
+        peak = np.maximum(peak, np.abs(values).max(axis=0))
+    n = max(1, len(samples))
+    rms = np.sqrt(np.maximum(total_square / n - (total / n) ** 2, 0.0))
+    for ax in "xyz":
+        row[f"rms_{ax}"] = row[f"peak_{ax}"] = ""
+    for j, channel in enumerate(channels):
+        row[f"rms_{channel[-1]}"] = f"{rms[j]:.6g}"
+        row[f"peak_{channel[-1]}"] = f"{peak[j]:.6g}"
+    return row
+
+
+def run_batch(inputs: Union[str, Sequence[str]], outputs: Sequence[str] = OUTPUTS,
+              output_dir: Optional[str] = None, workers: Optional[int] = None, incremental: bool = False,
+              summary_path: Optional[str] = None, recursive: bool = False,
+              progress: Optional[Callable[[int, int, BatchResult], None]] = None,
+              **kwargs) -> List[BatchResult]:
+    """
+    Processes recordings in parallel processes, see `process_file`.
+    Python and the plotting libraries are started once per worker instead of once per file.
+
+    In incremental mode, recordings whose outputs are all newer than the recording are not loaded.
+    Their summary rows are taken from the existing summary file.
+
+    Args:
+        inputs: Paths of files or directories, or glob patterns, see `find_files`.
+        outputs: Outputs to produce, see `OUTPUTS`.
+        output_dir: Directory of the outputs. Defaults to the directories of the recordings.
+        workers: Number of processes. Defaults to the number of CPUs. With 1, files are processed in this process.
+        incremental: If True, outputs newer than their recordings are skipped.
+        summary_path: Path of the consolidated summary CSV file, with one row per recording.
+        recursive: If True, subdirectories of input directories are searched as well.
+        progress: Function called with the number of finished files, total number of files and the result
+            of each file, in order of completion.
+        **kwargs: Arguments passed to `process_file`.
+
+    Returns:
+        Results in order of the files.
+
+    Raises:
+        ValueError: If an output name is invalid.
+    """
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs: {', '.join(unknown)}")
+    paths = find_files(inputs, recursive)
+    if summary_path is not None:
+        paths = [p for p in paths if p != os.path.abspath(summary_path)]
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    previous = _read_summary(summary_path) if incremental and summary_path is not None else {}
+
+    results: Dict[str, BatchResult] = {}
+    jobs = []
+    for path in paths:
+        row = previous.get(path)
+        up_to_date = incremental and all(_is_up_to_date(output_path(path, o, output_dir), path) for o in outputs)
+        if up_to_date and (summary_path is None or (row is not None and _same_mtime(row, path))):
+            results[path] = BatchResult(path, skipped=list(outputs), summary=row or {})
+        else:
+            jobs.append(path)
+
+    done = len(results)
+    for result in results.values():
+        if progress is not None:
+            progress(done, len(paths), result)
+    process = partial(process_file, outputs=tuple(outputs), output_dir=output_dir,
+                      incremental=incremental, **kwargs)
+    if workers == 1 or len(jobs) <= 1:
+        for path in jobs:
+            results[path] = process(path)
+            done += 1
+            if progress is not None:
+                progress(done, len(paths), results[path])
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(process, path) for path in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result.path] = result
+                done += 1
+                if progress is not None:
+                    progress(done, len(paths), result)
+
+    ordered = [results[path] for path in paths]
+    if summary_path is not None:
+        _write_summary(summary_path, [r.summary for r in ordered if r.summary])
+    return ordered
+
+
+def _init_worker():
+    # workers only write files, avoid starting an interactive backend
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+    except ImportError:
+        pass
+
+
+def _is_up_to_date(target: str, source: str) -> bool:
+    try:
+        return os.path.getmtime(target) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def _same_mtime(row: Dict[str, str], path: str) -> bool:
+    try:
+        return row.get("mtime") == repr(os.path.getmtime(path)) and not row.get("error")
+    except OSError:
+        return False
+
+
+def _write_output(data: AcquisitionData, output: str, target: str,
+                  freq_min: float, freq_max: Optional[float], feature_window: float):
+    if output == "features":
+        import numpy as np
+        from .features import extract_data
+        table = extract_data(data, feature_window)
+        names = table.dtype.names
+        values = np.column_stack([table[name] for name in names]) if len(table) else np.empty((0, len(names)))
+        np.savetxt(target, values, delimiter=",", header=",".join(names), comments="", fmt="%.6g")
+        return
+
+    import matplotlib.pyplot as plt
+    from .plot import plot, plot_fft, plot_psd
+    try:
+        if output == "plot":
+            plot(data, target, save_overview=True)
+        elif output == "psd":
+            plot_psd(data, target, freq_min=freq_min, freq_max=freq_max)
+        elif output == "fft":
+            plot_fft(data, target, freq_min=freq_min, freq_max=freq_max)
+    finally:
+        plt.close("all")
+
+
+def _read_summary(path: str) -> Dict[str, Dict[str, str]]:
+    try:
+        with open(path, newline="") as f:
+            return {row["path"]: row for row in csv.DictReader(f)}
+    except (OSError, KeyError, csv.Error) as e:
+        logger.warning(f"Failed to read summary {path}: {e}")
+        return {}
+
+
+def _write_summary(path: str, rows: List[Dict[str, str]]):
+    # write to a temporary file first, so an interrupted batch keeps the previous summary
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
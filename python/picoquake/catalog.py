@@ -0,0 +1,270 @@
+"""
+This module implements a catalog of recordings, cached in a local SQLite index.
+"""
+
+import os
+import sqlite3
+import fnmatch
+import logging
+from datetime import datetime
+from fractions import Fraction
+from typing import List, Optional, Iterator, Sequence, Union
+
+from .configuration import *
+from .data import AcquisitionData, AcquisitionMetadata, DeviceInfo
+
+INDEX_FILENAME = ".picoquake_index.sqlite"
+
+DATA_PATTERNS = ("*.csv", "*.pqb")
+"""Filename patterns of recordings in a directory, CSV and binary."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    file_size INTEGER NOT NULL,
+    unique_id TEXT NOT NULL,
+    short_id TEXT NOT NULL,
+    firmware TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    sample_rate REAL NOT NULL,
+    filter REAL NOT NULL,
+    acc_range REAL NOT NULL,
+    gyro_range REAL NOT NULL,
+    num_samples INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    integrity INTEGER NOT NULL,
+    skipped_samples INTEGER NOT NULL,
+    channels TEXT NOT NULL,
+    resample_ratio TEXT NOT NULL
+)
+"""
+
+# files which are not recordings, not read again until they change
+_SKIPPED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS skipped (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    file_size INTEGER NOT NULL
+)
+"""
+
+_COLUMNS = ("path, mtime, file_size, unique_id, short_id, firmware, start_time, "
+            "sample_rate, filter, acc_range, gyro_range, "
+            "num_samples, duration, integrity, skipped_samples, channels, resample_ratio")
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """
+    Catalog of recordings in a directory.
+    Metadata is read from file headers only and cached in a SQLite index.
+    On update, only files with changed modification time or size are read again.
+
+    Methods:
+        update: Scans the directory and refreshes the index.
+        query: Returns catalog entries matching the filter.
+        close: Closes the index.
+    """
+
+    def __init__(self, directory: str, index_path: Optional[str] = None):
+        """
+        Opens the catalog of a directory.
+
+        Args:
+            directory: The directory with recordings.
+            index_path: Path to the SQLite index. Defaults to a hidden file in `directory`.
+        """
+        self.directory = os.path.abspath(directory)
+        if index_path is None:
+            index_path = os.path.join(self.directory, INDEX_FILENAME)
+        self.index_path = index_path
+        self._conn = sqlite3.connect(index_path)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(recordings)")]
+        if columns and columns != [c.strip() for c in _COLUMNS.split(",")]:
+            # index is only a cache, rebuild it if created by a different version
+            self._conn.execute("DROP TABLE recordings")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_SKIPPED_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Closes the index.
+        """
+        self._conn.close()
+
+    def update(self, patterns: Union[str, Sequence[str]] = DATA_PATTERNS, recursive: bool = True) -> int:
+        """
+        Scans the directory and refreshes the index.
+        Files which are not valid recordings are skipped, and not read again until they change.
+
+        Args:
+            patterns: Filename pattern or patterns of the recordings.
+            recursive: If True, subdirectories are scanned as well.
+
+        Returns:
+            Number of files that were (re)read.
+        """
+        cached = {row[0]: (row[1], row[2])
+                  for row in self._conn.execute("SELECT path, mtime, file_size FROM recordings")}
+        skipped = {row[0]: (row[1], row[2])
+                   for row in self._conn.execute("SELECT path, mtime, file_size FROM skipped")}
+        seen = set()
+        num_read = 0
+        for path in _iter_patterns(self.directory, patterns, recursive):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            key = (stat.st_mtime, stat.st_size)
+            if cached.get(path) == key or skipped.get(path) == key:
+                continue
+            try:
+                meta = AcquisitionData.read_metadata(path)
+            except (ValueError, OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                self._conn.execute("DELETE FROM recordings WHERE path = ?", (path,))
+                self._conn.execute("INSERT OR REPLACE INTO skipped (path, mtime, file_size) VALUES (?, ?, ?)",
+                                   (path, *key))
+                continue
+            self._conn.execute(f"INSERT OR REPLACE INTO recordings ({_COLUMNS}) "
+                               f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               _to_row(meta))
+            self._conn.execute("DELETE FROM skipped WHERE path = ?", (path,))
+            num_read += 1
+        removed = [(p,) for p in cached if p not in seen]
+        self._conn.executemany("DELETE FROM recordings WHERE path = ?", removed)
+        self._conn.executemany("DELETE FROM skipped WHERE path = ?", [(p,) for p in skipped if p not in seen])
+        self._conn.commit()
+        logger.info(f"Catalog updated: {num_read} read, {len(removed)} removed")
+        return num_read
+
+    def query(self, short_id: Optional[str] = None,
+              sample_rate: Optional[float] = None,
+              min_duration: Optional[float] = None,
+              since: Optional[datetime] = None,
+              until: Optional[datetime] = None,
+              integrity: Optional[bool] = None) -> List[AcquisitionMetadata]:
+        """
+        Returns catalog entries matching the filter, ordered by start time.
+
+        Args:
+            short_id: Device short ID.
+            sample_rate: Sample rate of the data in Hz, after any resampling.
+            min_duration: Minimum duration in seconds.
+            since: Earliest start time.
+            until: Latest start time.
+            integrity: Integrity of the recording.
+
+        Returns:
+            List of matching entries.
+        """
+        conditions = []
+        params = []
+        if short_id is not None:
+            conditions.append("short_id = ?")
+            params.append(short_id.upper())
+        if sample_rate is not None:
+            conditions.append("abs(sample_rate - ?) < 1e-5")
+            params.append(sample_rate)
+        if min_duration is not None:
+            conditions.append("duration >= ?")
+            params.append(min_duration)
+        if since is not None:
+            conditions.append("start_time >= ?")
+            params.append(since.isoformat(sep=' '))
+        if until is not None:
+            conditions.append("start_time <= ?")
+            params.append(until.isoformat(sep=' '))
+        if integrity is not None:
+            conditions.append("integrity = ?")
+            params.append(int(integrity))
+        sql = f"SELECT {_COLUMNS} FROM recordings"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY start_time"
+        return [_from_row(row) for row in self._conn.execute(sql, params)]
+
+
+def scan_directory(directory: str, patterns: Union[str, Sequence[str]] = DATA_PATTERNS, recursive: bool = True,
+                   index_path: Optional[str] = None) -> List[AcquisitionMetadata]:
+    """
+    Builds or refreshes the catalog of a directory and returns all entries.
+
+    Args:
+        directory: The directory with recordings.
+        patterns: Filename pattern or patterns of the recordings.
+        recursive: If True, subdirectories are scanned as well.
+        index_path: Path to the SQLite index. Defaults to a hidden file in `directory`.
+
+    Returns:
+        List of catalog entries, ordered by start time.
+    """
+    with Catalog(directory, index_path) as catalog:
+        catalog.update(patterns, recursive)
+        return catalog.query()
+
+
+def _iter_patterns(directory: str, patterns: Union[str, Sequence[str]], recursive: bool) -> Iterator[str]:
+    if isinstance(patterns, str):
+        patterns = (patterns,)
+    seen = set()
+    for pattern in patterns:
+        for path in _iter_files(directory, pattern, recursive):
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+def _iter_files(directory: str, pattern: str, recursive: bool) -> Iterator[str]:
+    if recursive:
+        for root, _, files in os.walk(directory):
+            for name in fnmatch.filter(files, pattern):
+                yield os.path.join(root, name)
+    else:
+        for entry in os.scandir(directory):
+            if entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                yield entry.path
+
+
+def _to_row(meta: AcquisitionMetadata) -> tuple:
+    return (meta.path, meta.mtime, meta.file_size,
+            meta.device.unique_id, meta.device.short_id, meta.device.firmware,
+            meta.start_time.isoformat(sep=' '),
+            meta.sample_rate, meta.config.filter.param_value,
+            meta.config.acc_range.param_value, meta.config.gyro_range.param_value,
+            meta.num_samples, meta.duration, int(meta.integrity), meta.skipped_samples,
+            ",".join(meta.channels), str(meta.resample_ratio))
+
+
+def _from_row(row: tuple) -> AcquisitionMetadata:
+    (path, mtime, file_size, unique_id, _, firmware, start_time,
+     sample_rate, filter, acc_range, gyro_range,
+     num_samples, duration, integrity, skipped_samples, channels, resample_ratio) = row
+    # sample rate column holds the rate of the data, restore the device rate
+    resample_ratio = Fraction(resample_ratio)
+    config = Config(SampleRate.from_param_value(float(sample_rate / resample_ratio)),
+                    Filter.from_param_value(float(filter)),
+                    AccRange.from_param_value(float(acc_range)),
+                    GyroRange.from_param_value(float(gyro_range)))
+    return AcquisitionMetadata(path=path,
+                               device=DeviceInfo(unique_id, firmware),
+                               config=config,
+                               start_time=datetime.fromisoformat(start_time),
+                               num_samples=num_samples,
+                               duration=duration,
+                               integrity=bool(integrity),
+                               skipped_samples=skipped_samples,
+                               file_size=file_size,
+                               mtime=mtime,
+                               channels=tuple(channels.split(",")),
+                               resample_ratio=resample_ratio)
@@ -1,7 +1,5 @@
-from typing import cast
+from typing import cast, List, Optional, TYPE_CHECKING
 import logging
-from logging.handlers import RotatingFileHandler
-from serial.tools.list_ports import comports
 import argparse
 import sys
 import os
@@ -9,14 +7,12 @@ import platform
 from datetime import datetime
 from time import time, sleep
 
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
-
+# Modules are imported by the commands using them, so each command only loads what it needs,
+# e.g. plotting commands do not load the serial stack and device commands do not load plotting.
 from . import __version__
-from .interface import *
-from .plot import *
+
+if TYPE_CHECKING:
+    from .data import AcquisitionData, IMUSample
 
 
 logger = logging.getLogger(__name__)
@@ -26,7 +22,7 @@ def equal_with_tolerance(a: float, b: float, tolerance: float = 1e-6) -> bool:
     return abs(a - b) < tolerance
 
 
-def check_orientation(sample: IMUSample, target: list[float], tol: float = 0.1) -> bool:
+def check_orientation(sample: "IMUSample", target: list[float], tol: float = 0.1) -> bool:
     return all(equal_with_tolerance(getattr(sample, axis), val, tol) for axis, val in zip(['acc_x', 'acc_y', 'acc_z'], target))
 
 
@@ -58,7 +54,20 @@ def _get_log_path(app_name):
     return log_path
 
 
+def _save_data(data: "AcquisitionData", out: str):
+    """
+    Saves data to a file. Files with '.pqb' extension are written in quantized binary format, others as CSV.
+    """
+    if os.path.splitext(out)[1].lower() == ".pqb":
+        data.to_bin(out, quantized=True)
+    else:
+        data.to_csv(out)
+
+
 def _acquire(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound, AcquisitionIncomplete
+
     short_id: str = args.short_id
     out: str = args.out
     seconds: float = args.seconds
@@ -68,6 +77,7 @@ def _acquire(args):
     gyro_range: float = args.gyro_range
     autostart: bool = args.autostart
     yes: bool = args.yes
+    channels: Optional[str] = getattr(args, "channels", None)
 
     if not sample_rate >= 2 * filter:
         print("Warning: sample rate should be >= 2 * filter frequency.")
@@ -104,9 +114,9 @@ def _acquire(args):
         if not autostart:
             input("\nPress ENTER to start acquisition...\n")
         print("Acquiring...")
-        data, exception = device.acquire(seconds)
+        data, exception = device.acquire(seconds, channels=channels)
         print("Done.")
-        data.to_csv(out)
+        _save_data(data, out)
         path = os.path.abspath(out)
         print(f"Data written to {path}")  
         if exception is not None:
@@ -127,6 +137,9 @@ def _acquire(args):
 
 
 def _trigger(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound, AcquisitionIncomplete
+
     short_id: str = args.short_id
     out: str = args.out
     sample_rate: float = args.sample_rate
@@ -140,6 +153,9 @@ def _trigger(args):
     axis: str = args.axis
     rms_window: float = args.rms_window
     yes: bool = args.yes
+    channels: Optional[str] = getattr(args, "channels", None)
+    reconnect: bool = getattr(args, "reconnect", False)
+    band: Optional[List[float]] = getattr(args, "band", None)
 
     if not sample_rate >= 2 * filter:
         print("Warning: sample rate should be >= 2 * filter frequency.")
@@ -153,7 +169,7 @@ def _trigger(args):
 
     # Find the device
     try:
-        device = PicoQuake(short_id)
+        device = PicoQuake(short_id, reconnect=reconnect)
     except DeviceNotFound:
         print(f"Device with short_id {short_id} not found.")
         sys.exit(1)
@@ -169,6 +185,14 @@ def _trigger(args):
         print(f"Configured to: {config}")
         print(f"Trigger set to {rms_threshold} {'g' if source == 'accel' else 'dps'}, "
               f"on {source} axis {axis}, window {rms_window} s.")
+        rms_filter = None
+        if band is not None:
+            from .filtering import bandpass
+            rms_filter = bandpass(band[0], band[1], config.sample_rate.param_value)
+            print(f"Trigger RMS band-limited to {band[0]} - {band[1]} Hz.")
+    except ModuleNotFoundError:
+        print("Band-limited trigger not supported. To enable install with 'pip install picoquake[plot]'.")
+        sys.exit(1)
     except Exception as e:
         logger.exception(e)
         print(f"Error configuring device: {e}")
@@ -177,9 +201,10 @@ def _trigger(args):
     try:
         print("Waiting for trigger...")
         on_trigger = lambda val: print(f"Triggered at {val:.2f}. Acquiring...")
-        data, exception = device.trigger(rms_threshold, pre_seconds, post_seconds, source, axis, rms_window, on_trigger)
+        data, exception = device.trigger(rms_threshold, pre_seconds, post_seconds, source, axis, rms_window, on_trigger,
+                                         channels, rms_filter)
         print("Done.")
-        data.to_csv(out)
+        _save_data(data, out)
         path = os.path.abspath(out)
         print(f"Data written to {path}")  
         if exception is not None:
@@ -199,7 +224,75 @@ def _trigger(args):
         device.stop()
 
 
+def _capture(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+
+    short_id: str = args.short_id
+    out: str = args.out
+    seconds: float = args.seconds
+    yes: bool = args.yes
+
+    if os.path.isfile(out) and not yes:
+        usr = input(f"File {out} already exists. Overwrite? y/n: ")
+        if usr.lower() != 'y':
+            print("Exiting...")
+            sys.exit(0)
+
+    try:
+        device = PicoQuake(short_id)
+    except DeviceNotFound:
+        print(f"Device with short_id {short_id} not found.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    try:
+        device.configure_approx(args.sample_rate, args.filter, args.acc_range, args.gyro_range)
+        print(f"Configured to: {device.config}")
+        if seconds > 0:
+            print(f"Capturing for {seconds} s...")
+            device.capture(out, seconds)
+        else:
+            print("Capturing, press Ctrl+C to stop...")
+            device.start_capture(out)
+            try:
+                while True:
+                    sleep(0.1)
+            except KeyboardInterrupt:
+                device.stop_capture()
+        print(f"Capture written to {os.path.abspath(out)}")
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        device.stop()
+
+
+def _decode(args):
+    from .protocol import decode_capture
+    try:
+        data = decode_capture(args.capture, channels=args.channels)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+    _save_data(data, args.out)
+    print(f"Decoded {data.num_samples} samples, integrity: {data.integrity}")
+    print(f"Data written to {os.path.abspath(args.out)}")
+
+
 def _run(args):
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+    from .utils import get_unique_filename
+    from .exceptions import AcquisitionIncomplete, AcquisitionDataCorrupted
+
     with open(args.config, "rb") as f:
         config = tomllib.load(f)
 
@@ -270,6 +363,10 @@ def _run(args):
 
 
 def _live_display(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+    from .configuration import SampleRate, Filter, AccRange, GyroRange
+
     short_id: str = args.short_id
     interval: float = args.interval
     if interval < 0.1:
@@ -278,7 +375,7 @@ def _live_display(args):
         interval = 10
     
     try:
-        device = PicoQuake(short_id)
+        device = PicoQuake(short_id, reconnect=args.reconnect)
     except DeviceNotFound:
         print(f"Device with short_id {short_id} not found.")
         sys.exit(1)
@@ -305,7 +402,57 @@ def _live_display(args):
         device.stop()
 
 
+def _latency(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+    from .latency import measure_latency, format_stats
+
+    short_id: Optional[str] = args.short_id
+    if short_id is None and not args.simulate:
+        print("Error: Specify the short ID of the device or --simulate.")
+        sys.exit(1)
+
+    try:
+        if args.simulate:
+            device = PicoQuake(port="sim://", low_latency=args.low_latency)
+        else:
+            device = PicoQuake(short_id, low_latency=args.low_latency)
+    except DeviceNotFound:
+        print(f"Device with short_id {short_id} not found.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    try:
+        device.configure_approx(args.sample_rate, args.filter, 4, 1000)
+        print(f"Measuring latency of {device.transport} for {args.seconds} s at {device.config.sample_rate.param_value} Hz, "
+              f"reading {args.batch} samples at once, {'low latency' if args.low_latency else 'default'} mode, "
+              f"{args.load_threads} load threads...")
+        stats = measure_latency(device, args.seconds, args.batch, args.interval, args.load_threads,
+                                channels=args.channels)
+    except KeyboardInterrupt:
+        print("\nInterrupted by user.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        device.stop()
+    if not stats:
+        print("No samples received.")
+        sys.exit(1)
+    print(format_stats(stats, args.histogram))
+    if not args.simulate:
+        print("Read latency is in excess of the minimum transfer latency, estimated with the device clock.")
+
+
 def _plot_psd(args):
+    from .data import AcquisitionData
+    from .plot import plot_psd
+
     csv_path: str = args.csv_path
     output: str = args.output
     axis: str = args.axis
@@ -319,7 +466,7 @@ def _plot_psd(args):
     output = output if output != '.' else os.path.splitext(csv_path)[0] + "_psd.png"
 
     try:
-        result = AcquisitionData.from_csv(csv_path)
+        result = AcquisitionData.from_file(csv_path)
     except Exception as e:
         logger.exception(e)
         print(f"Error loading file: {e}")
@@ -336,6 +483,9 @@ def _plot_psd(args):
         sys.exit(1)
 
 def _plot_fft(args):
+    from .data import AcquisitionData
+    from .plot import plot_fft
+
     csv_path: str = args.csv_path
     output: str = args.output
     axis: str = args.axis
@@ -349,7 +499,7 @@ def _plot_fft(args):
     output = output if output != '.' else os.path.splitext(csv_path)[0] + "_fft.png"
 
     try:
-        result = AcquisitionData.from_csv(csv_path)
+        result = AcquisitionData.from_file(csv_path)
     except Exception as e:
         logger.exception(e)
         print(f"Error loading file: {e}")
@@ -365,7 +515,43 @@ def _plot_fft(args):
         print(f"Error: {e}")
         sys.exit(1)
 
+def _plot_spectrogram(args):
+    from .data import AcquisitionData
+    from .plot import plot_spectrogram
+
+    csv_path: str = args.csv_path
+    output: str = args.output
+    axis: str = args.axis
+    freq_min: float = args.fmin
+    freq_max: float = args.fmax
+    nperseg: int = args.nperseg
+    title: str = args.title
+    tstart: float = args.tstart
+    tend: float = args.tend
+
+    output = output if output != '.' else os.path.splitext(csv_path)[0] + "_spectrogram.png"
+
+    try:
+        result = AcquisitionData.from_file(csv_path, mmap=True)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error loading file: {e}")
+        sys.exit(1)
+    try:
+        plot_spectrogram(result, output, axis, freq_min, freq_max, nperseg, title, tstart, tend)
+        print(f"Plot saved to {output}")
+    except ModuleNotFoundError:
+        print("Plotting not supported. To enable install with 'pip install picoquake[plot]'.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+
 def _plot(args):
+    from .data import AcquisitionData
+    from .plot import plot
+
     csv_path: str = args.csv_path
     output: str = args.output
     axis: str = args.axis
@@ -375,17 +561,19 @@ def _plot(args):
     rms: bool = args.rms
     rms_win: float = args.rms_win
     rms_detrend: bool = args.rms_detrend
+    no_overview: bool = args.no_overview
 
     output = output if output != '.' else os.path.splitext(csv_path)[0] + "_plot.png"
 
     try:
-        result = AcquisitionData.from_csv(csv_path)
+        result = AcquisitionData.from_file(csv_path, mmap=True)
     except Exception as e:
         logger.exception(e)
         print(f"Error loading file: {e}")
         sys.exit(1)
     try:
-        plot(result, output, axis, time_start, time_end, title, rms, rms_win, rms_detrend)
+        plot(result, output, axis, time_start, time_end, title, rms, rms_win, rms_detrend,
+             save_overview=not no_overview)
         print(f"Plot saved to {output}")
     except ModuleNotFoundError:
         print("Plotting not supported. To enable install with 'pip install picoquake[plot]'.")
@@ -396,23 +584,85 @@ def _plot(args):
         sys.exit(1)
 
 
+def _batch(args):
+    from .batch import run_batch, OUTPUTS
+
+    inputs: List[str] = args.inputs
+    outputs = [o.strip() for o in args.outputs.split(",") if o.strip()]
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        print(f"Error: Unknown outputs {', '.join(unknown)}, must be a combination of {', '.join(OUTPUTS)}.")
+        sys.exit(1)
+
+    def progress(done: int, total: int, result):
+        name = os.path.basename(result.path)
+        if result.error:
+            print(f"[{done}/{total}] {name}: error: {result.error}")
+        else:
+            print(f"[{done}/{total}] {name}: {len(result.written)} written, {len(result.skipped)} up to date")
+
+    start = time()
+    try:
+        results = run_batch(inputs, outputs, args.output_dir, args.jobs, args.incremental, args.summary,
+                            args.recursive, progress, freq_min=args.fmin, freq_max=args.fmax,
+                            feature_window=args.feature_window)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+    num_errors = sum(1 for r in results if r.error)
+    print(f"{len(results)} recordings processed in {time() - start:.1f} s, {num_errors} errors.")
+    if args.summary is not None:
+        print(f"Summary saved to {args.summary}")
+    if num_errors:
+        sys.exit(1)
+
+
+def _catalog(args):
+    from .catalog import Catalog
+
+    directory: str = args.directory
+    short_id: Optional[str] = args.short_id
+    index: Optional[str] = args.index
+    recursive: bool = not args.no_recursive
+
+    if not os.path.isdir(directory):
+        print(f"Error: Directory {directory} does not exist.")
+        sys.exit(1)
+    try:
+        with Catalog(directory, index) as catalog:
+            num_read = catalog.update(recursive=recursive)
+            entries = catalog.query(short_id=short_id)
+    except Exception as e:
+        logger.exception(e)
+        print(f"Error: {e}")
+        sys.exit(1)
+    for entry in entries:
+        print(f"{os.path.relpath(entry.path, directory)}: {entry}, "
+              f"config: {entry.config}, size = {entry.file_size} B")
+    print(f"{len(entries)} recordings ({num_read} files read).")
+
 
 def _list_devices(args):
-    all_ports = args.all
-    ports = comports()
-    devices = []
-    for p in ports:
-        if p.vid == VID and p.pid == PID and p.serial_number:
-            short_id = DeviceInfo.unique_id_to_short_id(p.serial_number)
-            devices.append((short_id, p))
-            print(f"PicoQuake {short_id}: {p.device}")
-        elif all_ports:
-            print(f"Unknown device: {p.device}, description: {p.description}")
+    from serial.tools.list_ports import comports
+    from .discovery import list_devices
+
+    devices = list_devices()
+    for entry in devices:
+        print(f"PicoQuake {entry.short_id}: {entry.port}")
+    if args.all:
+        known = {entry.port for entry in devices}
+        for p in comports():
+            if p.device not in known:
+                print(f"Unknown device: {p.device}, description: {p.description}")
     if not devices:
         print("No PicoQuake devices found.")
 
 
 def _info(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+
     short_id: str = args.short_id
     try:
         device = PicoQuake(short_id)
@@ -435,6 +685,11 @@ def _info(args):
 
 
 def _test(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+    from .configuration import SampleRate, Filter, AccRange, GyroRange
+    from .data import IMUSample
+
     tol = 0.1
     short_id: str = args.short_id
     try:
@@ -484,6 +739,9 @@ def _test(args):
 
 
 def _reboot_to_bootsel(args):
+    from .interface import PicoQuake
+    from .exceptions import DeviceNotFound
+
     short_id: str = args.short_id
     try:
         device = PicoQuake(short_id)
@@ -514,7 +772,7 @@ def main():
     acquire_parser = subparsers.add_parser("acquire", help="Acquire data from a PicoQuake device.",
                                            fromfile_prefix_chars='@')
     acquire_parser.add_argument("short_id", help="The 4 character ID of the device. Found on the label.")
-    acquire_parser.add_argument("out", help="The output CSV file.")
+    acquire_parser.add_argument("out", help="The output CSV file. Use '.pqb' extension for quantized binary format.")
     acquire_parser.add_argument("-s", "--seconds", type=float, default=2.0,
                                 help="Duration of the acquisition in seconds.")
     acquire_parser.add_argument("-r", "--sample_rate", type=float, default=200.0,
@@ -529,13 +787,15 @@ def main():
                                 help="Start acquisition without user confirmation.")
     acquire_parser.add_argument("-y", "--yes", action="store_true",
                                 help="Skip overwrite prompt.")
+    acquire_parser.add_argument("-c", "--channels", default=None,
+                                help="Channels to save, e.g. 'acc', 'gyro', 'acc_z' or 'acc_x,gyro_x'. All by default.")
     acquire_parser.set_defaults(func=_acquire)
 
     # trigger
     trigger_parser = subparsers.add_parser("trigger", help="Trigger acquisition based on RMS threshold.",
                                            fromfile_prefix_chars='@')
     trigger_parser.add_argument("short_id", help="The 4 character ID of the device. Found on the label.")
-    trigger_parser.add_argument("out", help="The output CSV file.")
+    trigger_parser.add_argument("out", help="The output CSV file. Use '.pqb' extension for quantized binary format.")
     trigger_parser.add_argument("-r", "--sample_rate", type=float, default=200.0,
                                 help="Sample rate in Hz. Range 12.5 - 4000 Hz. Closest available selected.")
     trigger_parser.add_argument("-f", "--filter", type=float, default=42.0,
@@ -556,8 +816,42 @@ def main():
                                 help="Window size for RMS calculation.")
     trigger_parser.add_argument("-y", "--yes", action="store_true",
                                 help="Skip overwrite prompt.")
+    trigger_parser.add_argument("-c", "--channels", default=None,
+                                help="Channels to save, e.g. 'acc', 'gyro', 'acc_z' or 'acc_x,gyro_x'. All by default. "
+                                     "Must include the trigger channels.")
+    trigger_parser.add_argument("--band", type=float, nargs=2, metavar=("LOW", "HIGH"), default=None,
+                                help="Band-pass filter the trigger axes before calculating RMS, frequencies in Hz.")
+    trigger_parser.add_argument("--reconnect", action="store_true",
+                                help="Reconnect automatically when the connection is lost, recording the gap.")
     trigger_parser.set_defaults(func=_trigger)
 
+    # capture
+    capture_parser = subparsers.add_parser("capture", help="Record the raw byte stream of a device, decoded later.",
+                                           fromfile_prefix_chars='@')
+    capture_parser.add_argument("short_id", help="The 4 character ID of the device. Found on the label.")
+    capture_parser.add_argument("out", help="The output capture file.")
+    capture_parser.add_argument("-s", "--seconds", type=float, default=0.0,
+                                help="Duration of the capture in seconds. Until Ctrl+C if 0.")
+    capture_parser.add_argument("-r", "--sample_rate", type=float, default=200.0,
+                                help="Sample rate in Hz. Range 12.5 - 4000 Hz. Closest available selected.")
+    capture_parser.add_argument("-f", "--filter", type=float, default=42.0,
+                                help="Filter frequency in Hz. Range 42 - 3979 Hz. Closest available selected.")
+    capture_parser.add_argument("-ar", "--acc_range", type=float, default=4.0,
+                                help="Acceleration range in g. Range 2 - 16 g. Closest available selected.")
+    capture_parser.add_argument("-gr", "--gyro_range", type=float, default=1000.0,
+                                help="Gyro range in dps. Range 15.625 - 2000 dps. Closest available selected.")
+    capture_parser.add_argument("-y", "--yes", action="store_true",
+                                help="Skip overwrite prompt.")
+    capture_parser.set_defaults(func=_capture)
+
+    # decode
+    decode_parser = subparsers.add_parser("decode", help="Decode a raw capture to a data file.")
+    decode_parser.add_argument("capture", help="The capture file.")
+    decode_parser.add_argument("out", help="The output CSV file. Use '.pqb' extension for quantized binary format.")
+    decode_parser.add_argument("-c", "--channels", default=None,
+                               help="Channels to save, e.g. 'acc', 'gyro', 'acc_z' or 'acc_x,gyro_x'. All by default.")
+    decode_parser.set_defaults(func=_decode)
+
     # run
     run_parser = subparsers.add_parser("run", help="Run acquisition from config file.")
     run_parser.add_argument("config", help="The configuration TOML file.")
@@ -568,8 +862,34 @@ def main():
     live_disp_parser.add_argument("short_id", help="The 4 character ID of the device. Found on the label.")
     live_disp_parser.add_argument("-i", "--interval", type=float, default=1.0,
                                   help="Interval between samples in seconds. Range 0.1 - 10 s.")
+    live_disp_parser.add_argument("--reconnect", action="store_true",
+                                  help="Reconnect automatically when the connection is lost.")
     live_disp_parser.set_defaults(func=_live_display)
 
+    # latency
+    latency_parser = subparsers.add_parser("latency", help="Measure latency of samples from the sensor to the reader.")
+    latency_parser.add_argument("short_id", nargs="?", default=None,
+                                help="The 4 character ID of the device. Found on the label.")
+    latency_parser.add_argument("--simulate", action="store_true", help="Use a simulated device.")
+    latency_parser.add_argument("-s", "--seconds", type=float, default=10.0,
+                                help="Duration of the measurement in seconds.")
+    latency_parser.add_argument("-r", "--sample_rate", type=float, default=100.0,
+                                help="Sample rate in Hz. Range 12.5 - 4000 Hz. Closest available selected.")
+    latency_parser.add_argument("-f", "--filter", type=float, default=42.0,
+                                help="Filter frequency in Hz. Range 42 - 3979 Hz. Closest available selected.")
+    latency_parser.add_argument("-b", "--batch", type=int, default=1,
+                                help="Number of samples read at once.")
+    latency_parser.add_argument("-i", "--interval", type=float, default=0.0,
+                                help="Time in seconds between reads, simulating processing.")
+    latency_parser.add_argument("--load_threads", type=int, default=0,
+                                help="Number of threads keeping the host busy during the measurement.")
+    latency_parser.add_argument("--channels", default=None,
+                                help="Channels to keep, e.g. 'acc', 'gyro', 'acc_z' or 'acc_x,gyro_x'.")
+    latency_parser.add_argument("--low_latency", action="store_true",
+                                help="Process received bytes as soon as they arrive.")
+    latency_parser.add_argument("--histogram", action="store_true", help="Print histograms of each stage.")
+    latency_parser.set_defaults(func=_latency)
+
     # list devices
     list_devices_parser = subparsers.add_parser("list", help="List connected PicoQuake devices.")
     list_devices_parser.add_argument("-a", "--all", action="store_true", help="List all serial ports.")
@@ -592,7 +912,7 @@ def main():
 
     # plot PSD
     fftplot_parser = subparsers.add_parser("plot_psd", help="Plot Power Spectral Density of acquired data.")
-    fftplot_parser.add_argument("csv_path", help="The CSV file containing the acquired data.")
+    fftplot_parser.add_argument("csv_path", help="The CSV or binary file containing the acquired data.")
     fftplot_parser.add_argument("output", help="The output file to save the plot to. '.' to save next to the data file.")
     fftplot_parser.add_argument("-a", "--axis", default="xyz", help="Axis to plot, must be 'x', 'y', 'z', or a combination")
     fftplot_parser.add_argument("--fmin", type=float, default=0.0, help="Minimum frequency to plot.")
@@ -605,7 +925,7 @@ def main():
 
     # plot FFT
     fftplot_parser = subparsers.add_parser("plot_fft", help="Plot Fast Fourier Transform of acquired data.")
-    fftplot_parser.add_argument("csv_path", help="The CSV file containing the acquired data.")
+    fftplot_parser.add_argument("csv_path", help="The CSV or binary file containing the acquired data.")
     fftplot_parser.add_argument("output", help="The output file to save the plot to. '.' to save next to the data file.")
     fftplot_parser.add_argument("-a", "--axis", default="xyz", help="Axis to plot, must be 'x', 'y', 'z', or a combination")
     fftplot_parser.add_argument("--fmin", type=float, default=0.0, help="Minimum frequency to plot.")
@@ -616,9 +936,22 @@ def main():
     fftplot_parser.add_argument("--tend", type=float, default=float("inf"), help="End time for analysis.")
     fftplot_parser.set_defaults(func=_plot_fft)
 
+    # plot spectrogram
+    spectrogram_parser = subparsers.add_parser("plot_spectrogram", help="Plot spectrogram of acquired data.")
+    spectrogram_parser.add_argument("csv_path", help="The CSV or binary file containing the acquired data.")
+    spectrogram_parser.add_argument("output", help="The output file to save the plot to. '.' to save next to the data file.")
+    spectrogram_parser.add_argument("-a", "--axis", default="xyz", help="Axis to plot, must be 'x', 'y', 'z', or a combination")
+    spectrogram_parser.add_argument("--fmin", type=float, default=0.0, help="Minimum frequency to plot.")
+    spectrogram_parser.add_argument("--fmax", type=float, default=1000.0, help="Maximum frequency to plot.")
+    spectrogram_parser.add_argument("-n", "--nperseg", type=int, default=256, help="Segment length in samples.")
+    spectrogram_parser.add_argument("--title", help="Title of the plot.", default=None)
+    spectrogram_parser.add_argument("--tstart", type=float, default=float("-inf"), help="Start time for analysis.")
+    spectrogram_parser.add_argument("--tend", type=float, default=float("inf"), help="End time for analysis.")
+    spectrogram_parser.set_defaults(func=_plot_spectrogram)
+
     # plot
     plot_parser = subparsers.add_parser("plot", help="Plot acquired data (time series).")
-    plot_parser.add_argument("csv_path", help="The CSV file containing the acquired data.")
+    plot_parser.add_argument("csv_path", help="The CSV or binary file containing the acquired data.")
     plot_parser.add_argument("output", help="The output file to save the plot to. '.' to save next to the data file.")
     plot_parser.add_argument("-a", "--axis", default="xyz", help="Axis to plot, must be 'x', 'y', 'z', or a combination")
     plot_parser.add_argument("--tstart", type=float, default=float("-inf"), help="Start time of the plot.")
@@ -627,13 +960,45 @@ def main():
     plot_parser.add_argument("--rms", action="store_true", help="Plot RMS values.")
     plot_parser.add_argument("--rms_win", type=float, default=1.0, help="Window size for RMS calculation.")
     plot_parser.add_argument("--rms_detrend", action="store_true", help="Detrend data before RMS calculation.")
+    plot_parser.add_argument("--no_overview", action="store_true", help="Do not store the overview of long recordings next to the data file.")
     plot_parser.set_defaults(func=_plot)
 
+    # batch
+    batch_parser = subparsers.add_parser("batch", help="Analyze many recordings in parallel.")
+    batch_parser.add_argument("inputs", nargs="+", help="Data files, directories or glob patterns.")
+    batch_parser.add_argument("-o", "--output_dir", default=None,
+                              help="Directory of the outputs. Defaults to the directories of the data files.")
+    batch_parser.add_argument("--outputs", default="plot,psd,fft,features",
+                              help="Outputs of each recording, a combination of 'plot', 'psd', 'fft' and 'features'.")
+    batch_parser.add_argument("-j", "--jobs", type=int, default=None,
+                              help="Number of worker processes. Defaults to the number of CPUs.")
+    batch_parser.add_argument("-i", "--incremental", action="store_true",
+                              help="Skip outputs which are newer than their data files.")
+    batch_parser.add_argument("--summary", default=None, help="Write a summary CSV with one row per recording.")
+    batch_parser.add_argument("-R", "--recursive", action="store_true", help="Search subdirectories.")
+    batch_parser.add_argument("--fmin", type=float, default=0.0, help="Minimum frequency of PSD and FFT plots.")
+    batch_parser.add_argument("--fmax", type=float, default=None,
+                              help="Maximum frequency of PSD and FFT plots. Defaults to 0.5 x sample rate.")
+    batch_parser.add_argument("--feature_window", type=float, default=1.0,
+                              help="Window length of the feature table in seconds.")
+    batch_parser.set_defaults(func=_batch)
+
+    # catalog
+    catalog_parser = subparsers.add_parser("catalog", help="List recordings in a directory from their headers.")
+    catalog_parser.add_argument("directory", help="The directory containing the recordings, CSV or binary files.")
+    catalog_parser.add_argument("-d", "--short_id", default=None, help="Only list recordings of this device.")
+    catalog_parser.add_argument("--index", default=None,
+                                help="Path to the index file. Defaults to a hidden file in the directory.")
+    catalog_parser.add_argument("--no_recursive", action="store_true", help="Do not scan subdirectories.")
+    catalog_parser.set_defaults(func=_catalog)
+
     args = main_parser.parse_args()
 
     # logging
+    from logging.handlers import RotatingFileHandler
     log_path = os.path.join(_get_log_path("picoquake"), "picoquake.log")
-    file_handler =RotatingFileHandler(log_path, mode='a', maxBytes=15*1024*1024, backupCount=5)
+    # the log file is only opened when a message is logged
+    file_handler = RotatingFileHandler(log_path, mode='a', maxBytes=15*1024*1024, backupCount=5, delay=True)
     file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
     logging.getLogger().addHandler(file_handler)
     if args.debug:
@@ -0,0 +1,154 @@
+"""
+This module implements the alignment of device sample counts with the host clock.
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from statistics import median
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+_MAD_SCALE = 1.4826
+_MIN_SPREAD = 1e-6
+_MAX_ITERATIONS = 10
+
+
+@dataclass(frozen=True)
+class ClockFit:
+    """
+    Linear mapping of device sample counts to host wall clock time: `time = origin + count / rate`.
+
+    Attributes:
+        rate: Sample rate measured with the host clock in Hz.
+        origin: Host time of count 0, in seconds since the epoch as returned by `time.time`.
+            Includes the minimum transfer latency from the device.
+        jitter: RMS deviation of the fitted arrival times from the line in seconds.
+    """
+    rate: float
+    origin: float
+    jitter: float = 0.0
+
+    def time(self, count: float) -> float:
+        """
+        Returns the host time of a sample count in seconds since the epoch.
+        """
+        return self.origin + count / self.rate
+
+    def datetime(self, count: float) -> datetime:
+        """
+        Returns the host time of a sample count as local datetime.
+        """
+        return datetime.fromtimestamp(self.time(count))
+
+    def count(self, t: float) -> float:
+        """
+        Returns the fractional sample count at a host time in seconds since the epoch.
+        """
+        return (t - self.origin) * self.rate
+
+    def drift_ppm(self, nominal_rate: float) -> float:
+        """
+        Returns the deviation of the measured rate from `nominal_rate` in parts per million.
+        """
+        return (self.rate / nominal_rate - 1) * 1e6
+
+    def rebase(self, count_offset: int = 0, ratio: float = 1) -> "ClockFit":
+        """
+        Returns the fit for counts re-numbered as `(count - count_offset) * ratio`,
+        e.g. counts written to a file or resampled counts.
+        """
+        return ClockFit(self.rate * ratio, self.time(count_offset), self.jitter)
+
+
+class ClockEstimator:
+    """
+    Estimates the mapping of device sample counts to host time from the arrival times of samples.
+
+    Arrivals are delayed by the transfer from the device by a varying amount, never advanced.
+    For each window of counts the least delayed arrival is kept, a line is fitted to them,
+    and windows delayed more than the USB jitter, e.g. by a busy host, are rejected.
+    Thread-safe, arrivals are usually added by the serial worker.
+
+    Methods:
+        add: Adds the arrival of a sample.
+        fit: Fits the mapping to the arrivals so far.
+    """
+
+    def __init__(self, nominal_rate: float, window: float = 1.0, wall_offset_ns: Optional[int] = None,
+                 rejection: float = 3.0):
+        """
+        Args:
+            nominal_rate: Configured sample rate in Hz.
+            window: Length of the windows in seconds.
+            wall_offset_ns: Offset of the host wall clock from the monotonic clock in nanoseconds,
+                used to convert arrival times. Defaults to the current offset.
+            rejection: Windows deviating from the fit by more than `rejection` times the robust
+                standard deviation are rejected.
+        """
+        if wall_offset_ns is None:
+            wall_offset_ns = time.time_ns() - time.monotonic_ns()
+        self.nominal_rate = nominal_rate
+        self.rejection = rejection
+        self._window = max(1, int(window * nominal_rate))
+        self._period_ns = 1e9 / nominal_rate
+        self._wall_offset_ns = wall_offset_ns
+        self._minima: Dict[int, Tuple[int, int]] = {}
+        self._lock = Lock()
+
+    def add(self, count: int, arrival_ns: int):
+        """
+        Adds the arrival of a sample. Usually the last sample of each chunk read from the device.
+
+        Args:
+            count: Sample count.
+            arrival_ns: Host monotonic time of the arrival in nanoseconds, see `time.monotonic_ns`.
+        """
+        key = count // self._window
+        with self._lock:
+            best = self._minima.get(key)
+            if best is None or arrival_ns - count * self._period_ns < best[1] - best[0] * self._period_ns:
+                self._minima[key] = (count, arrival_ns)
+
+    def fit(self) -> Optional[ClockFit]:
+        """
+        Fits the mapping to the arrivals so far.
+
+        Returns:
+            The fit, or None if arrivals of less than two windows were added.
+        """
+        with self._lock:
+            points = sorted(self._minima.values())
+        if len(points) < 2:
+            return None
+        count_0, arrival_0 = points[0]
+        xs = [float(c - count_0) for c, _ in points]
+        ys = [(t - arrival_0) * 1e-9 for _, t in points]
+        keep = list(range(len(points)))
+        for _ in range(_MAX_ITERATIONS):
+            slope, intercept = _line_fit([xs[i] for i in keep], [ys[i] for i in keep])
+            residuals = [y - intercept - slope * x for x, y in zip(xs, ys)]
+            centre = median(residuals[i] for i in keep)
+            spread = max(_MAD_SCALE * median(abs(residuals[i] - centre) for i in keep), _MIN_SPREAD)
+            accepted = [i for i, r in enumerate(residuals) if abs(r - centre) <= self.rejection * spread]
+            if len(accepted) < 2 or accepted == keep:
+                break
+            keep = accepted
+        if slope <= 0:
+            return None
+        jitter = (sum((residuals[i] - centre) ** 2 for i in keep) / len(keep)) ** 0.5
+        origin = (arrival_0 + self._wall_offset_ns) * 1e-9 + intercept - slope * count_0
+        return ClockFit(1 / slope, origin, jitter)
+
+
+def _line_fit(xs: List[float], ys: List[float]) -> Tuple[float, float]:
+    """
+    Least squares fit of `y = intercept + slope * x`. Returns slope and intercept.
+    """
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    slope = sxy / sxx if sxx > 0 else 0.0
+    return slope, mean_y - slope * mean_x
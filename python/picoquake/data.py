@@ -2,15 +2,21 @@
 Data classes for storing device and acquisition data.
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import Enum
 from hashlib import blake2b
 from datetime import datetime
 import csv
-from typing import Optional
+import io
+import struct
+from typing import Optional, List, Tuple, Union, Iterator, overload, cast
+from bisect import bisect_left
+from fractions import Fraction
+import math
 import os
 
 from .configuration import *
+from .clock import ClockFit
 
 
 class State(Enum):
@@ -36,6 +42,7 @@ class PacketID(Enum):
 class IMUSample:
     """
     Data class for storing a single IMU sample.
+    Values of channels that were not acquired are None.
 
     Attributes:
         count: Sample count.
@@ -47,21 +54,192 @@ class IMUSample:
         gyro_z: Gyroscope Z value.
     """
     count: int
-    acc_x: float
-    acc_y: float
-    acc_z: float
-    gyro_x: float
-    gyro_y: float
-    gyro_z: float
+    acc_x: Optional[float]
+    acc_y: Optional[float]
+    acc_z: Optional[float]
+    gyro_x: Optional[float]
+    gyro_y: Optional[float]
+    gyro_z: Optional[float]
 
     def __str__(self) -> str:
-        return (f"cnt = {self.count}, "
-                f"a_x = {self.acc_x:+.2f}, "
-                f"a_y = {self.acc_y:+.2f}, "
-                f"a_z = {self.acc_z:+.2f}, "
-                f"g_x = {self.gyro_x:+.2f}, "
-                f"g_y = {self.gyro_y:+.2f}, "
-                f"g_z = {self.gyro_z:+.2f}")
+        values = [f"{name} = {value:+.2f}" for name, value in
+                  zip(_CSV_COLUMNS, (self.acc_x, self.acc_y, self.acc_z, self.gyro_x, self.gyro_y, self.gyro_z))
+                  if value is not None]
+        return ", ".join([f"cnt = {self.count}"] + values)
+
+
+CHANNELS = ("acc_x", "acc_y", "acc_z", "gyro_x", "gyro_y", "gyro_z")
+"""Names of the sample channels, in the order they are stored."""
+
+_CSV_COLUMNS = ("a_x", "a_y", "a_z", "g_x", "g_y", "g_z")
+
+
+def parse_channels(channels: Union[str, List[str], Tuple[str, ...], None]) -> Tuple[str, ...]:
+    """
+    Parses a channel selection.
+    Accepts channel names (e.g. 'acc_z'), 'acc', 'gyro' or 'all',
+    either as a comma separated string or as a list.
+
+    Args:
+        channels: Channel selection. If None, all channels are selected.
+
+    Returns:
+        Tuple of selected channel names, in `CHANNELS` order.
+
+    Raises:
+        ValueError: If the selection contains an invalid channel name or is empty.
+    """
+    if channels is None:
+        return CHANNELS
+    if isinstance(channels, str):
+        channels = channels.split(",")
+    selected = set()
+    for name in channels:
+        name = name.strip().lower()
+        if name == "all":
+            selected.update(CHANNELS)
+        elif name in ("acc", "gyro"):
+            selected.update(c for c in CHANNELS if c.startswith(name + "_"))
+        elif name in CHANNELS:
+            selected.add(name)
+        else:
+            raise ValueError(f"Invalid channel: {name}. Must be one of {', '.join(CHANNELS)}, 'acc', 'gyro' or 'all'.")
+    if not selected:
+        raise ValueError("No channels selected")
+    return tuple(c for c in CHANNELS if c in selected)
+
+_INT16_FULL_SCALE = 32768
+
+
+def quantization_scales(config: Config) -> Tuple[float, ...]:
+    """
+    Returns the value of one LSB for each channel, as used by the 16-bit sensor.
+    Derived from the accelerometer and gyroscope range of the configuration.
+
+    Args:
+        config: Acquisition configuration.
+
+    Returns:
+        Tuple of scale factors, one per channel in `CHANNELS` order.
+    """
+    acc = config.acc_range.param_value / _INT16_FULL_SCALE
+    gyro = config.gyro_range.param_value / _INT16_FULL_SCALE
+    return (acc, acc, acc, gyro, gyro, gyro)
+
+
+class SampleArray:
+    """
+    Columnar storage of IMU samples in NumPy arrays.
+    Behaves like a read-only list of `IMUSample`. Slicing returns a view without copying.
+
+    Values are stored either as floats, or quantized as int16 with a scale factor per channel.
+    Quantized values are converted back to physical units on access.
+
+    Attributes:
+        counts: Sample counts, shape (N,).
+        values: Channel values, shape (N, len(channels)).
+        scales: Scale factor per channel if values are quantized, otherwise None.
+        channels: Names of the stored channels, in `CHANNELS` order.
+
+    Methods:
+        from_samples: Create from a list of samples.
+        to_array: Return channel values in physical units.
+    """
+
+    def __init__(self, counts, values, scales=None, channels: Tuple[str, ...] = CHANNELS):
+        import numpy as np
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.values = np.asarray(values)
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float64)
+        self.channels = tuple(channels)
+        if self.values.ndim != 2 or self.values.shape != (len(self.counts), len(self.channels)):
+            raise ValueError(f"Values must have shape ({len(self.counts)}, {len(self.channels)})")
+        self._indices = [CHANNELS.index(c) for c in self.channels]
+
+    @classmethod
+    def from_samples(cls, samples: List[IMUSample], scales: Optional[Tuple[float, ...]] = None,
+                     channels: Tuple[str, ...] = CHANNELS) -> 'SampleArray':
+        """
+        Create from a list of samples.
+
+        Args:
+            samples: List of IMU samples.
+            scales: Scale factor per channel in `channels`. If specified, values are quantized to int16.
+            channels: Channels to store.
+
+        Returns:
+            SampleArray: Samples in columnar storage.
+        """
+        import numpy as np
+        if isinstance(samples, SampleArray):
+            columns = [samples.channels.index(c) for c in channels]
+            counts, values = samples.counts, samples.to_array()[:, columns]
+        else:
+            counts = np.fromiter((s.count for s in samples), dtype=np.int64, count=len(samples))
+            values = np.array([[getattr(s, c) for c in channels] for s in samples],
+                              dtype=np.float64).reshape(-1, len(channels))
+        if scales is None:
+            return cls(counts, values, channels=channels)
+        scales_arr = np.asarray(scales, dtype=np.float64)
+        quantized = np.clip(np.rint(values / scales_arr), -_INT16_FULL_SCALE, _INT16_FULL_SCALE - 1)
+        return cls(counts, quantized.astype(np.int16), scales_arr, channels)
+
+    @property
+    def quantized(self) -> bool:
+        return self.scales is not None
+
+    def to_array(self, dtype=None):
+        """
+        Return channel values in physical units.
+
+        Args:
+            dtype: NumPy data type of the result. Defaults to float64.
+
+        Returns:
+            Array of shape (N, len(channels)).
+        """
+        import numpy as np
+        if dtype is None:
+            dtype = np.float64
+        if self.scales is None:
+            return self.values.astype(dtype, copy=False)
+        return self.values.astype(dtype) * self.scales.astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @overload
+    def __getitem__(self, index: int) -> IMUSample: ...
+    @overload
+    def __getitem__(self, index: slice) -> 'SampleArray': ...
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SampleArray(self.counts[index], self.values[index], self.scales, self.channels)
+        row = self.values[index]
+        if self.scales is not None:
+            row = row * self.scales
+        values: List[Optional[float]] = [None] * len(CHANNELS)
+        for i, v in zip(self._indices, row):
+            values[i] = float(v)
+        return IMUSample(int(self.counts[index]), *values)
+
+    def __iter__(self) -> Iterator[IMUSample]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, SampleArray):
+            import numpy as np
+            return (self.channels == other.channels
+                    and np.array_equal(self.counts, other.counts)
+                    and np.array_equal(self.to_array(), other.to_array()))
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return (f"SampleArray(len={len(self)}, channels={self.channels}, "
+                f"dtype={self.values.dtype}, quantized={self.quantized})")
 
 
 @dataclass
@@ -78,6 +256,33 @@ class Status:
                 f"error = {self.error_code}")
     
 
+@dataclass
+class Gap:
+    """
+    Data class for storing an interruption of the sample stream, e.g. by a lost connection.
+    Counts after the gap continue as if sampling was not interrupted.
+
+    Attributes:
+        start_count: Count of the first missing sample.
+        end_count: Count of the first sample received after the interruption.
+        start_time: Time the interruption was detected.
+        end_time: Time sampling resumed.
+        num_samples: Number of missing samples.
+    """
+    start_count: int
+    end_count: int
+    start_time: datetime
+    end_time: datetime
+
+    @property
+    def num_samples(self) -> int:
+        return self.end_count - self.start_count
+
+    def __str__(self) -> str:
+        return (f"counts = {self.start_count} - {self.end_count}, "
+                f"duration = {(self.end_time - self.start_time).total_seconds():.1f}s")
+
+
 @dataclass
 class DeviceInfo:
     unique_id: str
@@ -106,29 +311,60 @@ class AcquisitionData:
     including IMU samples, device information, and acquisition configuration.
 
     Attributes:
-        samples: List of IMU samples.
+        samples: List of IMU samples, or `SampleArray` if stored in columnar form.
         device: Device information.
         config: Acquisition configuration.
         start_time: Start time of the acquisition.
         skipped_samples: Number of skipped samples due to acquisition issues.
         csv_path: Path to the CSV file containing the data. Used if the data was loaded from a file.
+        count_offset: Offset subtracted from the sample counts when they are read. Set by `re_centre`.
+            Not compared for equality, data with the same samples is equal regardless of centring.
+        counts: Sample counts with the offset applied.
         duration: Duration of the acquisition in seconds.
         num_samples: Number of samples in the acquisition.
         integrity: Whether the acquisition has integrity (no skipped samples).
+        quantized: Whether the samples are stored quantized as int16.
+        channels: Names of the acquired channels. Values of other channels are None.
+        resample_ratio: Ratio of the sample rate to the configured device sample rate. Set by resampling.
+        clock: Mapping of the sample counts to host time, measured during the acquisition. None if not measured.
+        sample_rate: Sample rate of the data in Hz.
     
     Methods:
         to_csv: Write the data to a CSV file.
         from_csv: Load the data from a CSV file.
+        to_bin: Write the data to a binary file.
+        from_bin: Load the data from a binary file.
+        from_file: Load the data from a CSV or binary file.
+        read_metadata: Read only the metadata header of a data file.
+        quantize: Return the data with samples quantized to int16.
+        to_array: Return channel values as a NumPy array.
+        slice: Return a view of the data in a time range.
+        slice_counts: Return a view of the data in a sample count range.
     """
-    samples: list[IMUSample]
+    samples: Union[List[IMUSample], SampleArray]
     device: DeviceInfo
     config: Config
     start_time: datetime
     csv_path: Optional[str] = None
+    count_offset: int = field(default=0, compare=False)
+    channels: Tuple[str, ...] = CHANNELS
+    resample_ratio: Fraction = Fraction(1)
+    clock: Optional[ClockFit] = None
+
+    @property
+    def counts(self) -> List[int]:
+        offset = self.count_offset
+        if isinstance(self.samples, SampleArray):
+            return (self.samples.counts - offset).tolist()
+        return [s.count - offset for s in self.samples]
+
+    @property
+    def sample_rate(self) -> float:
+        return float(self.config.sample_rate.param_value * self.resample_ratio)
 
     @property
     def duration(self) -> float:
-        return self.num_samples / self.config.sample_rate.param_value
+        return self.num_samples / self.sample_rate
     
     @property
     def num_samples(self) -> int:
@@ -141,6 +377,10 @@ class AcquisitionData:
     @property
     def integrity(self) -> bool:
         return self.skipped_samples == 0
+
+    @property
+    def quantized(self) -> bool:
+        return isinstance(self.samples, SampleArray) and self.samples.quantized
     
     @property
     def filename(self) -> Optional[str]:
@@ -152,6 +392,12 @@ class AcquisitionData:
     def re_centre(self, index: int):
         """
         Re-centre the data around a specific index.
+        The sample at `index` gets count 0. Samples are not modified,
+        only `count_offset` is updated.
+
+        The `count` of the samples remains the count received from the device, also after
+        `PicoQuake.acquire` and `PicoQuake.trigger`. Use `counts` or `sample_count` for re-centred counts.
+        Files are written with re-centred counts, so samples loaded from a file have them.
         
         Args:
             index: The index to re-centre the data around.
@@ -159,12 +405,88 @@ class AcquisitionData:
         if len(self.samples) == 0:
             return
         index = min(max(0, index), len(self.samples) - 1)
-        first = self.samples[index].count
-        for s in self.samples:
-            s.count -= first
+        self.count_offset = self.samples[index].count
+
+    def sample_count(self, index: int) -> int:
+        """
+        Return the count of the sample at `index`, with the offset applied.
+
+        Args:
+            index: Index of the sample.
+        """
+        return self.samples[index].count - self.count_offset
+
+    def host_times(self) -> List[float]:
+        """
+        Return the host time of each sample in seconds since the epoch.
+        Uses the measured `clock` if available, otherwise `start_time` and the nominal sample rate.
+        """
+        if self.clock is not None:
+            clock = self.clock.rebase(self.count_offset)
+            return [clock.time(c) for c in self.counts]
+        start = self.start_time.timestamp()
+        fs = self.sample_rate
+        return [start + c / fs for c in self.counts]
     
+    def slice(self, tstart: float = float("-inf"), tend: float = float("inf")) -> 'AcquisitionData':
+        """
+        Return a view of the data with sample times in range `tstart <= t <= tend`.
+        Sample time is calculated from the sample count and sample rate.
+
+        Args:
+            tstart: Start time in seconds.
+            tend: End time in seconds.
+
+        Returns:
+            AcquisitionData: Data sharing the sample objects with this instance.
+        """
+        fs = self.sample_rate
+        c0 = None if tstart == float("-inf") else math.ceil(tstart * fs - 1e-9)
+        c1 = None if tend == float("inf") else math.floor(tend * fs + 1e-9) + 1
+        return self.slice_counts(c0, c1)
+
+    def slice_counts(self, c0: Optional[int] = None, c1: Optional[int] = None) -> 'AcquisitionData':
+        """
+        Return a view of the data with sample counts in range `c0 <= count < c1`.
+        Counts are compared with the offset applied.
+        Counts must be monotonic, skipped samples are allowed.
+        Uses binary search, so the cost does not depend on the length of the data.
+
+        Args:
+            c0: First count to include. If None, starts at the first sample.
+            c1: First count to exclude. If None, ends at the last sample.
+
+        Returns:
+            AcquisitionData: Data sharing the sample objects with this instance.
+        """
+        start = 0 if c0 is None else self._count_index(c0 + self.count_offset)
+        stop = len(self.samples) if c1 is None else self._count_index(c1 + self.count_offset)
+        stop = max(start, stop)
+        return replace(self, samples=self.samples[start:stop])
+
+    def _count_index(self, count: int) -> int:
+        """Returns index of the first sample with raw count >= `count`."""
+        samples = self.samples
+        n = len(samples)
+        if n == 0:
+            return 0
+        if isinstance(samples, SampleArray):
+            import numpy as np
+            return int(np.searchsorted(samples.counts, count, side="left"))
+        first = samples[0].count
+        # without skipped samples, index follows directly from the count
+        if samples[-1].count - first == n - 1:
+            return min(max(0, count - first), n)
+        return bisect_left(_CountKeys(samples), count)
+
     def _check_integrity(self) -> int:
         """Counts skipped samples."""
+        if len(self.samples) == 0:
+            return 0
+        if isinstance(self.samples, SampleArray):
+            import numpy as np
+            diff = np.diff(self.samples.counts)
+            return int(np.sum(diff[diff > 1] - 1))
         last_count = self.samples[0].count
         skipped = 0
         for s in self.samples:
@@ -181,26 +503,223 @@ class AcquisitionData:
                 f"duration = {self.duration:.2f}s, "
                 f"skipped = {self.skipped_samples}")
     
-    def to_csv(self, path: str):
+    def quantize(self) -> 'AcquisitionData':
         """
-        Write the data to a CSV file.
+        Return the data with samples quantized to int16.
+        Scale factors are derived from the accelerometer and gyroscope range of the configuration.
+        Values outside the range are clipped. Requires NumPy.
+
+        Returns:
+            AcquisitionData: Data with samples stored in a quantized `SampleArray`.
+        """
+        return replace(self, samples=SampleArray.from_samples(self.samples, self._quantization_scales(),
+                                                              self.channels))
+
+    def to_array(self, dtype=None):
+        """
+        Return channel values in physical units as a NumPy array. Requires NumPy.
 
         Args:
-            filename: Path to the CSV file.
+            dtype: NumPy data type of the result. Defaults to float64.
+
+        Returns:
+            Array of shape (N, len(channels)), in `channels` order.
         """
-        metadata = f"# PLab PicoQuake Data\n" \
+        if isinstance(self.samples, SampleArray) and self.samples.channels == self.channels:
+            return self.samples.to_array(dtype)
+        return SampleArray.from_samples(self.samples, channels=self.channels).to_array(dtype)
+
+    def _quantization_scales(self) -> Tuple[float, ...]:
+        scales = quantization_scales(self.config)
+        return tuple(scales[CHANNELS.index(c)] for c in self.channels)
+
+    def _metadata_header(self) -> str:
+        return f"# PLab PicoQuake Data\n" \
                f"# Time: {self.start_time.isoformat(sep=' ')}, Device: {self.device.short_id.upper()} ({self.device.unique_id}), " \
-               f"FW: {self.device.firmware}\n" \
+               f"FW: {self.device.firmware}{_clock_header(self.clock, self.count_offset)}\n" \
                f"# Num. samples: {self.num_samples}, Duration: {self.duration} s\n" \
-               f"# Config: {self.config}\n" \
+               f"# Config: {self.config}{_resample_header(self.resample_ratio)}\n" \
                f"# Integrity: {self.integrity}, Skipped samples: {self.skipped_samples}\n"
+
+    def to_csv(self, path: str):
+        """
+        Write the data to a CSV file.
+
+        Args:
+            filename: Path to the CSV file.
+        """
+        metadata = self._metadata_header()
         with open(path, "w", newline="") as f:
             f.write(metadata)
             writer = csv.writer(f)
-            writer.writerow(["count", "a_x", "a_y", "a_z", "g_x", "g_y", "g_z"])
-            for sample in self.samples:
-                writer.writerow([sample.count, sample.acc_x, sample.acc_y, sample.acc_z,
-                                sample.gyro_x, sample.gyro_y, sample.gyro_z])
+            writer.writerow(["count"] + [_CSV_COLUMNS[CHANNELS.index(c)] for c in self.channels])
+            offset = self.count_offset
+            if self.channels == CHANNELS:
+                for sample in self.samples:
+                    writer.writerow([sample.count - offset, sample.acc_x, sample.acc_y, sample.acc_z,
+                                    sample.gyro_x, sample.gyro_y, sample.gyro_z])
+            else:
+                channels = self.channels
+                for sample in self.samples:
+                    writer.writerow([sample.count - offset] + [getattr(sample, c) for c in channels])
+
+    def to_bin(self, path: str, quantized: Optional[bool] = None):
+        """
+        Write the data to a binary file. Requires NumPy.
+        The file starts with the same metadata header as the CSV file,
+        followed by the sample counts and channel values.
+
+        Args:
+            path: Path to the binary file.
+            quantized: If True, values are stored as int16 with a scale factor per channel,
+                otherwise as float32. Defaults to the storage of the samples.
+        """
+        import numpy as np
+        if quantized is None:
+            quantized = self.quantized
+        if quantized:
+            if self.quantized and cast(SampleArray, self.samples).channels == self.channels:
+                array = cast(SampleArray, self.samples)
+            else:
+                array = SampleArray.from_samples(self.samples, self._quantization_scales(), self.channels)
+            values = array.values.astype("<i2", copy=False)
+        else:
+            if isinstance(self.samples, SampleArray) and self.samples.channels == self.channels:
+                array = self.samples
+            else:
+                array = SampleArray.from_samples(self.samples, channels=self.channels)
+            values = array.to_array().astype("<f4")
+        header = self._metadata_header().encode("utf-8")
+        channel_mask = sum(1 << CHANNELS.index(c) for c in self.channels)
+        with open(path, "wb") as f:
+            f.write(_BIN_MAGIC)
+            f.write(struct.pack("<BBBI", _BIN_VERSION, _BIN_FLAG_QUANTIZED if quantized else 0,
+                                channel_mask, len(header)))
+            f.write(header)
+            f.write(struct.pack("<Q", len(array)))
+            if quantized:
+                f.write(array.scales.astype("<f8").tobytes())
+            f.write((array.counts - self.count_offset).astype("<i8").tobytes())
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    @classmethod
+    def from_bin(cls, path: str, mmap: bool = False) -> 'AcquisitionData':
+        """
+        Load the data from a binary file. Requires NumPy.
+        Samples are returned as a `SampleArray`, quantized if stored quantized.
+
+        Args:
+            path: Path to the binary file.
+            mmap: If True, samples are memory-mapped read-only instead of loaded,
+                so recordings larger than memory can be processed in chunks.
+
+        Returns:
+            AcquisitionData: Data loaded from the binary file.
+
+        Raises:
+            ValueError: If the file is not a valid binary data file.
+        """
+        import numpy as np
+        with open(path, "rb") as f:
+            flags, channels, metadata = _read_bin_header(f)
+            device, config, start_time = _parse_csv_metadata(metadata)
+            try:
+                num_samples, = struct.unpack("<Q", f.read(8))
+                quantized = bool(flags & _BIN_FLAG_QUANTIZED)
+                scales = np.frombuffer(f.read(8 * len(channels)), dtype="<f8") if quantized else None
+                dtype = np.dtype("<i2") if quantized else np.dtype("<f4")
+                if mmap:
+                    offset = f.tell()
+                    size = num_samples * (8 + dtype.itemsize * len(channels))
+                    if os.fstat(f.fileno()).st_size < offset + size:
+                        raise ValueError("File is truncated")
+                    counts = np.memmap(path, dtype="<i8", mode="r", offset=offset, shape=(num_samples,)) \
+                        if num_samples else np.empty(0, dtype="<i8")
+                    values = np.memmap(path, dtype=dtype, mode="r", offset=offset + 8 * num_samples,
+                                       shape=(num_samples, len(channels))) \
+                        if num_samples else np.empty((0, len(channels)), dtype=dtype)
+                else:
+                    counts = np.frombuffer(f.read(8 * num_samples), dtype="<i8")
+                    values = np.frombuffer(f.read(dtype.itemsize * len(channels) * num_samples), dtype=dtype)
+                    values = values.reshape(num_samples, len(channels))
+            except (struct.error, ValueError) as e:
+                raise ValueError(f"Error parsing samples: {e}")
+        return cls(samples=SampleArray(counts, values, scales, channels),
+                   device=device,
+                   config=config,
+                   start_time=start_time,
+                   csv_path=path,
+                   channels=channels,
+                   resample_ratio=_parse_resample_ratio(metadata),
+                   clock=_parse_clock(metadata))
+
+    @classmethod
+    def from_file(cls, path: str, mmap: bool = False) -> 'AcquisitionData':
+        """
+        Load the data from a CSV or binary file. Format is detected from the file content.
+
+        Args:
+            path: Path to the data file.
+            mmap: If True, samples of binary files are memory-mapped, see `from_bin`.
+
+        Returns:
+            AcquisitionData: Data loaded from the file.
+
+        Raises:
+            ValueError: If an error occurs while parsing the file.
+        """
+        if _is_bin_file(path):
+            return cls.from_bin(path, mmap)
+        return cls.from_csv(path)
+
+    @classmethod
+    def read_metadata(cls, path: str) -> 'AcquisitionMetadata':
+        """
+        Read only the metadata header of a data file, without parsing the samples.
+
+        Args:
+            path: Path to the data file.
+
+        Returns:
+            AcquisitionMetadata: Metadata of the acquisition.
+
+        Raises:
+            ValueError: If an error occurs while parsing the header.
+        """
+        stat = os.stat(path)
+        if _is_bin_file(path):
+            with open(path, "rb") as f:
+                _, channels, metadata = _read_bin_header(f)
+        else:
+            with open(path, "r") as f:
+                reader = csv.reader(f)
+                metadata = []
+                try:
+                    for _ in range(5):
+                        metadata.append(next(reader))
+                    channels = _parse_csv_columns(next(reader))
+                except StopIteration:
+                    raise ValueError("Error parsing metadata: header incomplete")
+        device, config, start_time = _parse_csv_metadata(metadata)
+        try:
+            num_samples = int(metadata[2][0].split(": ")[1])
+            duration = float(metadata[2][1].split(": ")[1].split(" ")[0])
+            integrity = metadata[4][0].split(": ")[1] == "True"
+            skipped_samples = int(metadata[4][1].split(": ")[1])
+        except Exception as e:
+            raise ValueError(f"Error parsing metadata: {e}")
+        return AcquisitionMetadata(path=path,
+                                   device=device,
+                                   config=config,
+                                   start_time=start_time,
+                                   num_samples=num_samples,
+                                   duration=duration,
+                                   integrity=integrity,
+                                   skipped_samples=skipped_samples,
+                                   file_size=stat.st_size,
+                                   mtime=stat.st_mtime,
+                                   channels=channels,
+                                   resample_ratio=_parse_resample_ratio(metadata))
 
     @classmethod
     def from_csv(cls, path: str) -> 'AcquisitionData':
@@ -222,32 +741,29 @@ class AcquisitionData:
             try:
                 for _ in range(5):
                     metadata.append(next(reader))
-                start_time = datetime.fromisoformat(metadata[1][0].split(": ")[1])
-
-                unique_id = metadata[1][1].split(": ")[1].split(" ")[1][1:-1]
-                try:
-                    firmware = metadata[1][2].split(": ")[1]
-                except IndexError:
-                    firmware = "unknown"
-                device = DeviceInfo(unique_id, firmware)
-
-                sample_rate = float(metadata[3][0].split(" = ")[1].split(" ")[0])
-                filter = float(metadata[3][1].split(" = ")[1].split(" ")[0])
-                acc_range = float(metadata[3][2].split(" = ")[1].split(" ")[0])
-                gyro_range = float(metadata[3][3].split(" = ")[1].split(" ")[0])
-                config = Config(SampleRate.from_param_value(sample_rate),
-                                Filter.from_param_value(filter),
-                                AccRange.from_param_value(acc_range),
-                                GyroRange.from_param_value(gyro_range))
-            except Exception as e:
-                raise ValueError(f"Error parsing metadata: {e}")
-            next(reader)
+            except StopIteration:
+                raise ValueError("Error parsing metadata: header incomplete")
+            device, config, start_time = _parse_csv_metadata(metadata)
+            try:
+                channels = _parse_csv_columns(next(reader))
+            except StopIteration:
+                raise ValueError("Error parsing metadata: header incomplete")
 
             samples = []
             try:
-                for row in reader:
-                    count, a_x, a_y, a_z, g_x, g_y, g_z = map(float, row)
-                    samples.append(IMUSample(int(count), a_x, a_y, a_z, g_x, g_y, g_z))
+                if channels == CHANNELS:
+                    for row in reader:
+                        count, a_x, a_y, a_z, g_x, g_y, g_z = map(float, row)
+                        samples.append(IMUSample(int(count), a_x, a_y, a_z, g_x, g_y, g_z))
+                else:
+                    indices = [CHANNELS.index(c) for c in channels]
+                    for row in reader:
+                        values: List[Optional[float]] = [None] * len(CHANNELS)
+                        if len(row) != len(indices) + 1:
+                            raise ValueError(f"Invalid row: {row}")
+                        for i, v in zip(indices, row[1:]):
+                            values[i] = float(v)
+                        samples.append(IMUSample(int(float(row[0])), *values))
             except Exception as e:
                 raise ValueError(f"Error parsing samples: {e}")
             
@@ -255,4 +771,196 @@ class AcquisitionData:
                        device=device,
                        config=config,
                        start_time=start_time,
-                       csv_path=path)
+                       csv_path=path,
+                       channels=channels,
+                       resample_ratio=_parse_resample_ratio(metadata),
+                       clock=_parse_clock(metadata))
+
+
+_BIN_MAGIC = b"PQDATA"
+_BIN_VERSION = 1
+_BIN_FLAG_QUANTIZED = 0x01
+
+
+def _is_bin_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(_BIN_MAGIC)) == _BIN_MAGIC
+
+
+def _read_bin_header(f) -> Tuple[int, Tuple[str, ...], List[List[str]]]:
+    """
+    Reads the binary file header. Returns flags, stored channels and metadata rows.
+
+    Raises:
+        ValueError: If the file is not a valid binary data file.
+    """
+    if f.read(len(_BIN_MAGIC)) != _BIN_MAGIC:
+        raise ValueError("Not a PicoQuake binary data file")
+    try:
+        version, flags, channel_mask, header_len = struct.unpack("<BBBI", f.read(7))
+    except struct.error:
+        raise ValueError("Error parsing metadata: header incomplete")
+    if version != _BIN_VERSION:
+        raise ValueError(f"Unsupported binary file version: {version}")
+    channels = tuple(c for i, c in enumerate(CHANNELS) if channel_mask & (1 << i))
+    header = f.read(header_len).decode("utf-8")
+    metadata = list(csv.reader(io.StringIO(header)))
+    if len(metadata) < 5:
+        raise ValueError("Error parsing metadata: header incomplete")
+    return flags, channels, metadata
+
+
+class _CountKeys:
+    """Sequence of sample counts used for binary search, without copying the samples."""
+
+    def __init__(self, samples: List[IMUSample]):
+        self._samples = samples
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __getitem__(self, index: int) -> int:
+        return self._samples[index].count
+
+
+@dataclass
+class AcquisitionMetadata:
+    """
+    Data class for storing the metadata of a recording, read without loading the samples.
+
+    Attributes:
+        path: Path to the data file.
+        device: Device information.
+        config: Acquisition configuration.
+        start_time: Start time of the acquisition.
+        num_samples: Number of samples in the acquisition.
+        duration: Duration of the acquisition in seconds.
+        integrity: Whether the acquisition has integrity (no skipped samples).
+        skipped_samples: Number of skipped samples.
+        file_size: Size of the data file in bytes.
+        mtime: Modification time of the data file (seconds since epoch).
+        channels: Names of the stored channels.
+        resample_ratio: Ratio of the sample rate to the configured device sample rate.
+        sample_rate: Sample rate of the data in Hz.
+    """
+    path: str
+    device: DeviceInfo
+    config: Config
+    start_time: datetime
+    num_samples: int
+    duration: float
+    integrity: bool
+    skipped_samples: int
+    file_size: int
+    mtime: float
+    channels: Tuple[str, ...] = CHANNELS
+    resample_ratio: Fraction = Fraction(1)
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def sample_rate(self) -> float:
+        return float(self.config.sample_rate.param_value * self.resample_ratio)
+
+    def __str__(self) -> str:
+        return (f"device = {self.device.short_id}, "
+                f"start_time = {self.start_time.isoformat(sep=' ')}, "
+                f"num_samples = {self.num_samples}, "
+                f"duration = {self.duration:.2f}s, "
+                f"skipped = {self.skipped_samples}")
+
+
+def _parse_csv_columns(row: List[str]) -> Tuple[str, ...]:
+    """
+    Parses the column header row of the CSV file. Returns the stored channels.
+
+    Raises:
+        ValueError: If the column header is invalid.
+    """
+    if len(row) < 2 or row[0] != "count" or any(c not in _CSV_COLUMNS for c in row[1:]):
+        raise ValueError(f"Error parsing metadata: invalid columns {row}")
+    return tuple(CHANNELS[_CSV_COLUMNS.index(c)] for c in row[1:])
+
+
+def _parse_csv_metadata(metadata: List[List[str]]) -> Tuple[DeviceInfo, Config, datetime]:
+    """
+    Parses device information, configuration and start time from the CSV metadata rows.
+
+    Raises:
+        ValueError: If an error occurs while parsing the metadata.
+    """
+    try:
+        start_time = datetime.fromisoformat(metadata[1][0].split(": ")[1])
+
+        unique_id = metadata[1][1].split(": ")[1].split(" ")[1][1:-1]
+        try:
+            firmware = metadata[1][2].split(": ")[1]
+        except IndexError:
+            firmware = "unknown"
+        device = DeviceInfo(unique_id, firmware)
+
+        sample_rate = float(metadata[3][0].split(" = ")[1].split(" ")[0])
+        filter = float(metadata[3][1].split(" = ")[1].split(" ")[0])
+        acc_range = float(metadata[3][2].split(" = ")[1].split(" ")[0])
+        gyro_range = float(metadata[3][3].split(" = ")[1].split(" ")[0])
+        config = Config(SampleRate.from_param_value(sample_rate),
+                        Filter.from_param_value(filter),
+                        AccRange.from_param_value(acc_range),
+                        GyroRange.from_param_value(gyro_range))
+    except Exception as e:
+        raise ValueError(f"Error parsing metadata: {e}")
+    return device, config, start_time
+
+
+def _resample_header(ratio: Fraction) -> str:
+    """Returns the resample ratio entry appended to the Config header line, empty if not resampled."""
+    return "" if ratio == 1 else f", resample_ratio = {ratio}"
+
+
+def _clock_header(clock: Optional[ClockFit], count_offset: int) -> str:
+    """Returns the clock entries appended to the Time header line for counts with `count_offset` applied."""
+    if clock is None:
+        return ""
+    clock = clock.rebase(count_offset)
+    return f", clock_rate = {clock.rate!r} Hz, clock_origin = {clock.datetime(0).isoformat(sep=' ')}, " \
+           f"clock_jitter = {clock.jitter * 1e3:.3f} ms"
+
+
+def _parse_clock(metadata: List[List[str]]) -> Optional[ClockFit]:
+    """
+    Parses the clock fit from the Time metadata row. None for files without it.
+
+    Raises:
+        ValueError: If the clock entries are invalid.
+    """
+    items = {}
+    for item in metadata[1][3:]:
+        key, _, value = item.partition(" = ")
+        items[key.strip()] = value.strip()
+    if "clock_rate" not in items:
+        return None
+    try:
+        return ClockFit(float(items["clock_rate"].split(" ")[0]),
+                        datetime.fromisoformat(items["clock_origin"]).timestamp(),
+                        float(items.get("clock_jitter", "0").split(" ")[0]) * 1e-3)
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Error parsing metadata: {e}")
+
+
+def _parse_resample_ratio(metadata: List[List[str]]) -> Fraction:
+    """
+    Parses the resample ratio from the Config metadata row. Files without it were not resampled.
+
+    Raises:
+        ValueError: If the resample ratio is invalid.
+    """
+    for item in metadata[3][4:]:
+        key, _, value = item.partition(" = ")
+        if key.strip() == "resample_ratio":
+            try:
+                return Fraction(value.strip())
+            except (ValueError, ZeroDivisionError) as e:
+                raise ValueError(f"Error parsing metadata: {e}")
+    return Fraction(1)
@@ -0,0 +1,244 @@
+"""
+This module implements anti-aliased decimation and rational resampling of acquired data. Requires NumPy and SciPy.
+"""
+
+import logging
+from dataclasses import replace
+from fractions import Fraction
+from math import gcd
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from .data import AcquisitionData, IMUSample, SampleArray, CHANNELS
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1 << 16
+
+
+class Resampler:
+    """
+    Polyphase FIR resampler by a rational factor `up / down`, with filter state carried between blocks.
+    Filtering the blocks of a stream one by one gives the same output as resampling the whole stream,
+    which is equal to `scipy.signal.resample_poly` with the same window.
+
+    The filter delay is compensated, so output sample `m` corresponds to input sample `m * down / up`.
+    As a consequence, output lags the input by half of the filter length. Call `flush` at the end
+    of the stream to get the remaining samples.
+
+    Attributes:
+        up: Upsampling factor.
+        down: Downsampling factor.
+        ratio: Output sample rate relative to the input.
+        num_taps: Length of the anti-aliasing filter.
+
+    Methods:
+        process: Resamples a block of values.
+        process_samples: Resamples a list of samples or a `SampleArray`.
+        flush: Returns the remaining output at the end of the stream.
+        reset: Clears the filter state.
+    """
+
+    def __init__(self, up: int, down: int = 1, window: Union[str, Tuple] = ("kaiser", 5.0)):
+        """
+        Initializes the resampler and designs the anti-aliasing filter.
+
+        Args:
+            up: Upsampling factor.
+            down: Downsampling factor.
+            window: Window used for the FIR filter design, as accepted by `scipy.signal.firwin`.
+
+        Raises:
+            ValueError: If a factor is not a positive integer.
+        """
+        from scipy.signal import firwin
+        if up < 1 or down < 1 or int(up) != up or int(down) != down:
+            raise ValueError("Resampling factors must be positive integers")
+        g = gcd(int(up), int(down))
+        self.up = int(up) // g
+        self.down = int(down) // g
+        self.ratio = Fraction(self.up, self.down)
+
+        # same design as scipy.signal.resample_poly
+        max_rate = max(self.up, self.down)
+        if max_rate == 1:
+            half_len, h, n_pre_pad = 0, np.ones(1), 0
+        else:
+            half_len = 10 * max_rate
+            h = firwin(2 * half_len + 1, 1.0 / max_rate, window=window) * self.up
+            # pad the filter, so the delay is a whole number of output samples
+            n_pre_pad = self.down - half_len % self.down
+        self.num_taps = len(h)
+        self._delay = (half_len + n_pre_pad) // self.down
+        h = np.concatenate((np.zeros(n_pre_pad), h))
+        taps_per_phase = -(-len(h) // self.up)
+        h = np.concatenate((h, np.zeros(taps_per_phase * self.up - len(h))))
+        # phase p uses h[p], h[p + up], ..., reversed to match the order of input windows
+        self._phases = h.reshape(taps_per_phase, self.up).T[:, ::-1].copy()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the filter state. The next block starts a new stream.
+        """
+        self._history: Optional[np.ndarray] = None
+        self._num_in = 0
+        self._num_out = 0
+        self._count_start: Optional[int] = None
+
+    def process(self, block) -> np.ndarray:
+        """
+        Resamples a block of values.
+
+        Args:
+            block: Array of shape (n,) or (n, k). The number of columns must not change between blocks.
+
+        Returns:
+            Resampled values, shape (m, k), or (m,) for one dimensional input.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            return self._process(block[:, np.newaxis])[:, 0]
+        return self._process(block)
+
+    def process_samples(self, samples: Union[List[IMUSample], SampleArray],
+                        channels: Tuple[str, ...] = CHANNELS) -> SampleArray:
+        """
+        Resamples a list of samples or a `SampleArray`.
+        Counts of the output are in units of the output sample period, starting from the
+        first input count scaled by the ratio.
+
+        Args:
+            samples: Samples to resample, without skipped samples.
+            channels: Channels to resample, if `samples` is a list.
+
+        Returns:
+            Resampled samples.
+        """
+        if isinstance(samples, SampleArray):
+            channels = samples.channels
+            values = samples.to_array()
+            first = int(samples.counts[0]) if len(samples) else None
+        else:
+            values = SampleArray.from_samples(samples, channels=channels).to_array()
+            first = samples[0].count if len(samples) else None
+        if self._count_start is None and first is not None:
+            self._count_start = first * self.up // self.down
+        start = max(0, self._num_out - self._delay)
+        out = self._process(values.reshape(-1, len(channels)))
+        return self._to_samples(out, start, channels)
+
+    def flush(self, channels: Optional[Tuple[str, ...]] = None) -> Union[np.ndarray, SampleArray]:
+        """
+        Returns the remaining output at the end of the stream and resets the state.
+        The input is extended with zeros, as in `scipy.signal.resample_poly`.
+
+        Args:
+            channels: If specified, the output is returned as a `SampleArray` with these channels,
+                to continue the output of `process_samples`.
+
+        Returns:
+            Remaining values, shape (m, k), or samples if `channels` is specified.
+        """
+        k = 1 if self._history is None else self._history.shape[1]
+        target = -(-self._num_in * self.up // self.down) + self._delay
+        last_index = (target - 1) * self.down // self.up if target > 0 else -1
+        n_zeros = max(0, last_index + 1 - self._num_in)
+        start = max(0, self._num_out - self._delay)
+        out = self._process(np.zeros((n_zeros, k)))
+        out = out[:max(0, target - self._delay - start)]
+        if channels is not None:
+            result: Union[np.ndarray, SampleArray] = self._to_samples(out, start, channels)
+        else:
+            result = out
+        self.reset()
+        return result
+
+    def _process(self, block: np.ndarray) -> np.ndarray:
+        taps = self._phases.shape[1]
+        if self._history is None:
+            self._history = np.zeros((taps - 1, block.shape[1]))
+        elif block.shape[1] != self._history.shape[1]:
+            raise ValueError(f"Expected {self._history.shape[1]} columns, got {block.shape[1]}")
+        if len(block) == 0:
+            return np.empty((0, block.shape[1]))
+        buf = np.concatenate((self._history, block))
+        first_index = self._num_in - (taps - 1)
+        self._num_in += len(block)
+        # outputs whose newest input sample is available
+        end = -(-self._num_in * self.up // self.down)
+        m = np.arange(self._num_out, end, dtype=np.int64)
+        n = m * self.down
+        index = n // self.up
+        phase = n % self.up
+        windows = np.lib.stride_tricks.sliding_window_view(buf, taps, axis=0)
+        start = index - (taps - 1) - first_index
+        out = np.empty((len(m), block.shape[1]))
+        # outputs of one phase share the coefficients, apply them as a matrix product
+        for p in range(min(self.up, len(m))):
+            out[p::self.up] = windows[start[p::self.up]] @ self._phases[phase[p]]
+        self._num_out = end
+        self._history = buf[len(buf) - (taps - 1):].copy()
+        # drop outputs before the filter delay
+        skip = max(0, self._delay - int(m[0])) if len(m) else 0
+        return out[skip:]
+
+    def _to_samples(self, values: np.ndarray, start: int, channels: Tuple[str, ...]) -> SampleArray:
+        counts = (self._count_start or 0) + np.arange(start, start + len(values))
+        return SampleArray(counts, values, channels=channels)
+
+
+def resample(data: AcquisitionData, up: int, down: int = 1,
+             window: Union[str, Tuple] = ("kaiser", 5.0), chunk_size: int = _CHUNK_SIZE) -> AcquisitionData:
+    """
+    Resamples acquisition data by a rational factor `up / down`.
+    Samples are processed in chunks, so memory-mapped data is not fully loaded.
+
+    Args:
+        data: Acquisition data.
+        up: Upsampling factor.
+        down: Downsampling factor.
+        window: Window used for the FIR filter design.
+        chunk_size: Number of samples processed at once.
+
+    Returns:
+        Resampled data. The resample ratio is recorded, so `sample_rate` is the new sample rate
+        and counts are in units of the new sample period.
+    """
+    resampler = Resampler(up, down, window)
+    if not data.integrity:
+        logger.warning(f"Resampling data with {data.skipped_samples} skipped samples, gaps are ignored.")
+    samples = data.samples
+    if not isinstance(samples, SampleArray):
+        samples = SampleArray.from_samples(samples, channels=data.channels)
+    columns = [samples.channels.index(c) for c in data.channels]
+    if data.num_samples > 0:
+        blocks = [resampler.process(samples[i:i + chunk_size].to_array()[:, columns])
+                  for i in range(0, len(samples), chunk_size)]
+        values = np.concatenate(blocks + [resampler.flush()])
+    else:
+        values = np.empty((0, len(data.channels)))
+    first = data.sample_count(0) if data.num_samples else 0
+    counts = first * resampler.up // resampler.down + np.arange(len(values))
+    return replace(data,
+                   samples=SampleArray(counts, values, channels=data.channels),
+                   csv_path=None,
+                   count_offset=0,
+                   resample_ratio=data.resample_ratio * resampler.ratio,
+                   clock=None if data.clock is None else data.clock.rebase(data.count_offset, resampler.ratio))
+
+
+def decimate(data: AcquisitionData, factor: int, **kwargs) -> AcquisitionData:
+    """
+    Decimates acquisition data by an integer factor, see `resample`.
+
+    Args:
+        data: Acquisition data.
+        factor: Decimation factor.
+        **kwargs: Arguments passed to `resample`.
+
+    Returns:
+        Decimated data.
+    """
+    return resample(data, 1, factor, **kwargs)
@@ -0,0 +1,310 @@
+"""
+This module implements discovery of PicoQuake devices connected by USB,
+with a registry of known devices cached between runs.
+"""
+
+import json
+import logging
+import os
+import platform
+from dataclasses import asdict, dataclass
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+from serial.tools.list_ports import comports
+
+from .data import DeviceInfo
+
+VID = 0x2E8A
+PID = 0xA
+
+_DEV_DIR = "/dev"
+_DEV_PREFIXES = ("ttyACM", "cu.usbmodem", "tty.usbmodem")
+_SYSFS_TTY = "/sys/class/tty"
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DeviceEntry:
+    """
+    Data class for storing a connected device.
+
+    Attributes:
+        short_id: The 4-character ID written on the device label.
+        unique_id: The unique ID of the device, reported as USB serial number.
+        port: The serial port the device is connected to.
+    """
+    short_id: str
+    unique_id: str
+    port: str
+
+
+def default_cache_path() -> str:
+    """
+    Returns the default path of the registry cache file in the user's cache directory.
+    """
+    if platform.system() == 'Windows':
+        return os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'picoquake', 'devices.json')
+    elif platform.system() == 'Darwin':
+        return os.path.expanduser('~/Library/Caches/picoquake/devices.json')
+    return os.path.join(os.path.expanduser('~'), '.picoquake', 'devices.json')
+
+
+class DeviceRegistry:
+    """
+    Registry of connected devices, mapping short IDs to unique IDs and ports.
+
+    Devices are found by enumerating serial ports, which is slow on systems with many ports.
+    Found devices are cached, also in a file shared between processes, and a cached port is used
+    as long as it still exists and, on Linux, still belongs to the same USB device.
+
+    Methods:
+        discover: Enumerates serial ports and updates the registry.
+        find: Returns the port of a device, from the cache if valid.
+        invalidate: Removes a device from the cache.
+        devices: Returns the cached devices.
+        watch: Watches for connected and disconnected devices.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Args:
+            cache_path: Path of the cache file, `default_cache_path()` if None. Empty string disables the file.
+        """
+        self.cache_path = default_cache_path() if cache_path is None else cache_path
+        self._entries: Dict[str, DeviceEntry] = {}
+        self._lock = Lock()
+        self._load()
+
+    def discover(self) -> List[DeviceEntry]:
+        """
+        Enumerates serial ports once and updates the registry with all connected devices.
+
+        Returns:
+            The connected devices, sorted by port.
+        """
+        found = []
+        for p in comports():
+            if p.vid == VID and p.pid == PID and p.serial_number:
+                found.append(DeviceEntry(DeviceInfo.unique_id_to_short_id(p.serial_number), p.serial_number, p.device))
+        found.sort(key=lambda e: e.port)
+        with self._lock:
+            self._entries = {e.short_id: e for e in found}
+        self._save()
+        return found
+
+    def find(self, short_id: str, refresh: bool = True) -> Optional[str]:
+        """
+        Returns the port of a device.
+
+        Args:
+            short_id: The 4-character ID written on the device label.
+            refresh: If the device is not cached or the cached port is not valid, enumerate ports.
+
+        Returns:
+            The port, or None if the device is not connected.
+        """
+        short_id = short_id.upper()
+        with self._lock:
+            entry = self._entries.get(short_id)
+        if entry is not None and _is_valid(entry):
+            return entry.port
+        if not refresh:
+            return None
+        for entry in self.discover():
+            if entry.short_id == short_id:
+                return entry.port
+        return None
+
+    def invalidate(self, short_id: str):
+        """
+        Removes a device from the cache, e.g. when the cached port belongs to another device.
+        """
+        with self._lock:
+            removed = self._entries.pop(short_id.upper(), None)
+        if removed is not None:
+            self._save()
+
+    def devices(self) -> List[DeviceEntry]:
+        """
+        Returns the cached devices with valid ports, without enumerating ports.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted((e for e in entries if _is_valid(e)), key=lambda e: e.port)
+
+    def watch(self, on_added: Optional[Callable[[DeviceEntry], None]] = None,
+              on_removed: Optional[Callable[[DeviceEntry], None]] = None,
+              interval: float = 0.5) -> "DeviceWatcher":
+        """
+        Starts watching for connected and disconnected devices. See `DeviceWatcher`.
+
+        Args:
+            on_added: Called with each connected device, in the watcher thread.
+            on_removed: Called with each disconnected device, in the watcher thread.
+            interval: Polling interval in seconds.
+
+        Returns:
+            The started watcher. Call `stop` to stop it.
+        """
+        watcher = DeviceWatcher(self, on_added, on_removed, interval)
+        watcher.start()
+        return watcher
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "r") as f:
+                entries = [DeviceEntry(**e) for e in json.load(f)["devices"]]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _logger.debug(f"Ignoring device cache {self.cache_path}: {e}")
+            return
+        self._entries = {e.short_id: e for e in entries}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            devices = [asdict(e) for e in self._entries.values()]
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({"devices": devices}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            _logger.debug(f"Could not write device cache {self.cache_path}: {e}")
+
+
+class DeviceWatcher:
+    """
+    Thread watching for connected and disconnected devices.
+
+    Where device nodes are in '/dev', the directory is polled for serial device nodes, which is cheap,
+    and ports are only enumerated when nodes appear or disappear. Elsewhere ports are enumerated on each poll.
+    The registry is updated with the found devices.
+
+    Attributes:
+        devices: The connected devices by short ID.
+    """
+
+    def __init__(self, registry: DeviceRegistry,
+                 on_added: Optional[Callable[[DeviceEntry], None]] = None,
+                 on_removed: Optional[Callable[[DeviceEntry], None]] = None,
+                 interval: float = 0.5):
+        self.registry = registry
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.interval = interval
+        self.devices: Dict[str, DeviceEntry] = {}
+        self._stop_event = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """
+        Starts the watcher thread. The devices connected at start are reported as added.
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the watcher thread.
+        """
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        nodes = None
+        settling = False
+        while True:
+            current = _device_nodes()
+            changed = current is None or current != nodes
+            if changed or settling:
+                # USB attributes of a new node may appear later, discover again on the next poll
+                settling = changed
+                nodes = current
+                try:
+                    self._update(self.registry.discover())
+                except Exception as e:
+                    _logger.error(f"Device discovery failed: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+    def _update(self, found: List[DeviceEntry]):
+        current = {e.short_id: e for e in found}
+        for short_id, entry in list(self.devices.items()):
+            if current.get(short_id) != entry:
+                del self.devices[short_id]
+                if self.on_removed is not None:
+                    self.on_removed(entry)
+        for short_id, entry in current.items():
+            if short_id not in self.devices:
+                self.devices[short_id] = entry
+                if self.on_added is not None:
+                    self.on_added(entry)
+
+
+def _device_nodes() -> Optional[frozenset]:
+    """
+    Returns the names of serial device nodes in '/dev', or None if there is no '/dev'.
+    """
+    try:
+        return frozenset(n for n in os.listdir(_DEV_DIR) if n.startswith(_DEV_PREFIXES))
+    except OSError:
+        return None
+
+
+def _is_valid(entry: DeviceEntry) -> bool:
+    """
+    Checks if a cached device is still connected to its port, without enumerating ports.
+    On Linux the USB serial number of the port is compared, elsewhere only the port is checked to exist.
+    On Windows COM ports are not files and cannot be checked, a stale port is found when opening it,
+    see `PicoQuake.__init__`.
+    """
+    if os.name == "nt":
+        return True
+    if not os.path.exists(entry.port):
+        return False
+    name = os.path.basename(os.path.realpath(entry.port))
+    try:
+        with open(os.path.join(_SYSFS_TTY, name, "device", "..", "serial"), "r") as f:
+            return f.read().strip().upper() == entry.unique_id.upper()
+    except OSError:
+        return True
+
+
+_registry: Optional[DeviceRegistry] = None
+
+
+def get_registry() -> DeviceRegistry:
+    """
+    Returns the registry shared by the library, using the default cache file.
+    """
+    global _registry
+    if _registry is None:
+        _registry = DeviceRegistry()
+    return _registry
+
+
+def find_port(short_id: str) -> Optional[str]:
+    """
+    Returns the port of a connected device, using the shared registry.
+
+    Args:
+        short_id: The 4-character ID written on the device label.
+
+    Returns:
+        The port, or None if the device is not connected.
+    """
+    return get_registry().find(short_id)
+
+
+def list_devices() -> List[DeviceEntry]:
+    """
+    Enumerates serial ports and returns all connected devices, updating the shared registry.
+    """
+    return get_registry().discover()
@@ -0,0 +1,284 @@
+"""
+This module implements condition monitoring features computed over sliding windows. Requires NumPy.
+"""
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .data import AcquisitionData, IMUSample, SampleArray, parse_channels
+from .filtering import SOSFilter
+
+FEATURES = ("rms", "peak", "crest", "kurtosis", "skewness", "p2p", "velocity_rms")
+"""Available features. Band energies are selected separately by frequency band."""
+
+STANDARD_GRAVITY = 9.80665
+
+# number of values processed at once, bounds the size of temporary arrays
+_CHUNK_ELEMENTS = 1 << 22
+
+
+class FeatureExtractor:
+    """
+    Computes features over sliding windows of a stream of sample blocks.
+    All windows and channels of a block are processed with array operations, without per-window loops.
+    Samples of an incomplete window are kept until the next block.
+
+    Features of each channel:
+
+    - `rms`: Root mean square.
+    - `peak`: Maximum absolute value.
+    - `crest`: Crest factor, peak / rms.
+    - `kurtosis`: Kurtosis, 3.0 for normal distribution.
+    - `skewness`: Skewness.
+    - `p2p`: Peak to peak value.
+    - `velocity_rms`: RMS of velocity in mm/s, integrated from acceleration in g
+      within `velocity_band`, as used by ISO 10816 / 20816 severity ratings.
+    - Band energies: Mean square value within a frequency band, in (unit)^2.
+
+    Attributes:
+        sample_rate: The sample rate in Hz.
+        window: Window length in samples.
+        step: Step between windows in samples.
+        features: Selected features.
+        bands: Frequency bands of band energies in Hz.
+        channels: Channel names of the columns.
+        dtype: Data type of the result records.
+
+    Methods:
+        update: Adds a block of values and returns features of completed windows.
+        update_samples: Adds a list of samples or a `SampleArray`.
+        reset: Clears the buffered samples.
+    """
+
+    def __init__(self, sample_rate: float, window: int, step: Optional[int] = None,
+                 features: Sequence[str] = FEATURES, bands: Sequence[Tuple[float, float]] = (),
+                 channels: Sequence[str] = ("acc_x", "acc_y", "acc_z"), detrend: bool = True,
+                 velocity_band: Tuple[float, float] = (10.0, 1000.0),
+                 sos_filter: Optional[SOSFilter] = None):
+        """
+        Initializes the extractor.
+
+        Args:
+            sample_rate: The sample rate in Hz.
+            window: Window length in samples.
+            step: Step between windows in samples. Defaults to `window`, i.e. windows do not overlap.
+            features: Selected features, see `FEATURES`.
+            bands: Frequency bands (low, high) in Hz for band energies.
+            channels: Channel names of the columns. Must be valid channel names for `update_samples`.
+            detrend: If True, the mean of each window is removed before computing rms, peak, crest and p2p.
+            velocity_band: Frequency band of the velocity RMS in Hz.
+            sos_filter: Filter applied to the samples before computing features, with state carried between blocks.
+
+        Raises:
+            ValueError: If parameters are invalid.
+        """
+        if window < 2:
+            raise ValueError("Window must be at least 2 samples")
+        if step is None:
+            step = window
+        if step < 1:
+            raise ValueError("Step must be positive")
+        unknown = [f for f in features if f not in FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(unknown)}")
+        self.sample_rate = sample_rate
+        self.window = window
+        self.step = step
+        self.features = tuple(features)
+        self.bands = tuple((float(lo), float(hi)) for lo, hi in bands)
+        self.channels = tuple(channels)
+        self.detrend = detrend
+        self.sos_filter = sos_filter
+        freqs = np.fft.rfftfreq(window, 1 / sample_rate)
+        # one-sided spectrum weights for Parseval's theorem
+        weights = np.full(len(freqs), 2.0 / window ** 2)
+        weights[0] /= 2
+        if window % 2 == 0:
+            weights[-1] /= 2
+        self._band_weights = [np.where((freqs >= lo) & (freqs < hi), weights, 0.0) for lo, hi in self.bands]
+        lo, hi = velocity_band
+        with np.errstate(divide="ignore"):
+            omega = 2 * np.pi * freqs
+            velocity = np.where((freqs >= lo) & (freqs <= hi) & (freqs > 0),
+                                (STANDARD_GRAVITY * 1000 / omega) ** 2, 0.0)
+        self._velocity_weights = weights * velocity
+        self.dtype = np.dtype([("time", np.float64)] + [(name, np.float64) for name in self._names()])
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the buffered samples and the filter state. The next block starts at time 0.
+        """
+        if self.sos_filter is not None:
+            self.sos_filter.reset()
+        self._tail: Optional[np.ndarray] = None
+        self._start = 0
+        self._time_offset = 0.0
+
+    def update(self, block) -> np.recarray:
+        """
+        Adds a block of values and returns features of the windows completed by it.
+
+        Args:
+            block: Array of shape (n, k) with one column per channel, or (n,) for one channel.
+
+        Returns:
+            Record array with one record per window. Field `time` is the start of the window in seconds,
+            other fields are named `<channel>_<feature>` and `<channel>_band_<low>_<high>`.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if block.shape[1] != len(self.channels):
+            raise ValueError(f"Expected {len(self.channels)} columns, got {block.shape[1]}")
+        if self.sos_filter is not None:
+            block = self.sos_filter.process(block)
+        buf = block if self._tail is None else np.concatenate((self._tail, block))
+        n_win = 0 if len(buf) < self.window else (len(buf) - self.window) // self.step + 1
+        columns: List[List[np.ndarray]] = []
+        if n_win:
+            windows = np.lib.stride_tricks.sliding_window_view(buf, self.window, axis=0)[::self.step][:n_win]
+            chunk = max(1, _CHUNK_ELEMENTS // (self.window * len(self.channels)))
+            for i in range(0, n_win, chunk):
+                columns.append(self._compute(windows[i:i + chunk]))
+        result = np.recarray(n_win, dtype=self.dtype)
+        result["time"] = self._time_offset + (self._start + np.arange(n_win) * self.step) / self.sample_rate
+        names = self.dtype.names[1:]
+        if n_win:
+            for j, values in enumerate(zip(*columns)):
+                # values of one feature for all channels, shape (n_win, k)
+                stacked = np.concatenate(values)
+                for c in range(len(self.channels)):
+                    result[names[j * len(self.channels) + c]] = stacked[:, c]
+        self._start += n_win * self.step
+        self._tail = buf[n_win * self.step:].copy()
+        return result
+
+    def update_samples(self, samples: Union[List[IMUSample], SampleArray]) -> np.recarray:
+        """
+        Adds a list of samples or a `SampleArray`, e.g. from a live acquisition.
+        Times of the result are relative to the count of the first sample received.
+
+        Args:
+            samples: Samples to add.
+
+        Returns:
+            Record array with one record per completed window, see `update`.
+        """
+        if len(samples) == 0:
+            return self.update(np.empty((0, len(self.channels))))
+        if self._tail is None:
+            first = samples.counts[0] if isinstance(samples, SampleArray) else samples[0].count
+            self._time_offset = int(first) / self.sample_rate
+        values = SampleArray.from_samples(samples, channels=self.channels).to_array()
+        return self.update(values)
+
+    def _names(self) -> List[str]:
+        names = []
+        for feature in self.features:
+            names += [f"{c}_{feature}" for c in self.channels]
+        for lo, hi in self.bands:
+            names += [f"{c}_band_{lo:g}_{hi:g}" for c in self.channels]
+        return names
+
+    def _compute(self, windows: np.ndarray) -> List[np.ndarray]:
+        """
+        Computes selected features of windows with shape (w, k, window).
+        Returns one array of shape (w, k) per feature, in order of the record fields.
+        """
+        selected = set(self.features)
+        mean = windows.mean(axis=-1)
+        centred = windows - mean[..., np.newaxis]
+        values = centred if self.detrend else windows
+        computed = {}
+        squared = centred * centred
+        m2 = squared.mean(axis=-1)
+        if selected & {"rms", "crest"}:
+            computed["rms"] = np.sqrt(m2 if self.detrend else m2 + mean ** 2)
+        if selected & {"peak", "crest", "p2p"}:
+            high = values.max(axis=-1)
+            low = values.min(axis=-1)
+            computed["peak"] = np.maximum(high, -low)
+            computed["p2p"] = high - low
+        if "crest" in selected:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                computed["crest"] = computed["peak"] / computed["rms"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if "skewness" in selected:
+                computed["skewness"] = np.einsum("...i,...i->...", squared, centred) / self.window / m2 ** 1.5
+            if "kurtosis" in selected:
+                computed["kurtosis"] = np.einsum("...i,...i->...", squared, squared) / self.window / m2 ** 2
+        if "velocity_rms" in selected or self.bands:
+            spectrum = np.fft.rfft(centred, axis=-1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            if "velocity_rms" in selected:
+                computed["velocity_rms"] = np.sqrt(power @ self._velocity_weights)
+        result = [computed[f] for f in self.features]
+        for weights in self._band_weights:
+            result.append(power @ weights)
+        return result
+
+
+def extract(values, sample_rate: float, window: int, step: Optional[int] = None,
+            channels: Optional[Tuple[str, ...]] = None, **kwargs) -> np.recarray:
+    """
+    Computes features over sliding windows of an array, see `FeatureExtractor`.
+
+    Args:
+        values: Array of shape (N, k) with one column per channel, or (N,) for one channel.
+        sample_rate: The sample rate in Hz.
+        window: Window length in samples.
+        step: Step between windows in samples. Defaults to `window`.
+        channels: Channel names of the columns. Defaults to acceleration channels for 3 columns,
+            otherwise to column numbers.
+        **kwargs: Arguments passed to `FeatureExtractor`.
+
+    Returns:
+        Record array with one record per window.
+    """
+    values = np.asarray(values)
+    if channels is None:
+        k = 1 if values.ndim == 1 else values.shape[1]
+        channels = ("acc_x", "acc_y", "acc_z") if k == 3 else tuple(str(i) for i in range(k))
+    extractor = FeatureExtractor(sample_rate, window, step, channels=channels, **kwargs)
+    return extractor.update(values)
+
+
+def extract_data(data: AcquisitionData, window: float, step: Optional[float] = None,
+                 channels: Union[str, List[str], None] = "acc", **kwargs) -> np.recarray:
+    """
+    Computes features over sliding windows of an acquisition, see `FeatureExtractor`.
+    Samples are converted in chunks, so memory-mapped data is not fully loaded.
+
+    Args:
+        data: Acquisition data.
+        window: Window length in seconds.
+        step: Step between windows in seconds. Defaults to `window`.
+        channels: Channels to analyze.
+        **kwargs: Arguments passed to `FeatureExtractor`.
+
+    Returns:
+        Record array with one record per window. Field `time` uses the sample counts of the data.
+    """
+    channels = parse_channels(channels)
+    missing = [c for c in channels if c not in data.channels]
+    if missing:
+        raise ValueError(f"Channels not present in data: {', '.join(missing)}")
+    fs = data.sample_rate
+    extractor = FeatureExtractor(fs, int(round(window * fs)),
+                                 None if step is None else int(round(step * fs)),
+                                 channels=channels, **kwargs)
+    samples = data.samples
+    if not isinstance(samples, SampleArray):
+        samples = SampleArray.from_samples(samples, channels=data.channels)
+    columns = [samples.channels.index(c) for c in channels]
+    chunk = max(extractor.window, _CHUNK_ELEMENTS // len(channels))
+    results = [extractor.update(samples[i:i + chunk].to_array()[:, columns])
+               for i in range(0, len(samples), chunk)]
+    if not results:
+        return np.recarray(0, dtype=extractor.dtype)
+    result = np.concatenate(results).view(np.recarray)
+    if data.num_samples:
+        result["time"] += (int(samples.counts[0]) - data.count_offset) / fs
+    return result
@@ -0,0 +1,200 @@
+"""
+This module implements host-side digital filters as cascades of second-order sections. Requires NumPy and SciPy.
+"""
+
+from dataclasses import replace
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from .data import AcquisitionData, IMUSample, SampleArray, CHANNELS
+
+_CHUNK_SIZE = 1 << 16
+
+
+class SOSFilter:
+    """
+    IIR filter as a cascade of second-order sections, with filter state carried between blocks.
+    Filtering the blocks of a stream one by one gives the same output as filtering the whole stream.
+    All columns of a block are filtered at once, each with its own state.
+
+    Filters are created by `lowpass`, `highpass`, `bandpass` and `notch`, and combined by `cascade`.
+
+    Attributes:
+        sos: Second-order sections, shape (n_sections, 6).
+
+    Methods:
+        process: Filters a block of values.
+        process_samples: Filters a list of samples or a `SampleArray`.
+        reset: Clears the filter state.
+    """
+
+    def __init__(self, sos):
+        """
+        Initializes the filter.
+
+        Args:
+            sos: Second-order sections, shape (n_sections, 6), as returned by SciPy filter design functions.
+
+        Raises:
+            ValueError: If `sos` has an invalid shape.
+        """
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        if self.sos.ndim != 2 or self.sos.shape[1] != 6:
+            raise ValueError("Second-order sections must have shape (n_sections, 6)")
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the filter state. The next block starts a new stream.
+        """
+        self._zi: Optional[np.ndarray] = None
+
+    def process(self, block) -> np.ndarray:
+        """
+        Filters a block of values.
+
+        Args:
+            block: Array of shape (n,) or (n, k). The number of columns must not change between blocks.
+
+        Returns:
+            Filtered values with the shape of `block`.
+        """
+        from scipy.signal import sosfilt
+        block = np.asarray(block, dtype=np.float64)
+        shape = block.shape
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if self._zi is None:
+            self._zi = np.zeros((len(self.sos), 2, block.shape[1]))
+        elif block.shape[1] != self._zi.shape[2]:
+            raise ValueError(f"Expected {self._zi.shape[2]} columns, got {block.shape[1]}")
+        if len(block) == 0:
+            return block.reshape(shape)
+        out, self._zi = sosfilt(self.sos, block, axis=0, zi=self._zi)
+        return out.reshape(shape)
+
+    def process_samples(self, samples: Union[List[IMUSample], SampleArray],
+                        channels: Tuple[str, ...] = CHANNELS) -> SampleArray:
+        """
+        Filters a list of samples or a `SampleArray`.
+
+        Args:
+            samples: Samples to filter.
+            channels: Channels to filter, if `samples` is a list.
+
+        Returns:
+            Filtered samples with the same counts.
+        """
+        if isinstance(samples, SampleArray):
+            channels = samples.channels
+        array = SampleArray.from_samples(samples, channels=channels)
+        return SampleArray(array.counts, self.process(array.to_array()), channels=channels)
+
+
+def lowpass(cutoff: float, sample_rate: float, order: int = 4) -> SOSFilter:
+    """
+    Creates a Butterworth low-pass filter.
+
+    Args:
+        cutoff: The cutoff frequency in Hz.
+        sample_rate: The sample rate in Hz.
+        order: Order of the filter.
+
+    Returns:
+        The filter.
+    """
+    from scipy.signal import butter
+    return SOSFilter(butter(order, cutoff, "lowpass", fs=sample_rate, output="sos"))
+
+
+def highpass(cutoff: float, sample_rate: float, order: int = 4) -> SOSFilter:
+    """
+    Creates a Butterworth high-pass filter, e.g. for DC removal.
+
+    Args:
+        cutoff: The cutoff frequency in Hz.
+        sample_rate: The sample rate in Hz.
+        order: Order of the filter.
+
+    Returns:
+        The filter.
+    """
+    from scipy.signal import butter
+    return SOSFilter(butter(order, cutoff, "highpass", fs=sample_rate, output="sos"))
+
+
+def bandpass(low: float, high: float, sample_rate: float, order: int = 4) -> SOSFilter:
+    """
+    Creates a Butterworth band-pass filter.
+
+    Args:
+        low: The lower cutoff frequency in Hz.
+        high: The upper cutoff frequency in Hz.
+        sample_rate: The sample rate in Hz.
+        order: Order of the filter, the resulting filter has twice as many poles.
+
+    Returns:
+        The filter.
+    """
+    from scipy.signal import butter
+    return SOSFilter(butter(order, (low, high), "bandpass", fs=sample_rate, output="sos"))
+
+
+def notch(frequency: float, sample_rate: float, quality: float = 30.0) -> SOSFilter:
+    """
+    Creates a notch filter, e.g. for mains frequency.
+
+    Args:
+        frequency: The frequency to remove in Hz.
+        sample_rate: The sample rate in Hz.
+        quality: Quality factor, frequency / bandwidth of the notch.
+
+    Returns:
+        The filter.
+    """
+    from scipy.signal import iirnotch, tf2sos
+    b, a = iirnotch(frequency, quality, fs=sample_rate)
+    return SOSFilter(tf2sos(b, a))
+
+
+def cascade(*filters: SOSFilter) -> SOSFilter:
+    """
+    Combines filters into one filter, applied in the given order.
+
+    Args:
+        *filters: Filters to combine.
+
+    Returns:
+        The combined filter, with cleared state.
+    """
+    if not filters:
+        raise ValueError("No filters to combine")
+    return SOSFilter(np.concatenate([f.sos for f in filters]))
+
+
+def filter_data(data: AcquisitionData, sos_filter: SOSFilter, chunk_size: int = _CHUNK_SIZE) -> AcquisitionData:
+    """
+    Filters all channels of acquisition data.
+    Samples are processed in chunks, so memory-mapped data is not fully loaded at once.
+
+    Args:
+        data: Acquisition data.
+        sos_filter: The filter. Its state is cleared before and after filtering.
+        chunk_size: Number of samples processed at once.
+
+    Returns:
+        Filtered data with samples as a float `SampleArray`.
+    """
+    sos_filter.reset()
+    samples = data.samples
+    if not isinstance(samples, SampleArray):
+        samples = SampleArray.from_samples(samples, channels=data.channels)
+    columns = [samples.channels.index(c) for c in data.channels]
+    blocks = [sos_filter.process(samples[i:i + chunk_size].to_array()[:, columns])
+              for i in range(0, len(samples), chunk_size)]
+    sos_filter.reset()
+    values = np.concatenate(blocks) if blocks else np.empty((0, len(data.channels)))
+    return replace(data,
+                   samples=SampleArray(samples.counts, values, channels=data.channels),
+                   csv_path=None)
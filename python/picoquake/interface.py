@@ -3,34 +3,39 @@ This module implements the main interface class for PicoQuake device.
 """
 
 import time
-from serial import Serial, SerialException
-from serial.tools.list_ports import comports
+from serial import Serial
 from queue import Empty, Queue
-from time import sleep, time
+from time import sleep, time, monotonic_ns
 from threading import Thread, Event, Lock
-from typing import List, Optional, cast, Tuple, Callable
+from typing import List, Optional, cast, Tuple, Callable, Union, TYPE_CHECKING
 import logging
-import struct
 from datetime import datetime
 from collections import deque
 
-from cobs import cobs
-
-from .msg import messages_pb2
+from .messages import StatusMessage, DeviceInfoMessage, CommandMessage
 from .configuration import *
 from .data import *
 from .exceptions import *
 from .analisys import *
 from .utils import *
+from .transport import Transport, SerialTransport, CaptureWriter, create_transport, WRITE, META
+from .clock import ClockEstimator, ClockFit
+from .discovery import VID, PID, get_registry
+from .protocol import FrameDecoder, decode_packet, encode_packet, _capture_metadata
+from .latency import LatencyRecorder, QUEUE, STORE
 
-VID = 0x2E8A
-PID = 0xA
+if TYPE_CHECKING:
+    from .filtering import SOSFilter
 
 _HANDSHAKE_TIMEOUT = 5.0
 _STATUS_TIMEOUT = 2.0
 _SAMPLE_START_TIMEOUT = 1.0
+_CAPTURE_DRAIN_TIME = 0.2
+_RECONNECT_DELAY = 0.5
+_RECONNECT_MAX_DELAY = 30.0
 
 _LEN_DEQUE = 1_000_000
+_READ_SIZE = 1000
 
 
 def _handle_exceptions(func):
@@ -53,6 +58,11 @@ class PicoQuake:
     Attributes:
         device_info: The device information.
         config: The current configuration of the device.
+        clock: Mapping of sample counts to host time, measured during the current or last sampling.
+        connected: True while the device is connected and not stopped.
+        gaps: Interruptions of the sample stream bridged by reconnecting.
+        latency: Recorder of the latency of samples through the pipeline, None if not recording.
+        transport: The transport carrying the byte stream.
 
     Methods:
         configure: Configures the device with specified parameters.
@@ -64,37 +74,59 @@ class PicoQuake:
         read: Reads the specified number of samples received in continuos mode.
         read_last: Reads the last sample received in continuos mode.
         trigger: Triggers the device to start sampling when the RMS value exceeds the threshold.
+        start_capture: Starts recording the raw byte stream to a capture file.
+        stop_capture: Stops recording the raw byte stream.
+        capture: Records the raw byte stream for a specified duration.
         reboot_to_bootsel: Reboots the device to BOOTSEL mode.
     """
 
-    def __init__(self, short_id: Optional[str] = None, port: Optional[str] = None):
+    def __init__(self, short_id: Optional[str] = None, port: Optional[str] = None,
+                 transport: Optional[Transport] = None, reconnect: bool = False, low_latency: bool = False):
         """
         Initializes the device.
 
         Specify `short_id` written on the device label to find the device automatically.
-        Alternatively, specify the `port` to which the device is connected.
+        Alternatively, specify the `port` to which the device is connected, or a `transport`.
 
         Args:
             short_id: A 4-character string used to identify the device. Written on the device label.
-            port: The port to which the device is connected.
+            port: The port to which the device is connected. May also be a transport URL,
+                e.g. 'tcp://host:port' or 'replay:///path/to/capture', see `create_transport`.
+            transport: The transport carrying the byte stream, e.g. a `SocketTransport` or `ReplayTransport`.
+                It is opened by the device and closed when the device stops.
+            reconnect: If True, a lost connection is re-established with increasing delays instead of
+                raising `ConnectionError`. The device is found again by `short_id`, and continuos sampling
+                is resumed with the last configuration. Samples missed meanwhile are recorded in `gaps`
+                and skipped in the sample counts. Acquisitions of fixed duration and captures are not resumed.
+            low_latency: If True, received bytes are processed as soon as they arrive, instead of in blocks
+                of 1000 bytes or every 100 ms. Lowers the latency of samples at low sample rates
+                to a few milliseconds, at the cost of more reads and CPU time at high sample rates.
         
         Raises:
-            ValueError: If neither `short_id` nor `port` are provided, or if `short_id` is not a 4-character string.
+            ValueError: If none of `short_id`, `port` and `transport` are provided,
+                or if `short_id` is not a 4-character string.
             DeviceNotFound: If device with `short_id` is not found.
+            ConnectionError: If the device could not be connected.
         """
         self._logger = logging.getLogger(__name__)
         self._logger.setLevel(logging.NOTSET)
 
-        if port is not None:
-            self._port = port
+        self._short_id: Optional[str] = None
+        cached_port: Optional[str] = None
+        if transport is not None:
+            self._transport = transport
+        elif port is not None:
+            self._transport = create_transport(port)
         elif short_id is not None:
             if not (isinstance(short_id, str) and len(short_id) == 4):
                 raise ValueError("Short ID must be a 4-character string")
-            self._port = self._find_port(short_id)
-            if self._port is None:
-                raise DeviceNotFound(f"Device with short ID {short_id} not found")
+            self._short_id = short_id
+            cached_port = get_registry().find(short_id, refresh=False)
+            self._transport = SerialTransport(cached_port or self._require_port())
         else:
-            raise ValueError("Either short_id or port must be specified")
+            raise ValueError("Either short_id, port or transport must be specified")
+        if low_latency:
+            self._transport.low_latency = True
 
         self.device_info: Optional[DeviceInfo] = None
         """The device information."""
@@ -102,33 +134,38 @@ class PicoQuake:
         self.config: Config = Config(SampleRate.hz_100, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
         """The current configuration of the device."""
 
+        self.gaps: List[Gap] = []
+        """Interruptions of the sample stream bridged by reconnecting."""
+
+        self.latency: Optional[LatencyRecorder] = None
+        """Recorder of the latency of samples through the pipeline, None if not recording.
+        See `picoquake.latency.measure_latency`."""
+
         self._continuos_mode = False
+        self._channels: Tuple[str, ...] = CHANNELS
+        self._channel_mask: Optional[Tuple[bool, ...]] = None
         self._acquire_n_samples = 0
         self._is_sampling = False
         self._sample_deque: deque = deque()
-
-        self._out_packet_queue = Queue()
-        self._in_message_queue = Queue()
-        self._stop_event = Event()
-        
-        self._serial_thread = Thread(target=self._serial_worker, daemon=True)
-        self._handler_thread = Thread(target=self._handler, daemon=True)
         self._lock = Lock()
-
-        self._device_status = Status(State.IDLE, 0, 0, 0)
-        self._last_status_time = time()
-
-        self._exception: Optional[Exception] = None
-
-        self._started = False
-        self._serial_thread.start()
-        self._handler_thread.start()
-        self._started = True
+        self._capture: Optional[CaptureWriter] = None
+        self._capture_lock = Lock()
+        self._clock: Optional[ClockEstimator] = None
+        self._reconnect = reconnect
 
         try:
-            self._handshake()
-        except HandshakeError:
-            raise ConnectionError("Could not connect to the device, handshake failed")
+            self._connect()
+            self._check_device()
+        except ConnectionError:
+            if cached_port is None:
+                raise
+            # the cached port is stale, e.g. the COM port of an unplugged device, or reassigned to another device
+            self._logger.debug(f"Could not connect to cached port {cached_port}, discovering devices")
+            get_registry().invalidate(short_id)
+            self._transport = SerialTransport(self._require_port(), low_latency=low_latency)
+            self.device_info = None
+            self._connect()
+            self._check_device()
         self._logger.info(f"Connected to: {self.device_info}")
         self._last_status_time = time()
 
@@ -164,6 +201,31 @@ class PicoQuake:
                        AccRange.find_closest(acc_range),
                        GyroRange.find_closest(gyro_range))
         
+    @property
+    def clock(self) -> Optional[ClockFit]:
+        """
+        Mapping of sample counts to host time, fitted to the arrival times of the samples
+        during the current or last sampling. Gives the sample rate measured with the host clock.
+        None before about two seconds of samples were received.
+        """
+        clock = self._clock
+        return None if clock is None else clock.fit()
+
+    @property
+    def transport(self) -> Transport:
+        """
+        The transport carrying the byte stream.
+        """
+        return self._transport
+
+    @property
+    def connected(self) -> bool:
+        """
+        True while the device is connected and not stopped, and no error occurred.
+        While reconnecting the device counts as connected.
+        """
+        return self._started and not self._stop_event.is_set() and self._exception is None
+
     def stop(self):
         """
         Stops the device. Disconnects from the device and stops the acquisition.
@@ -171,8 +233,12 @@ class PicoQuake:
         self._stop()
         self._serial_thread.join()
         self._handler_thread.join()
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
 
-    def acquire(self, seconds: float = 0, n_samples: int = 0) -> Tuple[AcquisitionData, Optional[Exception]]:
+    def acquire(self, seconds: float = 0, n_samples: int = 0,
+                channels: Union[str, List[str], None] = None) -> Tuple[AcquisitionData, Optional[Exception]]:
         """
         Starts data acquisition of a specified duration.
         Duration can be specified in seconds or number of samples.
@@ -180,6 +246,8 @@ class PicoQuake:
         Args:
             seconds: The duration of the acquisition in seconds.
             n_samples: The number of samples to acquire.
+            channels: Channels to keep, e.g. 'acc', 'acc_z' or 'acc_x,gyro_x'. All channels if None.
+                Other channels are discarded when received.
 
         Returns:
             A tuple containing the acquisition data and an exception if any occurred.
@@ -199,6 +267,7 @@ class PicoQuake:
             raise ValueError("Seconds and n_samples must be positive")
         if seconds > 0:
             n_samples = int(seconds * self.config.sample_rate.param_value)
+        self._set_channels(channels)
 
         max_duration = n_samples / self.config.sample_rate.param_value * 1.2 + 1.0
         exception: Optional[Exception] = None
@@ -235,8 +304,10 @@ class PicoQuake:
         data = AcquisitionData(samples=samples[0:n_samples],
                                device=cast(DeviceInfo, self.device_info),
                                config=self.config,
-                               start_time=datetime.fromtimestamp(start_t))
+                               start_time=datetime.fromtimestamp(start_t),
+                               channels=self._channels)
         data.re_centre(0)
+        self._apply_clock(data)
 
         if exception is None:
             if len(samples) < n_samples:
@@ -247,10 +318,15 @@ class PicoQuake:
                 exception = AcquisitionDataCorrupted("Data corrupted")
         return data, exception
 
-    def start_continuos(self):
+    def start_continuos(self, channels: Union[str, List[str], None] = None):
         """
         Starts the device in continuos mode. Samples can be read using `read_last()`.
+
+        Args:
+            channels: Channels to keep, e.g. 'acc', 'acc_z' or 'acc_x,gyro_x'. All channels if None.
+                Values of other channels are discarded when received and set to None.
         """
+        self._set_channels(channels)
         self._continuos_mode = True
         self._sample_deque = deque(maxlen=_LEN_DEQUE)
         self._start_sampling()
@@ -295,12 +371,17 @@ class PicoQuake:
             num_ret = min(num, len(self._sample_deque))
             for _ in range(num_ret):
                 samples.append(self._sample_deque.popleft())
+        recorder = self.latency
+        if recorder is not None:
+            recorder.consumed(samples)
         return samples
     
     def trigger(self, rms_threshold: float, pre_seconds: float, post_seconds:
                 float, source: str="accel", axis: str="xyz",
                 rms_window: float=1.0,
-                on_trigger: Optional[Callable[[float], None]]=None) -> Tuple[AcquisitionData, Optional[Exception]]:
+                on_trigger: Optional[Callable[[float], None]]=None,
+                channels: Union[str, List[str], None]=None,
+                rms_filter: Optional["SOSFilter"]=None) -> Tuple[AcquisitionData, Optional[Exception]]:
         """
         Triggers the device to start sampling when the RMS value exceeds the threshold.
 
@@ -313,6 +394,11 @@ class PicoQuake:
             rms_window: The window length in seconds to calculate the RMS value.
             on_trigger: A callback function to call when the trigger is activated.
                 The RMS value is passed as an argument.
+            channels: Channels to keep, e.g. 'acc', 'acc_z' or 'acc_x,gyro_x'. All channels if None.
+                Must include the channels used for triggering.
+            rms_filter: Filter applied to the trigger channels before calculating the RMS value,
+                e.g. `filtering.bandpass(...)` to trigger on band-limited RMS. Requires NumPy and SciPy.
+                The acquired data is not filtered.
 
         Returns:
             A tuple containing the acquisition data and an exception if any occurred.
@@ -324,17 +410,28 @@ class PicoQuake:
         combinations = get_axis_combinations("xyz")
         if axis not in combinations:
             raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
+        prefix = "acc" if source == "accel" else "gyro"
+        missing = [f"{prefix}_{ax}" for ax in axis if f"{prefix}_{ax}" not in parse_channels(channels)]
+        if missing:
+            raise ValueError(f"Trigger channels not acquired: {', '.join(missing)}")
 
         window_len = int(rms_window * self.config.sample_rate.param_value)
         n_pre_samples = int(pre_seconds * self.config.sample_rate.param_value)
         n_post_samples = int(post_seconds * self.config.sample_rate.param_value)
         n_samples = n_pre_samples + n_post_samples
-        last_sample_count = 0
+        last_sample_count = -1
         sample_count_at_trigger = 0
         trigger_time = 0
         exception: Optional[Exception] = None
-
-        self.start_continuos()
+        trigger_channels = tuple(f"{prefix}_{ax}" for ax in "xyz" if ax in axis)
+        if rms_filter is not None:
+            import numpy as np
+            rms_filter.reset()
+            # ring buffer of the filtered window, the RMS does not depend on the order of samples
+            filtered = np.zeros((window_len, len(trigger_channels)))
+            n_filtered = 0
+
+        self.start_continuos(channels)
         self._logger.info(f"Triggering on RMS value {rms_threshold} g")
         self._logger.info(f"deque maxlen: {_LEN_DEQUE}")
 
@@ -355,17 +452,26 @@ class PicoQuake:
                     raise self._exception
                 sleep(0.001)
                 continue
-            samples = deque_get_last_n(self._sample_deque, window_len)
-            rms_acc, rms_gyro = imu_rms(samples, axis, de_trend=True)
-            if source == "accel":
-                rms_val = rms_acc
+            if rms_filter is None:
+                samples = deque_get_last_n(self._sample_deque, window_len)
+                rms_acc, rms_gyro = imu_rms(samples, axis, de_trend=True)
+                if source == "accel":
+                    rms_val = rms_acc
+                else:
+                    rms_val = rms_gyro
+                last_sample_count = sample_count
             else:
-                rms_val = rms_gyro
+                # filter state is continuous, each sample is filtered once
+                samples = deque_get_after(self._sample_deque, last_sample_count)
+                last_sample_count = samples[-1].count
+                block = rms_filter.process_samples(samples, trigger_channels).values[-window_len:]
+                filtered[np.arange(n_filtered, n_filtered + len(block)) % window_len] = block
+                n_filtered += len(block)
+                rms_val = rms_array(filtered[:n_filtered], de_trend=True)
             if rms_val > rms_threshold:
                 sample_count_at_trigger = self._sample_deque[-1].count
                 trigger_time = time()
                 break
-            last_sample_count = sample_count
         # trigger activated, acquire data
         self._logger.info(f"Triggered on RMS value {rms_val:.3f} g")
         if on_trigger is not None:
@@ -399,10 +505,12 @@ class PicoQuake:
         data = AcquisitionData(samples=samples,
                                device=cast(DeviceInfo, self.device_info),
                                config=self.config,
-                               start_time=datetime.fromtimestamp(trigger_time))
+                               start_time=datetime.fromtimestamp(trigger_time),
+                               channels=self._channels)
         self._logger.info(f"Acquisition stopped. Took: {stop_t - trigger_time:.1f}s.")
         self._logger.info(f"Received {len(samples)} samples")
         data.re_centre(data.num_samples - n_post_samples)
+        self._apply_clock(data)
         if exception is None:
             if sample_count_at_trigger < n_pre_samples:
                 self._logger.warning(f"Triggered too early, {n_pre_samples - sample_count_at_trigger} samples skipped")
@@ -443,32 +551,161 @@ class PicoQuake:
             sleep(0.001)
         with self._lock:
             if len(self._sample_deque) > 0:
-                return self._sample_deque.pop()
+                sample = self._sample_deque.pop()
             else:
                 return None
+        recorder = self.latency
+        if recorder is not None:
+            recorder.consumed([sample])
+        return sample
     
+    def start_capture(self, path: str):
+        """
+        Starts continuos sampling in raw capture mode.
+        Received bytes are written to a capture file as they are, without framing or decoding,
+        which keeps the host load minimal. Use `protocol.decode_capture` to decode the capture later.
+        The capture starts with the device information and the current configuration.
+
+        Args:
+            path: Path of the capture file. An existing file is overwritten.
+
+        Raises:
+            RuntimeError: If continuos mode or a capture is active.
+        """
+        if self._continuos_mode:
+            raise RuntimeError("Continuos mode is active, stop it before capturing")
+        if self._capture is not None:
+            raise RuntimeError("Capture already active")
+        writer = CaptureWriter(path)
+        writer.write_chunk(_capture_metadata(cast(DeviceInfo, self.device_info), self.config, datetime.now()), META)
+        with self._capture_lock:
+            self._capture = writer
+        self._start_sampling()
+        self._logger.info(f"Capture started: {path}")
+
+    def stop_capture(self):
+        """
+        Stops sampling and closes the capture file.
+        Samples sent before the stop command is received by the device are still captured.
+
+        Raises:
+            RuntimeError: If capture is not started.
+        """
+        if self._capture is None:
+            raise RuntimeError("Capture not started")
+        self._stop_sampling()
+        sleep(_CAPTURE_DRAIN_TIME)
+        with self._capture_lock:
+            capture, self._capture = self._capture, None
+        capture.close()
+        self._logger.info("Capture stopped")
+
+    def capture(self, path: str, seconds: float):
+        """
+        Records the raw byte stream of a sampling of specified duration to a capture file.
+        See `start_capture`.
+
+        Args:
+            path: Path of the capture file. An existing file is overwritten.
+            seconds: The duration of the capture in seconds.
+
+        Raises:
+            ValueError: If `seconds` is not positive.
+            ConnectionError: If the connection is lost. The capture file is kept.
+        """
+        if seconds <= 0:
+            raise ValueError("Seconds must be positive")
+        self.start_capture(path)
+        try:
+            end_t = time() + seconds
+            while time() < end_t:
+                if self._exception is not None:
+                    raise self._exception
+                sleep(0.01)
+        finally:
+            self.stop_capture()
+
     def reboot_to_bootsel(self):
         """
         Reboots the device to BOOTSEL mode.
         """
         if self._started:
             self.stop()
+        if not isinstance(self._transport, SerialTransport):
+            raise RuntimeError("Reboot to BOOTSEL requires a serial port")
         self._logger.info("Rebooting to BOOTSEL...")
-        ser = Serial(self._port, 1200, timeout=0.1)
+        ser = Serial(self._transport.port, 1200, timeout=0.1)
         sleep(0.1)
         ser.close()
 
     def _find_port(self, short_id: str) -> Optional[str]:
         """
-        Finds the port to which the device is connected.
+        Finds the port to which the device is connected, using the cached device registry.
         """
-        ports = comports()
-        for p in ports:
-            self._logger.debug(f"Found port: {p.device}, pid: {p.pid}, vid: {p.vid}, sn: {p.serial_number}")
-            if p.vid == VID and p.pid == PID and p.serial_number:
-                if DeviceInfo.unique_id_to_short_id(p.serial_number) == short_id.upper():
-                    return p.device
-        return None
+        port = get_registry().find(short_id)
+        self._logger.debug(f"Device {short_id.upper()} port: {port}")
+        return port
+
+    def _require_port(self) -> str:
+        """
+        Finds the port of the device connected by short ID.
+
+        Raises:
+            DeviceNotFound: If the device is not found.
+        """
+        found = self._find_port(cast(str, self._short_id))
+        if found is None:
+            raise DeviceNotFound(f"Device with short ID {self._short_id} not found")
+        return found
+
+    def _check_device(self):
+        """
+        Checks that the device connected by short ID is the expected one.
+
+        Raises:
+            ConnectionError: If another device is connected, the device is stopped.
+        """
+        if self._short_id is None:
+            return
+        found = cast(DeviceInfo, self.device_info).short_id
+        if found != self._short_id.upper():
+            self.stop()
+            raise ConnectionError(f"Device at {self._transport} is {found}, not {self._short_id.upper()}")
+
+    def _connect(self):
+        """
+        Starts the serial worker and handler threads and performs the handshake.
+
+        Raises:
+            ConnectionError: If the handshake failed.
+        """
+        self._out_packet_queue = Queue()
+        self._in_message_queue = Queue()
+        self._stop_event = Event()
+        self._serial_thread = Thread(target=self._serial_worker, daemon=True)
+        self._handler_thread = Thread(target=self._handler, daemon=True)
+
+        self._connection_lost = Event()
+        self._lost_time = 0.0
+        self._resync = False
+        self._count_shift = 0
+        self._last_count: Optional[int] = None
+
+        self._device_status = Status(State.IDLE, 0, 0, 0)
+        self._last_status_time = time()
+
+        self._exception: Optional[Exception] = None
+
+        self._started = False
+        self._serial_thread.start()
+        self._handler_thread.start()
+        self._started = True
+
+        try:
+            self._handshake()
+        except HandshakeError as e:
+            self.stop()
+            raise ConnectionError(f"Could not connect to the device: {e}") from e
 
     def _handshake(self, timeout: float = _HANDSHAKE_TIMEOUT):
         """
@@ -478,10 +715,39 @@ class PicoQuake:
         start_time = time()
         while self.device_info is None:
             sleep(0.001)
+            if self._exception is not None:
+                # e.g. the port could not be opened, do not wait for the timeout
+                self._stop()
+                raise HandshakeError(f"Handshake failed: {self._exception}")
             if time() - start_time > timeout:
                 self._stop()
                 raise HandshakeError("Handshake timeout")
 
+    def _apply_clock(self, data: AcquisitionData):
+        """
+        Stores the clock measured during sampling in the data and sets the start time
+        to the host time of the sample with count 0.
+        """
+        clock = self.clock
+        if clock is None:
+            return
+        data.clock = clock
+        data.start_time = clock.datetime(data.count_offset)
+        self._logger.info(f"Measured sample rate: {clock.rate:.4f} Hz "
+                          f"({clock.drift_ppm(self.config.sample_rate.param_value):+.1f} ppm), "
+                          f"jitter: {clock.jitter * 1e3:.3f} ms")
+
+    def _set_channels(self, channels: Union[str, List[str], None]):
+        """
+        Sets the channels kept when decoding samples.
+        """
+        self._channels = parse_channels(channels)
+        if self._channels == CHANNELS:
+            self._channel_mask = None
+        else:
+            self._channel_mask = tuple(c in self._channels for c in CHANNELS)
+        self._logger.debug(f"Channels: {', '.join(self._channels)}")
+
     def _start_sampling(self, num_samples: int = 0):
         """
         Sends start sampling command.
@@ -491,6 +757,10 @@ class PicoQuake:
                 If 0, the device will sample continuously.
         """
         self._logger.debug("Starting sampling...")
+        self._clock = ClockEstimator(self.config.sample_rate.param_value)
+        self._count_shift = 0
+        self._last_count = None
+        self._resync = False
         self._send_command(CommandID.START_SAMPLING, self.config, num_samples)
         self._is_sampling = True
 
@@ -512,17 +782,17 @@ class PicoQuake:
             config: The configuration to send with the command.
             num_samples: The number of samples to acquire.
         """
-        msg = messages_pb2.Command()
-        msg.id = cmd_id.value
+        msg = CommandMessage(cmd_id.value)
         if config is not None:
             msg.filter_config = config.filter.index
             msg.data_rate = config.sample_rate.index
             msg.acc_range = config.acc_range.index
             msg.gyro_range = config.gyro_range.index
             msg.num_to_sample = num_samples
-        packet = cobs.encode(msg.SerializeToString())
-        packet = bytes([0x00]) + bytes([PacketID.COMMAND.value]) + packet + bytes([0x00])
+        packet = encode_packet(PacketID.COMMAND, msg.encode())
         self._out_packet_queue.put_nowait(packet)
+        # interrupt a waiting read, so the command is written immediately
+        self._transport.wake()
         self._logger.debug(f"Command sent: {cmd_id.name}")
 
     def _stop(self):
@@ -551,8 +821,14 @@ class PicoQuake:
                 pass
             else:
                 if isinstance(msg, IMUSample):
-                    self._sample_deque.append(msg)
-                elif isinstance(msg, messages_pb2.Status):
+                    recorder = self.latency
+                    if recorder is not None:
+                        recorder.mark(msg.count, QUEUE)
+                        self._sample_deque.append(msg)
+                        recorder.mark(msg.count, STORE)
+                    else:
+                        self._sample_deque.append(msg)
+                elif isinstance(msg, StatusMessage):
                     status = Status(State(msg.state), msg.temperature,
                                     msg.missed_samples, msg.error_code)
                     if status.state != self._device_status.state:
@@ -561,13 +837,17 @@ class PicoQuake:
                     self._last_status_time = time()
                     if status.state == State.ERROR.value:
                         raise DeviceError(status.error_code)
-                elif isinstance(msg, messages_pb2.DeviceInfo):
+                elif isinstance(msg, DeviceInfoMessage):
                     self.device_info = DeviceInfo(msg.unique_id.hex().upper(),
                                                   msg.firmware.replace(b'\x00', b'').decode("utf-8"))
 
             # check device status
-            if self.device_info is not None:
+            if self.device_info is not None and not self._connection_lost.is_set():
                 if time() - self._last_status_time > _STATUS_TIMEOUT:
+                    if self._reconnect:
+                        # the serial worker reconnects
+                        self._connection_lost.set()
+                        continue
                     self._serial_thread.join(timeout=1.0)
                     self._logger.debug("Handler stopped")
                     raise ConnectionError("Connection lost, device not responding")
@@ -577,85 +857,160 @@ class PicoQuake:
     @_handle_exceptions
     def _serial_worker(self):
         """
-        Main serial worker thread receiving and sending serial data.
+        Main serial worker thread receiving and sending data through the transport.
         Packet decode errors are logged and ignored.
+        If reconnecting is enabled, a lost connection is re-established, see `_reconnect_transport`.
 
         Raises:
             ConnectionError: If cannot connect to the device or if the connection is lost.
         """
-        self._logger.debug(f"Connecting on port {self._port} ...")
-        try:
-            ser = Serial(self._port, timeout=0.1)
-            ser.reset_input_buffer()
-            ser.reset_output_buffer()
-        except SerialException:
-            raise ConnectionError(f"Could not connect to port {self._port}")
-        except PermissionError:
-            raise ConnectionError(f"Permission denied on port {self._port}. Check user permissions.")
-        in_buffer = bytearray()
-        receiving_packet = False
+        self._logger.debug(f"Connecting to {self._transport} ...")
+        transport: Optional[Transport] = self._transport
+        transport.open()
         try:
-            while not self._stop_event.is_set():
-                # receive
+            while transport is not None:
                 try:
-                    data = ser.read(1000)
-                except SerialException as e:
-                    raise ConnectionError("Connection lost, port closed")
-                if len(data) > 0:
-                    for b in data:
-                        if b == 0x00:
-                            if receiving_packet:
-                                if len(in_buffer) > 0:
-                                    # stop flag, end of packet
-                                    try:
-                                        self._in_message_queue.put_nowait(self._decode_packet(in_buffer))
-                                    except Exception as e:
-                                        self._logger.error(f"Decode error: {e}")
-                                    in_buffer.clear()
-                                    receiving_packet = False
-                                else:
-                                    # empty packet, treat as new start flag
-                                    pass
-                            else:
-                                # start flag
-                                receiving_packet = True
-                        elif receiving_packet:
-                            in_buffer.append(b)
-                
-                # send
-                try:
-                    packet = self._out_packet_queue.get_nowait()
-                    ser.write(packet)
-                except Empty:
-                    pass
-
-        except:
-            ser.close()
+                    self._transfer(transport)
+                    break
+                except Exception as e:
+                    if not self._reconnect or self._stop_event.is_set():
+                        raise
+                    self._logger.warning(f"Connection lost: {e}")
+                    transport.close()
+                    transport = self._reconnect_transport()
+        finally:
+            if transport is not None:
+                transport.close()
             self._logger.debug("Serial worker stopped")
-            raise
-        ser.close()
-        self._logger.debug("Serial worker stopped")
+
+    def _transfer(self, transport: Transport):
+        """
+        Receives and sends data through the open transport until the device is stopped.
+
+        Raises:
+            ConnectionError: If the connection is lost.
+        """
+        frames = FrameDecoder()
+        while not self._stop_event.is_set():
+            if self._connection_lost.is_set():
+                raise ConnectionError("Connection lost, device not responding")
+            # send, a waiting read is woken when a command is queued
+            self._send_queued(transport)
+
+            # receive
+            data = transport.read(_READ_SIZE)
+            arrival_ns = monotonic_ns()
+            if len(data) > 0:
+                with self._capture_lock:
+                    capture = self._capture
+                    if capture is not None:
+                        # raw capture, decoded offline
+                        capture.write_chunk(data)
+                        self._last_status_time = time()
+                if capture is None:
+                    last_count = None
+                    packets = frames.feed(data)
+                    recorder = self.latency
+                    framed_ns = monotonic_ns() if recorder is not None else 0
+                    for packet in packets:
+                        try:
+                            msg = self._decode_packet(packet)
+                        except Exception as e:
+                            self._logger.error(f"Decode error: {e}")
+                            continue
+                        if isinstance(msg, IMUSample):
+                            if self._resync:
+                                self._resync_counts(msg.count)
+                            msg.count += self._count_shift
+                            last_count = msg.count
+                            if recorder is not None:
+                                recorder.received(msg.count, arrival_ns, framed_ns, monotonic_ns())
+                        self._in_message_queue.put_nowait(msg)
+                    if last_count is not None:
+                        self._last_count = last_count
+                        clock = self._clock
+                        if clock is not None:
+                            clock.add(last_count, arrival_ns)
+                else:
+                    frames.reset()
+        # commands queued when stopping, e.g. stop sampling
+        self._send_queued(transport)
+
+    def _send_queued(self, transport: Transport):
+        """
+        Writes all queued packets to the transport.
+        """
+        while True:
+            try:
+                packet = self._out_packet_queue.get_nowait()
+            except Empty:
+                return
+            with self._capture_lock:
+                if self._capture is not None:
+                    self._capture.write_chunk(packet, WRITE)
+            transport.write(packet)
+
+    def _reconnect_transport(self) -> Optional[Transport]:
+        """
+        Re-establishes a lost connection, retrying with exponentially increasing delays.
+        The device is found again by its short ID, if it was connected by short ID.
+        Handshake is repeated, and continuos sampling is restarted with the current configuration.
+
+        Returns:
+            The open transport, or None if the device was stopped meanwhile.
+        """
+        self._connection_lost.set()
+        self._lost_time = time()
+        delay = _RECONNECT_DELAY
+        while not self._stop_event.wait(delay):
+            delay = min(delay * 2, _RECONNECT_MAX_DELAY)
+            try:
+                if self._short_id is not None:
+                    port = self._find_port(self._short_id)
+                    if port is None:
+                        raise DeviceNotFound(f"Device with short ID {self._short_id} not found")
+                    if not (isinstance(self._transport, SerialTransport) and self._transport.port == port):
+                        self._transport = SerialTransport(port, low_latency=self._transport.low_latency)
+                self._transport.open()
+            except Exception as e:
+                self._logger.debug(f"Reconnect failed: {e}, retrying in {delay:.1f}s")
+                continue
+            self._logger.info(f"Reconnected to {self._transport}")
+            self._last_status_time = time()
+            self._connection_lost.clear()
+            self._send_command(CommandID.HANDSHAKE)
+            if self._continuos_mode:
+                self._send_command(CommandID.START_SAMPLING, self.config, 0)
+                self._resync = True
+            return self._transport
+        return None
+
+    def _resync_counts(self, count: int):
+        """
+        Shifts the counts of samples received after reconnecting, so they continue the counts received
+        before with a gap of the samples missed meanwhile, estimated from the clock. Records the gap.
+
+        Args:
+            count: Count of the first sample received after reconnecting.
+        """
+        self._resync = False
+        start_count = 0 if self._last_count is None else self._last_count + 1
+        clock = self.clock
+        if clock is not None:
+            expected = round(clock.count(time()))
+        else:
+            expected = start_count + round((time() - self._lost_time) * self.config.sample_rate.param_value)
+        self._count_shift = max(expected, start_count) - count
+        gap = Gap(start_count, count + self._count_shift,
+                  datetime.fromtimestamp(self._lost_time), datetime.now())
+        self.gaps.append(gap)
+        self._logger.warning(f"Sampling resumed, gap: {gap}")
 
     def _decode_packet(self, packet: bytes):
         """
         Decodes the packet received from the device.
         """
-        packet_id = PacketID(packet[0])
-        decoded = cobs.decode(packet[1:])
-        if packet_id == PacketID.IMU_DATA:
-            unpacked_data = struct.unpack('<Qffffff', decoded)
-            msg = IMUSample(unpacked_data[0],
-                            unpacked_data[1],
-                            unpacked_data[2],
-                            unpacked_data[3],
-                            unpacked_data[4],
-                            unpacked_data[5],
-                            unpacked_data[6])
-        elif packet_id == PacketID.STATUS:
-            msg = messages_pb2.Status.FromString(decoded)
-        elif packet_id == PacketID.DEVICE_INFO:
-            msg = messages_pb2.DeviceInfo.FromString(decoded)
-        return msg
+        return decode_packet(packet, self._channel_mask)
 
     def _handle_exceptions(self, e: Exception):
         """
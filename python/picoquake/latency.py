@@ -0,0 +1,298 @@
+"""
+This module implements measurement of the latency of samples from the sensor to the consumer,
+through the stages of the host pipeline.
+
+Stages of each sample:
+
+- read: From the sample being taken to the serial read returning the chunk containing it.
+- framing: From the read to the packets of the chunk being split by the frame decoder.
+- decode: From framing to the packet of the sample being decoded, including the packets before it in the chunk.
+- queue: From decoding in the serial worker to the handler thread taking the sample from the queue.
+- store: From the handler taking the sample to it being stored for reading.
+- consume: From storing to the consumer reading the sample, e.g. with `PicoQuake.read`.
+
+With a simulated device the time a sample was taken is known. With a device it is estimated from
+the sample count with the clock fitted to the arrivals, see `picoquake.clock`, so the read stage is
+the latency in excess of the minimum transfer latency.
+"""
+
+import time
+from array import array
+from dataclasses import dataclass
+from threading import Lock, Thread, Event
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .clock import ClockEstimator
+
+if TYPE_CHECKING:
+    from .data import IMUSample
+    from .interface import PicoQuake
+
+STAGES = ("read", "framing", "decode", "queue", "store", "consume")
+"""Stages of the pipeline, in order."""
+
+QUEUE = 3
+STORE = 4
+
+_MAX_PENDING = 100_000
+_HISTOGRAM_MIN = 1e-6
+
+
+@dataclass(frozen=True)
+class StageStats:
+    """
+    Latency statistics of a stage.
+
+    Attributes:
+        name: Name of the stage, one of `STAGES` or 'total'.
+        count: Number of samples.
+        p50: Median latency in seconds.
+        p99: 99th percentile of latency in seconds.
+        max: Maximum latency in seconds.
+        histogram: Number of samples per bin, as (upper bound in seconds, count) pairs.
+            Bounds double from 1 µs, the first bin includes lower and negative latencies.
+    """
+    name: str
+    count: int
+    p50: float
+    p99: float
+    max: float
+    histogram: Tuple[Tuple[float, int], ...] = ()
+
+    def __str__(self) -> str:
+        return (f"{self.name}: p50 = {self.p50 * 1e3:.3f} ms, p99 = {self.p99 * 1e3:.3f} ms, "
+                f"max = {self.max * 1e3:.3f} ms")
+
+
+class LatencyRecorder:
+    """
+    Records the timestamps of samples through the stages of the pipeline of `PicoQuake`.
+    Set it as `PicoQuake.latency` to record, e.g. with `measure_latency`.
+
+    Timestamps are kept per sample count until the sample is consumed. Samples which are never consumed,
+    e.g. ones skipped by `read_last`, are dropped when a later sample is consumed.
+
+    Methods:
+        received: Records a sample decoded by the serial worker.
+        mark: Records a sample passing the queue or store stage.
+        consumed: Records samples read by the consumer.
+        stats: Computes the statistics of each stage.
+        reset: Discards the recorded samples.
+    """
+
+    def __init__(self, source: Optional[Callable[[int], Optional[int]]] = None):
+        """
+        Args:
+            source: Returns the host monotonic time in nanoseconds at which the sample with a count was taken,
+                e.g. `SimulatorTransport.sample_time_ns`. If None, it is estimated with the fitted clock.
+        """
+        self.source = source
+        self._pending: Dict[int, List[int]] = {}
+        # completed samples: count and the timestamps from the read to the consumer
+        self._columns = [array("q") for _ in range(len(STAGES) + 1)]
+        self._sources = array("q")
+        self._lock = Lock()
+
+    def received(self, count: int, read_ns: int, framed_ns: int, decoded_ns: int):
+        """
+        Records a sample decoded by the serial worker.
+
+        Args:
+            count: Sample count.
+            read_ns: Time the chunk containing the sample was read, see `time.monotonic_ns`.
+            framed_ns: Time the chunk was split into packets.
+            decoded_ns: Time the sample was decoded.
+        """
+        with self._lock:
+            if len(self._pending) >= _MAX_PENDING:
+                del self._pending[next(iter(self._pending))]
+            self._pending[count] = [read_ns, framed_ns, decoded_ns, 0, 0]
+
+    def mark(self, count: int, stage: int):
+        """
+        Records a sample passing a stage.
+
+        Args:
+            count: Sample count.
+            stage: `QUEUE` when taken from the queue, `STORE` when stored for reading.
+        """
+        now = time.monotonic_ns()
+        with self._lock:
+            timestamps = self._pending.get(count)
+            if timestamps is not None:
+                timestamps[stage] = now
+
+    def consumed(self, samples: Iterable["IMUSample"]):
+        """
+        Records samples read by the consumer.
+        """
+        now = time.monotonic_ns()
+        with self._lock:
+            for sample in samples:
+                timestamps = self._pending.pop(sample.count, None)
+                if timestamps is None or not timestamps[STORE]:
+                    continue
+                # samples before it were skipped by the consumer
+                while self._pending:
+                    first = next(iter(self._pending))
+                    if first >= sample.count:
+                        break
+                    del self._pending[first]
+                source = self.source(sample.count) if self.source is not None else None
+                self._columns[0].append(sample.count)
+                for column, t in zip(self._columns[1:], timestamps + [now]):
+                    column.append(t)
+                self._sources.append(-1 if source is None else source)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of consumed samples recorded.
+        """
+        return len(self._columns[0])
+
+    def reset(self):
+        """
+        Discards the recorded samples.
+        """
+        with self._lock:
+            self._pending.clear()
+            for column in self._columns:
+                del column[:]
+            del self._sources[:]
+
+    def stats(self, sample_rate: Optional[float] = None) -> List[StageStats]:
+        """
+        Computes the latency statistics of each stage and of the total.
+
+        Args:
+            sample_rate: Nominal sample rate in Hz, used to fit the clock if no `source` is set.
+                Without a source or sample rate, the read stage and the total are not included.
+
+        Returns:
+            Statistics in order of `STAGES`, followed by the total.
+        """
+        with self._lock:
+            counts, *timestamps = [column.tolist() for column in self._columns]
+            sources = self._sources.tolist()
+        if not counts:
+            return []
+        stats = []
+        taken = self._taken_times(counts, timestamps[0], sources, sample_rate)
+        if taken is not None:
+            stats.append(_stage_stats("read", [r - t for r, t in zip(timestamps[0], taken)]))
+        for i, name in enumerate(STAGES[1:]):
+            stats.append(_stage_stats(name, [b - a for a, b in zip(timestamps[i], timestamps[i + 1])]))
+        if taken is not None:
+            stats.append(_stage_stats("total", [c - t for c, t in zip(timestamps[-1], taken)]))
+        return stats
+
+    @staticmethod
+    def _taken_times(counts: List[int], reads: List[int], sources: List[int],
+                     sample_rate: Optional[float]) -> Optional[List[float]]:
+        """
+        Returns the times in nanoseconds at which the samples were taken, from the source or the fitted clock.
+        """
+        if all(s >= 0 for s in sources):
+            return [float(s) for s in sources]
+        if sample_rate is None:
+            return None
+        estimator = ClockEstimator(sample_rate, wall_offset_ns=0)
+        for count, read_ns in zip(counts, reads):
+            estimator.add(count, read_ns)
+        clock = estimator.fit()
+        if clock is None:
+            return None
+        return [clock.time(count) * 1e9 for count in counts]
+
+
+def _stage_stats(name: str, latencies_ns: List[float]) -> StageStats:
+    values = sorted(latencies_ns)
+    n = len(values)
+    bins: List[Tuple[float, int]] = []
+    bound = _HISTOGRAM_MIN
+    i = 0
+    while i < n:
+        j = i
+        while j < n and values[j] * 1e-9 <= bound:
+            j += 1
+        bins.append((bound, j - i))
+        i = j
+        bound *= 2
+    return StageStats(name, n, values[n // 2] * 1e-9, values[min(n - 1, int(n * 0.99))] * 1e-9,
+                      values[-1] * 1e-9, tuple(bins))
+
+
+def format_stats(stats: List[StageStats], histogram: bool = False) -> str:
+    """
+    Formats latency statistics as a table, optionally with histograms.
+    """
+    lines = [f"{'stage':<10}{'samples':>10}{'p50 [ms]':>12}{'p99 [ms]':>12}{'max [ms]':>12}"]
+    for s in stats:
+        lines.append(f"{s.name:<10}{s.count:>10}{s.p50 * 1e3:>12.3f}{s.p99 * 1e3:>12.3f}{s.max * 1e3:>12.3f}")
+    if histogram:
+        for s in stats:
+            lines.append(f"\n{s.name}:")
+            peak = max((c for _, c in s.histogram), default=0)
+            first = next((i for i, (_, c) in enumerate(s.histogram) if c), 0)
+            for bound, c in s.histogram[first:]:
+                bar = "#" * (round(40 * c / peak) if peak else 0)
+                lines.append(f"  <= {bound * 1e3:>10.3f} ms {c:>8} {bar}".rstrip())
+    return "\n".join(lines)
+
+
+def measure_latency(device: "PicoQuake", seconds: float, batch: int = 1, interval: float = 0.0,
+                    load_threads: int = 0, warmup: float = 0.5,
+                    source: Optional[Callable[[int], Optional[int]]] = None,
+                    channels: Optional[str] = None) -> List[StageStats]:
+    """
+    Measures the latency of samples in continuos mode with the current configuration of the device.
+
+    Args:
+        device: The connected device.
+        seconds: Duration of the measurement in seconds.
+        batch: Number of samples the consumer reads at once.
+        interval: Time in seconds the consumer sleeps between reads, simulating processing.
+        load_threads: Number of threads busy with Python code meanwhile, simulating a loaded host.
+        warmup: Duration in seconds before the measurement, not recorded.
+        source: Times the samples were taken, see `LatencyRecorder`. If None and the device is simulated,
+            the times of the simulator are used.
+        channels: Channels to keep, see `PicoQuake.start_continuos`.
+
+    Returns:
+        Statistics in order of `STAGES`, followed by the total. See `LatencyRecorder.stats`.
+    """
+    if source is None:
+        source = getattr(device.transport, "sample_time_ns", None)
+    recorder = LatencyRecorder(source)
+    stop = Event()
+    threads = [Thread(target=_busy, args=(stop,), daemon=True) for _ in range(load_threads)]
+    for thread in threads:
+        thread.start()
+    device.latency = recorder
+    device.start_continuos(channels)
+    try:
+        start = time.monotonic()
+        recording = False
+        while True:
+            now = time.monotonic()
+            if not recording and now - start >= warmup:
+                recorder.reset()
+                recording = True
+            if now - start >= warmup + seconds:
+                break
+            device.read(batch, timeout=1.0)
+            if interval > 0:
+                time.sleep(interval)
+    finally:
+        device.stop_continuos()
+        device.latency = None
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return recorder.stats(device.config.sample_rate.param_value)
+
+
+def _busy(stop: Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
@@ -0,0 +1,168 @@
+"""
+This module implements encoding and decoding of the protobuf messages exchanged with the device,
+defined in 'msg/messages.proto', without the protobuf runtime.
+
+The messages are small and fixed, so only the wire types they use are implemented:
+varints for integers, fixed 32-bit for floats and length-delimited for bytes.
+Fields are encoded in field number order and default values are omitted, as by protobuf,
+so encoded messages are identical to the ones of the generated classes in `picoquake.msg.messages_pb2`.
+IMU data is not a protobuf message on the wire, see `picoquake.protocol`.
+"""
+
+import struct
+from dataclasses import dataclass, fields
+from typing import ClassVar, Dict, Tuple, TypeVar
+
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH = 2
+_FIXED32 = 5
+
+# field kinds, with the wire type and the mask of integer values
+_UINT32 = (_VARINT, 0xFFFF_FFFF)
+_UINT64 = (_VARINT, 0xFFFF_FFFF_FFFF_FFFF)
+_FLOAT = (_FIXED32, 0)
+_BYTES = (_LENGTH, 0)
+
+_FLOAT_STRUCT = struct.Struct("<f")
+
+M = TypeVar("M", bound="Message")
+
+
+class Message:
+    """
+    Base class of the messages. Subclasses are data classes with fields in field number order,
+    and define the field kinds in `_KINDS`.
+
+    Methods:
+        encode: Encodes the message.
+        decode: Decodes a message.
+    """
+    _KINDS: ClassVar[Tuple[Tuple[int, int], ...]] = ()
+
+    def encode(self) -> bytes:
+        """
+        Encodes the message to protobuf wire format.
+        """
+        out = bytearray()
+        for number, (f, (wire_type, mask)) in enumerate(zip(fields(self), self._KINDS), start=1):
+            value = getattr(self, f.name)
+            if wire_type == _VARINT:
+                if value:
+                    out += _encode_varint(number << 3 | _VARINT)
+                    out += _encode_varint(value & mask)
+            elif wire_type == _FIXED32:
+                packed = _FLOAT_STRUCT.pack(value)
+                if packed != b"\x00\x00\x00\x00":
+                    out += _encode_varint(number << 3 | _FIXED32)
+                    out += packed
+            elif value:
+                out += _encode_varint(number << 3 | _LENGTH)
+                out += _encode_varint(len(value))
+                out += value
+        return bytes(out)
+
+    @classmethod
+    def decode(cls: "type[M]", data: bytes) -> M:
+        """
+        Decodes a message from protobuf wire format. Unknown fields are skipped.
+
+        Raises:
+            ValueError: If the data is truncated or a field has an unexpected wire type.
+        """
+        names = [f.name for f in fields(cls)]  # type: ignore[arg-type]
+        values: Dict[str, object] = {}
+        pos = 0
+        end = len(data)
+        while pos < end:
+            key, pos = _decode_varint(data, pos)
+            number, wire_type = key >> 3, key & 7
+            known = 1 <= number <= len(names)
+            if known and wire_type != cls._KINDS[number - 1][0]:
+                raise ValueError(f"Invalid wire type {wire_type} of field {number} in {cls.__name__}")
+            if wire_type == _VARINT:
+                value, pos = _decode_varint(data, pos)
+                if known:
+                    values[names[number - 1]] = value & cls._KINDS[number - 1][1]
+                continue
+            if wire_type == _FIXED32:
+                size = 4
+            elif wire_type == _FIXED64:
+                size = 8
+            elif wire_type == _LENGTH:
+                size, pos = _decode_varint(data, pos)
+            else:
+                raise ValueError(f"Unsupported wire type {wire_type} in {cls.__name__}")
+            if pos + size > end:
+                raise ValueError(f"Truncated {cls.__name__} message")
+            if known:
+                chunk = data[pos:pos + size]
+                values[names[number - 1]] = _FLOAT_STRUCT.unpack(chunk)[0] if wire_type == _FIXED32 else bytes(chunk)
+            pos += size
+        return cls(**values)  # type: ignore[call-arg]
+
+
+@dataclass
+class StatusMessage(Message):
+    """
+    Status message sent by the device periodically.
+    """
+    state: int = 0
+    temperature: float = 0.0
+    missed_samples: int = 0
+    error_code: int = 0
+
+    _KINDS = (_UINT32, _FLOAT, _UINT32, _UINT32)
+
+
+@dataclass
+class DeviceInfoMessage(Message):
+    """
+    Device information message sent by the device in response to handshake.
+    """
+    unique_id: bytes = b""
+    firmware: bytes = b""
+
+    _KINDS = (_BYTES, _BYTES)
+
+
+@dataclass
+class CommandMessage(Message):
+    """
+    Command message sent to the device.
+    """
+    id: int = 0
+    filter_config: int = 0
+    data_rate: int = 0
+    acc_range: int = 0
+    gyro_range: int = 0
+    num_to_sample: int = 0
+
+    _KINDS = (_UINT32, _UINT32, _UINT32, _UINT32, _UINT32, _UINT64)
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """
+    Decodes a varint at `pos`. Returns the value and the position after it.
+    """
+    value = 0
+    shift = 0
+    while shift < 70:
+        if pos >= len(data):
+            raise ValueError("Truncated varint")
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+        shift += 7
+    raise ValueError("Invalid varint")
@@ -0,0 +1,252 @@
+"""
+This module implements multi-resolution min/max/mean overviews of acquired data for fast plotting. Requires NumPy.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .data import AcquisitionData, SampleArray
+
+logger = logging.getLogger(__name__)
+
+OVERVIEW_SUFFIX = "_overview.npz"
+"""Suffix of overview files stored next to the data files."""
+
+_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class OverviewLevel:
+    """
+    One level of an overview, with statistics of consecutive bins of samples.
+    Statistics are stored as float32, with one column per channel.
+
+    Attributes:
+        bin_size: Number of samples in a bin. The last bin may be shorter.
+        counts: Raw sample count of the first sample of each bin, shape (n,).
+        minimum: Minimum of each bin, shape (n, k).
+        maximum: Maximum of each bin, shape (n, k).
+        mean: Mean of each bin, shape (n, k).
+        mean_square: Mean square of each bin, shape (n, k).
+    """
+    bin_size: int
+    counts: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+    mean_square: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __getitem__(self, index: slice) -> 'OverviewLevel':
+        return OverviewLevel(self.bin_size, self.counts[index], self.minimum[index], self.maximum[index],
+                             self.mean[index], self.mean_square[index])
+
+
+@dataclass
+class Overview:
+    """
+    Pyramid of min/max/mean statistics of acquisition data, created by `build_overview`.
+    Each level has `factor` times fewer bins than the previous one. Plotting the minimum and maximum
+    of each bin gives the same picture as plotting all samples, if there are more bins than pixels.
+
+    Attributes:
+        channels: Channel names of the columns.
+        num_samples: Number of samples of the data.
+        levels: Levels from the finest to the coarsest.
+
+    Methods:
+        select: Returns the bins of the coarsest level which resolves a count range at a given width.
+        save: Writes the overview to a file.
+        load: Reads the overview from a file.
+    """
+    channels: Tuple[str, ...]
+    num_samples: int
+    levels: List[OverviewLevel]
+
+    def select(self, c0: Optional[int], c1: Optional[int], width: int) -> Optional[OverviewLevel]:
+        """
+        Returns the bins of the coarsest level with at least two bins per pixel in a count range.
+
+        Args:
+            c0: First raw count to include. If None, starts at the first sample.
+            c1: First raw count to exclude. If None, ends at the last sample.
+            width: Width of the plot in pixels.
+
+        Returns:
+            Bins starting in the range, or None if even the finest level is too coarse,
+            in which case the samples should be plotted directly.
+        """
+        for level in reversed(self.levels):
+            start = 0 if c0 is None else int(np.searchsorted(level.counts, c0, side="left"))
+            stop = len(level) if c1 is None else int(np.searchsorted(level.counts, c1, side="left"))
+            if stop - start >= 2 * width:
+                return level[start:stop]
+        return None
+
+    def save(self, path: str):
+        """
+        Writes the overview to an uncompressed NumPy `.npz` file.
+
+        Args:
+            path: Path of the file.
+        """
+        arrays = {"channels": np.array(self.channels), "num_samples": np.array(self.num_samples)}
+        for i, level in enumerate(self.levels):
+            arrays[f"bin_size_{i}"] = np.array(level.bin_size)
+            arrays[f"counts_{i}"] = level.counts
+            arrays[f"minimum_{i}"] = level.minimum
+            arrays[f"maximum_{i}"] = level.maximum
+            arrays[f"mean_{i}"] = level.mean
+            arrays[f"mean_square_{i}"] = level.mean_square
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'Overview':
+        """
+        Reads the overview from a file written by `save`.
+
+        Args:
+            path: Path of the file.
+
+        Returns:
+            The overview.
+        """
+        with np.load(path) as f:
+            levels = []
+            while f"bin_size_{len(levels)}" in f:
+                i = len(levels)
+                levels.append(OverviewLevel(int(f[f"bin_size_{i}"]), f[f"counts_{i}"], f[f"minimum_{i}"],
+                                            f[f"maximum_{i}"], f[f"mean_{i}"], f[f"mean_square_{i}"]))
+            return cls(tuple(str(c) for c in f["channels"]), int(f["num_samples"]), levels)
+
+
+def build_overview(data: AcquisitionData, bin_size: int = 64, factor: int = 4, min_bins: int = 1000,
+                   chunk_size: int = _CHUNK_SIZE) -> Overview:
+    """
+    Builds the overview of all channels of acquisition data.
+    Samples are processed in chunks, so memory-mapped data is not fully loaded at once.
+    Bins follow the sample order, a bin may span skipped samples.
+
+    Args:
+        data: Acquisition data.
+        bin_size: Number of samples in a bin of the finest level.
+        factor: Number of bins combined into a bin of the next level.
+        min_bins: Levels are added until a level has at most this many bins.
+        chunk_size: Number of samples processed at once, rounded down to a multiple of `bin_size`.
+
+    Returns:
+        The overview.
+
+    Raises:
+        ValueError: If parameters are invalid.
+    """
+    if bin_size < 1 or factor < 2:
+        raise ValueError("Bin size must be positive and factor at least 2")
+    samples = data.samples
+    if not isinstance(samples, SampleArray):
+        samples = SampleArray.from_samples(samples, channels=data.channels)
+    columns = [samples.channels.index(c) for c in data.channels]
+    chunk_size = max(bin_size, chunk_size // bin_size * bin_size)
+
+    parts = []
+    for i in range(0, len(samples), chunk_size):
+        values = samples[i:i + chunk_size].to_array()[:, columns]
+        parts.append(_bin_stats(values, bin_size))
+    if parts:
+        stats = [np.concatenate(p) for p in zip(*parts)]
+    else:
+        stats = [np.empty((0, len(columns)), dtype=np.float32)] * 4
+    counts = np.asarray(samples.counts[::bin_size], dtype=np.int64)
+    levels = [OverviewLevel(bin_size, counts, *stats)]
+    while len(levels[-1]) > min_bins:
+        levels.append(_reduce(levels[-1], factor, len(samples)))
+    return Overview(tuple(data.channels), len(samples), levels)
+
+
+def overview_path(path: str) -> str:
+    """
+    Returns the path of the overview file stored next to a data file.
+
+    Args:
+        path: Path of the data file.
+    """
+    return os.path.splitext(path)[0] + OVERVIEW_SUFFIX
+
+
+def get_overview(data: AcquisitionData, save: bool = True, **kwargs) -> Overview:
+    """
+    Returns the overview of acquisition data, read from the overview file next to the data file if it is up to date.
+    Otherwise the overview is built and, if `save` is True, written next to the data file.
+
+    Args:
+        data: Acquisition data, with `csv_path` set if loaded from a file.
+        save: If True, a built overview is written next to the data file.
+            Write errors are logged and ignored.
+        **kwargs: Arguments passed to `build_overview`.
+
+    Returns:
+        The overview.
+    """
+    path = overview_path(data.csv_path) if data.csv_path is not None else None
+    if path is not None and _is_up_to_date(path, data):
+        try:
+            overview = Overview.load(path)
+            if overview.num_samples == data.num_samples and overview.channels == tuple(data.channels):
+                return overview
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to read overview {path}: {e}")
+    overview = build_overview(data, **kwargs)
+    if save and path is not None:
+        try:
+            overview.save(path)
+        except OSError as e:
+            logger.warning(f"Failed to write overview {path}: {e}")
+    return overview
+
+
+def _is_up_to_date(path: str, data: AcquisitionData) -> bool:
+    try:
+        return os.path.getmtime(path) >= os.path.getmtime(data.csv_path)
+    except OSError:
+        return False
+
+
+def _bin_stats(values: np.ndarray, bin_size: int) -> Tuple[np.ndarray, ...]:
+    """Returns minimum, maximum, mean and mean square of bins of `values`, shape (n, k) each."""
+    n_full = len(values) // bin_size
+    full = values[:n_full * bin_size].reshape(n_full, bin_size, -1)
+    stats = [full.min(axis=1), full.max(axis=1), full.mean(axis=1), np.einsum("ijk,ijk->ik", full, full) / bin_size]
+    if len(values) > n_full * bin_size:
+        rest = values[n_full * bin_size:]
+        tail = [rest.min(axis=0), rest.max(axis=0), rest.mean(axis=0), (rest * rest).mean(axis=0)]
+        stats = [np.concatenate((s, t[np.newaxis])) for s, t in zip(stats, tail)]
+    return tuple(s.astype(np.float32) for s in stats)
+
+
+def _reduce(level: OverviewLevel, factor: int, num_samples: int) -> OverviewLevel:
+    """Combines groups of `factor` bins of a level into bins of the next level."""
+    n = len(level)
+    m = -(-n // factor)
+    pad = m * factor - n
+    # number of samples in each bin, for weighted means
+    sizes = np.full(n, level.bin_size, dtype=np.float64)
+    sizes[-1] = num_samples - (n - 1) * level.bin_size
+    sizes = np.concatenate((sizes, np.zeros(pad))).reshape(m, factor, 1)
+
+    def grouped(a, fill):
+        return np.concatenate((a, np.full((pad, a.shape[1]), fill, dtype=a.dtype))).reshape(m, factor, -1)
+
+    total = sizes.sum(axis=1)
+    return OverviewLevel(level.bin_size * factor,
+                         level.counts[::factor],
+                         grouped(level.minimum, np.inf).min(axis=1),
+                         grouped(level.maximum, -np.inf).max(axis=1),
+                         ((grouped(level.mean, 0) * sizes).sum(axis=1) / total).astype(np.float32),
+                         ((grouped(level.mean_square, 0) * sizes).sum(axis=1) / total).astype(np.float32))
@@ -1,78 +1,85 @@
 from itertools import permutations
+from typing import TYPE_CHECKING
 
 from .data import *
 from .utils import get_axis_combinations
 from .analisys import running_rms
 
-def plot_psd(result: AcquisitionData, output_file: str, axis: str = "xyz",
-             freq_min: float = 0, freq_max: Optional[float] = None,
-             show_peaks: bool = False, title=None,
-             tstart: float = float("-inf"), tend: float = float("inf")) -> None:
-    import numpy as np
-    import matplotlib.pyplot as plt
-    from scipy.signal import welch, find_peaks
+if TYPE_CHECKING:
+    from .overview import Overview
+
+# samples per bin of overviews built for plotting
+_OVERVIEW_BIN_SIZE = 64
 
-    combinations = get_axis_combinations("xyz")
-    if axis not in combinations:
-        raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
-    if not result.integrity:
-        print(f"Warning: Data integrity compromised, {result.skipped_samples} samples skipped.")
 
-    # check Nyquist criterion
-    if result.config.sample_rate.param_value < 2 * result.config.filter.param_value:
-        print(f"Warning: sample rate {result.config.sample_rate.param_value} Hz is "
+def _check_channels(result: AcquisitionData, axis: str):
+    missing = [f"acc_{ax}" for ax in axis if f"acc_{ax}" not in result.channels]
+    if missing:
+        raise ValueError(f"Channels not present in data: {', '.join(missing)}")
+
+
+def _check_frequency_range(result: AcquisitionData, freq_min: float, freq_max: Optional[float]) -> float:
+    # check Nyquist criterion, resampled data is filtered by the resampler
+    if result.resample_ratio == 1 and result.sample_rate < 2 * result.config.filter.param_value:
+        print(f"Warning: sample rate {result.sample_rate} Hz is "
               f"not >= 2 * filter frequency {result.config.filter.param_value} Hz.")
-    
+
     # check frequency range
     if freq_max is None:
-        freq_max = result.config.sample_rate.param_value // 2
-    elif freq_max > result.config.sample_rate.param_value // 2:
+        freq_max = result.sample_rate // 2
+    elif freq_max > result.sample_rate // 2:
         print(f"Warning: freq_max ({freq_max} Hz) is greater "
-              f"than 0.5 x sample rate ({result.config.sample_rate.param_value} Hz). "
-              f"Limiting to {result.config.sample_rate.param_value // 2} Hz.")
-        freq_max = result.config.sample_rate.param_value // 2
+              f"than 0.5 x sample rate ({result.sample_rate} Hz). "
+              f"Limiting to {result.sample_rate // 2} Hz.")
+        freq_max = result.sample_rate // 2
 
     if freq_min >= freq_max:
         raise ValueError("freq_min must be less than freq_max.")
+    return freq_max
 
-    acc_x = np.array([s.acc_x for s in result.samples])
-    acc_y = np.array([s.acc_y for s in result.samples])
-    acc_z = np.array([s.acc_z for s in result.samples])
 
-    # Apply time filtering
-    dt = 1 / result.config.sample_rate.param_value
-    t = np.array([dt * s.count for s in result.samples])
-    t_mask = (t >= tstart) & (t <= tend)
-    t = t[t_mask]
-    acc_x = acc_x[t_mask]
-    acc_y = acc_y[t_mask]
-    acc_z = acc_z[t_mask]
+def _plot_spectrum(freqs, values, peaks, channels, show_peaks: bool):
+    import matplotlib.pyplot as plt
+
+    colors = {"acc_x": "red", "acc_y": "green", "acc_z": "blue"}
+    for i, channel in enumerate(channels):
+        color = colors[channel]
+        plt.plot(freqs, values[:, i], label=channel[-1], linewidth=1.0, color=color)
+        if show_peaks:
+            for peak in peaks[i]:
+                plt.annotate(f'{freqs[peak]:.1f} Hz', 
+                            (freqs[peak], values[peak, i]), 
+                            textcoords="offset points", 
+                            xytext=(0,30), 
+                            ha='center', 
+                            color=color,
+                            arrowprops=dict(facecolor=color, shrink=0.1, width=3, headwidth=6, headlength=6),
+                            bbox=dict(boxstyle="round,pad=0.3", edgecolor=color, facecolor='white', alpha=1.0))
+
+
+def plot_psd(result: AcquisitionData, output_file: str, axis: str = "xyz",
+             freq_min: float = 0, freq_max: Optional[float] = None,
+             show_peaks: bool = False, title=None,
+             tstart: float = float("-inf"), tend: float = float("inf")) -> None:
+    import matplotlib.pyplot as plt
+    from .spectral import analyze_data
+
+    combinations = get_axis_combinations("xyz")
+    if axis not in combinations:
+        raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
+    _check_channels(result, axis)
+    result = result.slice(tstart, tend)
+    if not result.integrity:
+        print(f"Warning: Data integrity compromised, {result.skipped_samples} samples skipped.")
+    freq_max = _check_frequency_range(result, freq_min, freq_max)
 
     # calculate segment length based on plot frequency range
-    nperseg = min(int((100 * result.config.sample_rate.param_value) // (freq_max - freq_min)), len(acc_x))
+    nperseg = int((100 * result.sample_rate) // (freq_max - freq_min))
+    spectra = analyze_data(result, [f"acc_{ax}" for ax in "xyz" if ax in axis], amplitude=False,
+                           nperseg=nperseg, freq_min=freq_min, freq_max=freq_max)
 
     plt.figure(figsize=(10, 8))  # Increase figure size. You can adjust the values as needed.
-    for ax, acc, color in zip(['x', 'y', 'z'], [acc_x, acc_y, acc_z], ["red", "green", "blue"]):
-        if ax in axis:
-            f, p_den = welch(acc, fs=result.config.sample_rate.param_value, nperseg=nperseg, scaling="density")
-            mask = (f >= freq_min) & (f <= freq_max)
-            f = f[mask]
-            p_den = p_den[mask]
-            plt.plot(f, p_den, label=ax, linewidth=1.0, color=color)
-            if show_peaks:
-                peaks, _ = find_peaks(p_den)
-                if len(peaks) > 0:
-                    peak_heights = p_den[peaks]
-                    top_peaks = peaks[np.argsort(peak_heights)[-3:]]
-                    for peak in top_peaks:
-                        plt.annotate(f'{f[peak]:.1f} Hz', 
-                                    (f[peak], p_den[peak]), 
-                                    textcoords="offset points", 
-                                    xytext=(0,30), 
-                                    ha='center', 
-                                    color=color,
-                                    arrowprops=dict(facecolor=color, shrink=0.1, width=3, headwidth=6, headlength=6),
-                                    bbox=dict(boxstyle="round,pad=0.3", edgecolor=color, facecolor='white', alpha=1.0))
+    _plot_spectrum(spectra.psd_freqs, spectra.psd, spectra.psd_peaks, spectra.channels, show_peaks)
 
     if title is not None:
         plt.title(title, pad=40)
@@ -91,76 +98,23 @@ def plot_fft(result: AcquisitionData, output_file: str, axis: str = "xyz",
              freq_min: float = 0, freq_max: Optional[float] = None,
              show_peaks: bool = False, title=None,
              tstart: float = float("-inf"), tend: float = float("inf")) -> None:
-    import numpy as np
     import matplotlib.pyplot as plt
-    from scipy.fft import fft, fftfreq
-    from scipy.signal import find_peaks
-    from scipy.signal.windows import hann
+    from .spectral import analyze_data
 
     combinations = get_axis_combinations("xyz")
     if axis not in combinations:
         raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
+    _check_channels(result, axis)
+    result = result.slice(tstart, tend)
     if not result.integrity:
         print(f"Warning: Data integrity compromised, {result.skipped_samples} samples skipped.")
+    freq_max = _check_frequency_range(result, freq_min, freq_max)
 
-    # check Nyquist criterion
-    if result.config.sample_rate.param_value < 2 * result.config.filter.param_value:
-        print(f"Warning: sample rate {result.config.sample_rate.param_value} Hz is "
-              f"not >= 2 * filter frequency {result.config.filter.param_value} Hz.")
-    
-    # check frequency range
-    if freq_max is None:
-        freq_max = result.config.sample_rate.param_value // 2
-    elif freq_max > result.config.sample_rate.param_value // 2:
-        print(f"Warning: freq_max ({freq_max} Hz) is greater "
-              f"than 0.5 x sample rate ({result.config.sample_rate.param_value} Hz). "
-              f"Limiting to {result.config.sample_rate.param_value // 2} Hz.")
-        freq_max = result.config.sample_rate.param_value // 2
-
-    if freq_min >= freq_max:
-        raise ValueError("freq_min must be less than freq_max.")
-
-    acc_x = np.array([s.acc_x for s in result.samples])
-    acc_y = np.array([s.acc_y for s in result.samples])
-    acc_z = np.array([s.acc_z for s in result.samples])
-
-    # Apply time filtering
-    dt = 1 / result.config.sample_rate.param_value
-    t = np.array([dt * s.count for s in result.samples])
-    t_mask = (t >= tstart) & (t <= tend)
-    t = t[t_mask]
-    acc_x = acc_x[t_mask]
-    acc_y = acc_y[t_mask]
-    acc_z = acc_z[t_mask]
+    spectra = analyze_data(result, [f"acc_{ax}" for ax in "xyz" if ax in axis], psd=False,
+                           freq_min=freq_min, freq_max=freq_max)
 
     plt.figure(figsize=(10, 8))  # Increase figure size. You can adjust the values as needed.
-    for ax, acc, color in zip(['x', 'y', 'z'], [acc_x, acc_y, acc_z], ["red", "green", "blue"]):
-        if ax in axis:
-            N = len(acc)
-            T = 1.0 / result.config.sample_rate.param_value
-            # Apply a window function
-            window = hann(len(acc))
-            acc = acc * window
-            yf = fft(acc)
-            xf = fftfreq(N, T)
-            f_mask = (xf >= freq_min) & (xf <= freq_max)
-            xf = xf[f_mask]
-            yf = yf[f_mask]
-            plt.plot(xf, 2.0/N * np.abs(yf[0:N//2]), label=ax, linewidth=1.0, color=color)
-            if show_peaks:
-                peaks, _ = find_peaks(2.0/N * np.abs(yf[0:N//2]))
-                if len(peaks) > 0:
-                    peak_heights = 2.0/N * np.abs(yf[0:N//2])[peaks]
-                    top_peaks = peaks[np.argsort(peak_heights)[-3:]]
-                    for peak in top_peaks:
-                        plt.annotate(f'{xf[peak]:.1f} Hz', 
-                                    (xf[peak], 2.0/N * np.abs(yf[0:N//2])[peak]), 
-                                    textcoords="offset points", 
-                                    xytext=(0,30), 
-                                    ha='center', 
-                                    color=color,
-                                    arrowprops=dict(facecolor=color, shrink=0.1, width=3, headwidth=6, headlength=6),
-                                    bbox=dict(boxstyle="round,pad=0.3", edgecolor=color, facecolor='white', alpha=1.0))
+    _plot_spectrum(spectra.freqs, spectra.amplitude, spectra.amplitude_peaks, spectra.channels, show_peaks)
 
     if title is not None:
         plt.title(title, pad=40)
@@ -176,36 +130,108 @@ def plot_fft(result: AcquisitionData, output_file: str, axis: str = "xyz",
     plt.savefig(output_file, dpi=200)
 
 
+def plot_spectrogram(result: AcquisitionData, output_file: str, axis: str = "xyz",
+                     freq_min: float = 0, freq_max: Optional[float] = None,
+                     nperseg: int = 256, title=None,
+                     tstart: float = float("-inf"), tend: float = float("inf"),
+                     max_columns: int = 2000, max_rows: int = 1000) -> None:
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from .spectral import spectrogram_data
+
+    combinations = get_axis_combinations("xyz")
+    if axis not in combinations:
+        raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
+    _check_channels(result, axis)
+    result = result.slice(tstart, tend)
+    if not result.integrity:
+        print(f"Warning: Data integrity compromised, {result.skipped_samples} samples skipped.")
+    freq_max = _check_frequency_range(result, freq_min, freq_max)
+
+    # decimate to the plot resolution
+    fs = result.sample_rate
+    nperseg = min(nperseg, result.num_samples)
+    noverlap = nperseg // 2
+    num_segments = max(1, (result.num_samples - nperseg) // (nperseg - noverlap) + 1)
+    num_bins = int((freq_max - freq_min) * nperseg / fs) + 1
+    spectra = spectrogram_data(result, [f"acc_{ax}" for ax in "xyz" if ax in axis],
+                               nperseg=nperseg, noverlap=noverlap, freq_min=freq_min, freq_max=freq_max,
+                               time_decimation=-(-num_segments // max_columns),
+                               freq_decimation=-(-num_bins // max_rows))
+    t0 = result.counts[0] / fs if result.num_samples > 0 else 0
+
+    fig, axes = plt.subplots(len(spectra.channels), 1, figsize=(10, 3 * len(spectra.channels) + 1),
+                             sharex=True, squeeze=False)
+    for i, channel in enumerate(spectra.channels):
+        ax = axes[i, 0]
+        power = 10 * np.log10(np.maximum(spectra.power[:, :, i].T, 1e-20))
+        mesh = ax.pcolormesh(t0 + spectra.times, spectra.freqs, power, shading="nearest", cmap="viridis")
+        fig.colorbar(mesh, ax=ax, label="PSD [dB g$^2$/Hz]")
+        ax.set_ylabel(f"{channel[-1]}: Frequency [Hz]")
+
+    if title is not None:
+        fig.suptitle(title)
+    elif result.filename is not None:
+        fig.suptitle(result.filename)
+    axes[-1, 0].set_xlabel("Time [s]")
+    plt.savefig(output_file, dpi=200)
+
+
 def plot(result: AcquisitionData, output_file: str, axis: str = "xyz",
          tstart: float = float("-inf"), tend: float = float("inf"), title=None,
-         rms: bool=False, rms_win: float=1.0, rms_detrend: bool=False) -> None:
+         rms: bool=False, rms_win: float=1.0, rms_detrend: bool=False,
+         overview: Optional["Overview"] = None, save_overview: bool = False) -> None:
     import numpy as np
     import matplotlib.pyplot as plt
+    from .overview import build_overview, get_overview
 
     combinations = get_axis_combinations("xyz")
     if axis not in combinations:
         raise ValueError("Invalid axis, must be 'x', 'y', 'z', or a combination.")
+    _check_channels(result, axis)
+    full = result
+    result = result.slice(tstart, tend)
     if not result.integrity:
         print(f"Warning: Data integrity compromised, {result.skipped_samples} samples skipped.")
 
-    acc_x = np.array([s.acc_x for s in result.samples])
-    acc_y = np.array([s.acc_y for s in result.samples])
-    acc_z = np.array([s.acc_z for s in result.samples])
+    fig_width, dpi = 10, 200
+    plt.figure(figsize=(fig_width, 6))  # Increase figure size. You can adjust the values as needed.
 
-    plt.figure(figsize=(10, 6))  # Increase figure size. You can adjust the values as needed.
+    # long recordings are plotted from min/max bins, so rendering time depends on the plot width
+    width = fig_width * dpi
+    if overview is None and result.num_samples >= 2 * width * _OVERVIEW_BIN_SIZE:
+        if save_overview:
+            overview = get_overview(full, bin_size=_OVERVIEW_BIN_SIZE)
+        else:
+            overview = build_overview(result, bin_size=_OVERVIEW_BIN_SIZE)
+    bins = None
+    if overview is not None and result.num_samples > 0:
+        bins = overview.select(result.samples[0].count, result.samples[-1].count + 1, width)
 
-    dt = 1 / result.config.sample_rate.param_value
-    t = np.array([dt * s.count for s in result.samples])
-    mask = (t >= tstart) & (t <= tend)
-    t = t[mask]
-    for ax, acc, color, rms_color in zip(['x', 'y', 'z'], [acc_x, acc_y, acc_z], ["red", "green", "blue"], ["orange", "lightgreen", "lightblue"]):
-        if ax in axis:
-            acc = acc[mask]
-            plt.plot(t, acc, label=ax, linewidth=1.0, color=color)
+    fs = result.sample_rate
+    channels = overview.channels if bins is not None else result.channels
+    if bins is None:
+        values = result.to_array()
+        t = np.array(result.counts) / fs
+    else:
+        t = (bins.counts - result.count_offset) / fs
+    for ax, color, rms_color in zip(['x', 'y', 'z'], ["red", "green", "blue"], ["orange", "lightgreen", "lightblue"]):
+        if ax not in axis:
+            continue
+        col = channels.index(f"acc_{ax}")
+        if bins is None:
+            plt.plot(t, values[:, col], label=ax, linewidth=1.0, color=color)
             if rms:
-                rms_data = running_rms(acc.tolist(), int(rms_win * result.config.sample_rate.param_value),
-                                       de_trend=rms_detrend)
-                plt.plot(t, rms_data, label=f"{ax} RMS", linewidth=2.0, color=rms_color, linestyle="--")
+                rms_data = running_rms(values[:, col], int(rms_win * fs), de_trend=rms_detrend)
+        else:
+            # band between minimum and maximum of each bin, the edge keeps the line width of quiet parts
+            plt.fill_between(t, bins.minimum[:, col], bins.maximum[:, col], linewidth=1.0, color=color)
+            plt.plot([], [], label=ax, linewidth=1.0, color=color)
+            if rms:
+                rms_data = _binned_running_rms(bins.mean[:, col], bins.mean_square[:, col],
+                                               max(1, round(rms_win * fs / bins.bin_size)), rms_detrend)
+        if rms:
+            plt.plot(t, rms_data, label=f"{ax} RMS", linewidth=2.0, color=rms_color, linestyle="--")
 
     if title is not None:
         plt.title(title, pad=20)
@@ -217,4 +243,17 @@ def plot(result: AcquisitionData, output_file: str, axis: str = "xyz",
     plt.minorticks_on()
     plt.legend(loc="upper right")
     plt.autoscale(enable=True, axis='y', tight=False)
-    plt.savefig(output_file, dpi=200)
+    plt.savefig(output_file, dpi=dpi)
+
+
+def _binned_running_rms(mean, mean_square, window: int, de_trend: bool):
+    """Trailing running RMS over `window` bins of an overview level, truncated at the start."""
+    import numpy as np
+    n = np.minimum(np.arange(1, len(mean) + 1), window)
+    cs_mean = np.concatenate(([0.0], np.cumsum(mean, dtype=np.float64)))
+    cs_square = np.concatenate(([0.0], np.cumsum(mean_square, dtype=np.float64)))
+    end = np.arange(1, len(mean) + 1)
+    ms = (cs_square[end] - cs_square[end - n]) / n
+    if de_trend:
+        ms -= ((cs_mean[end] - cs_mean[end - n]) / n) ** 2
+    return np.sqrt(np.maximum(ms, 0.0))
@@ -0,0 +1,212 @@
+"""
+This module implements connecting to many devices concurrently and keeping them connected in a pool.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .discovery import get_registry
+from .interface import PicoQuake
+
+_logger = logging.getLogger(__name__)
+
+
+class DevicePool:
+    """
+    Pool of connected devices, reused by jobs within one process.
+
+    Devices are identified by the target they were connected with, a short ID or a port.
+    Connecting runs the handshakes of all devices concurrently, so a rig is connected
+    in one handshake time regardless of its size, and a failing device does not delay the others.
+    A pooled device that was stopped or failed is connected again when requested.
+
+    Jobs using a pooled device should stop sampling, e.g. with `stop_continuos`, but not stop the device.
+
+    Methods:
+        connect: Connects to devices concurrently, reusing the connected ones.
+        get: Returns a connected device.
+        release: Stops a device and removes it from the pool.
+        close: Stops all devices.
+    """
+
+    def __init__(self, reconnect: bool = False):
+        """
+        Args:
+            reconnect: Passed to `PicoQuake` for each device, see `PicoQuake.__init__`.
+        """
+        self.reconnect = reconnect
+        self._devices: Dict[str, PicoQuake] = {}
+        self._lock = Lock()
+
+    def connect(self, targets: Iterable[str],
+                max_workers: Optional[int] = None) -> Tuple[Dict[str, PicoQuake], Dict[str, Exception]]:
+        """
+        Connects to devices concurrently. Devices already connected in the pool are reused.
+
+        Args:
+            targets: Short IDs written on the device labels, or ports or transport URLs, see `PicoQuake.__init__`.
+            max_workers: Maximum number of concurrent handshakes, all at once if None.
+
+        Returns:
+            Connected devices and errors of devices that could not be connected, both by target.
+            Short IDs are upper case.
+        """
+        targets = list(dict.fromkeys(_key(t) for t in targets))
+        devices: Dict[str, PicoQuake] = {}
+        errors: Dict[str, Exception] = {}
+        with self._lock:
+            for target in targets:
+                device = self._devices.get(target)
+                if device is not None and device.connected:
+                    devices[target] = device
+        missing = [t for t in targets if t not in devices]
+        if not missing:
+            return devices, errors
+
+        _discover([t for t in missing if _is_short_id(t)])
+        with ThreadPoolExecutor(max_workers=max_workers or len(missing),
+                                thread_name_prefix="picoquake-connect") as executor:
+            futures = {t: executor.submit(self._open, t) for t in missing}
+        for target, future in futures.items():
+            try:
+                device = future.result()
+            except Exception as e:
+                _logger.warning(f"Could not connect to {target}: {e}")
+                errors[target] = e
+                continue
+            devices[target] = self._add(target, device)
+        return devices, errors
+
+    def get(self, target: str) -> PicoQuake:
+        """
+        Returns a connected device, connecting to it if it is not in the pool.
+
+        Args:
+            target: Short ID written on the device label, or port or transport URL.
+
+        Raises:
+            DeviceNotFound: If device with short ID is not found.
+            ConnectionError: If the device could not be connected.
+        """
+        devices, errors = self.connect([target])
+        if errors:
+            raise next(iter(errors.values()))
+        return next(iter(devices.values()))
+
+    def release(self, target: str):
+        """
+        Stops a device and removes it from the pool.
+
+        Args:
+            target: Short ID written on the device label, or port or transport URL.
+        """
+        with self._lock:
+            device = self._devices.pop(_key(target), None)
+        if device is not None:
+            device.stop()
+
+    def close(self):
+        """
+        Stops all devices and empties the pool.
+        """
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for device in devices:
+            device.stop()
+
+    @property
+    def targets(self) -> List[str]:
+        """
+        Targets of the pooled devices.
+        """
+        with self._lock:
+            return list(self._devices)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._devices)
+
+    def __contains__(self, target: str) -> bool:
+        with self._lock:
+            return _key(target) in self._devices
+
+    def __enter__(self) -> "DevicePool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self, target: str) -> PicoQuake:
+        if _is_short_id(target):
+            return PicoQuake(target, reconnect=self.reconnect)
+        return PicoQuake(port=target, reconnect=self.reconnect)
+
+    def _add(self, target: str, device: PicoQuake) -> PicoQuake:
+        """
+        Adds a connected device, unless another thread added the same device meanwhile.
+        """
+        with self._lock:
+            old = self._devices.get(target)
+            if old is not None and old is not device and old.connected:
+                duplicate, device = device, old
+            else:
+                duplicate = old
+                self._devices[target] = device
+        if duplicate is not None:
+            duplicate.stop()
+        return device
+
+
+def _is_short_id(target: str) -> bool:
+    # short IDs are 4 hex digits, unlike ports such as 'COM3'
+    return len(target) == 4 and all(c in "0123456789abcdefABCDEF" for c in target)
+
+
+def _key(target: str) -> str:
+    return target.upper() if _is_short_id(target) else target
+
+
+def _discover(short_ids: List[str]):
+    """
+    Enumerates ports once if any device is not in the registry cache,
+    instead of each handshake thread enumerating them.
+    """
+    registry = get_registry()
+    if any(registry.find(s, refresh=False) is None for s in short_ids):
+        registry.discover()
+
+
+_pool: Optional[DevicePool] = None
+_pool_lock = Lock()
+
+
+def get_pool() -> DevicePool:
+    """
+    Returns the pool shared by the process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DevicePool()
+        return _pool
+
+
+def connect_many(targets: Iterable[str], pool: Optional[DevicePool] = None,
+                 max_workers: Optional[int] = None) -> Tuple[Dict[str, PicoQuake], Dict[str, Exception]]:
+    """
+    Connects to many devices concurrently and keeps them in a pool for reuse. See `DevicePool.connect`.
+
+    Args:
+        targets: Short IDs written on the device labels, or ports or transport URLs.
+        pool: The pool, `get_pool()` if None.
+        max_workers: Maximum number of concurrent handshakes, all at once if None.
+
+    Returns:
+        Connected devices and errors of devices that could not be connected, both by target.
+    """
+    if pool is None:
+        pool = get_pool()
+    return pool.connect(targets, max_workers)
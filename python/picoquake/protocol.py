@@ -0,0 +1,295 @@
+"""
+This module implements framing and decoding of the packets sent by PicoQuake device,
+both incrementally for live streams and in batch for recorded captures.
+
+Packets are delimited by zero bytes. Each packet is the packet ID followed by the COBS encoded payload.
+"""
+
+import csv
+import io
+import logging
+import struct
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+from cobs import cobs
+
+from .messages import StatusMessage, DeviceInfoMessage
+from .data import *
+from .data import _parse_csv_metadata
+from .clock import ClockEstimator
+from .transport import CaptureChunk, CaptureReader, READ, META
+
+IMU_PACKET_SIZE = 34
+"""Size of an IMU data packet between delimiters: packet ID and the COBS encoded 32-byte payload."""
+
+_IMU_STRUCT = struct.Struct("<Qffffff")
+
+_logger = logging.getLogger(__name__)
+
+
+class FrameDecoder:
+    """
+    Splits the byte stream received from the device into packets.
+
+    A zero byte starts a packet and the next zero byte ends it. Consecutive zero bytes are treated as
+    a new start flag and bytes outside of packets are dropped. The decoder keeps its state between calls,
+    so a packet may span several chunks.
+
+    Methods:
+        feed: Feeds received bytes and returns the completed packets.
+        reset: Drops the packet being received.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._receiving = False
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Feeds received bytes.
+
+        Args:
+            data: The received bytes.
+
+        Returns:
+            Packets completed by the bytes, without delimiters.
+        """
+        packets = []
+        parts = data.split(b"\x00")
+        buffer = self._buffer
+        if self._receiving:
+            buffer += parts[0]
+        for part in parts[1:]:
+            if not self._receiving:
+                # start flag
+                self._receiving = True
+            elif buffer:
+                # stop flag, end of packet
+                packets.append(bytes(buffer))
+                buffer.clear()
+                self._receiving = False
+                continue
+            # an empty packet is treated as a new start flag
+            buffer += part
+        return packets
+
+    def reset(self):
+        """
+        Drops the packet being received.
+        """
+        self._buffer.clear()
+        self._receiving = False
+
+
+def encode_packet(packet_id: PacketID, payload: bytes) -> bytes:
+    """
+    Encodes a packet with delimiters.
+
+    Args:
+        packet_id: The packet ID.
+        payload: The payload, COBS encoded by this function.
+
+    Returns:
+        The packet, ready to be written to the device.
+    """
+    return b"\x00" + bytes([packet_id.value]) + cobs.encode(payload) + b"\x00"
+
+
+def decode_packet(packet: bytes, channel_mask: Optional[Tuple[bool, ...]] = None):
+    """
+    Decodes a packet received from the device.
+
+    Args:
+        packet: The packet without delimiters.
+        channel_mask: Channels kept in IMU samples, in `CHANNELS` order. Values of other channels are None.
+            All channels are kept if None.
+
+    Returns:
+        `IMUSample` for IMU data packets, `StatusMessage` or `DeviceInfoMessage` otherwise.
+
+    Raises:
+        ValueError: If the packet ID is unknown or the packet is invalid.
+    """
+    packet_id = PacketID(packet[0])
+    decoded = cobs.decode(packet[1:])
+    if packet_id == PacketID.IMU_DATA:
+        try:
+            unpacked_data = _IMU_STRUCT.unpack(decoded)
+        except struct.error as e:
+            raise ValueError(f"Invalid IMU packet: {e}")
+        if channel_mask is None:
+            return IMUSample(*unpacked_data)
+        return IMUSample(unpacked_data[0],
+                         *(v if keep else None for v, keep in zip(unpacked_data[1:], channel_mask)))
+    elif packet_id == PacketID.STATUS:
+        return StatusMessage.decode(decoded)
+    elif packet_id == PacketID.DEVICE_INFO:
+        return DeviceInfoMessage.decode(decoded)
+    raise ValueError(f"Unexpected packet: {packet_id.name}")
+
+
+def split_frames(buffer, receiving: bool = False):
+    """
+    Finds the packets in a block of the byte stream, with the same rules as `FrameDecoder`. Requires NumPy.
+
+    Args:
+        buffer: The bytes as a uint8 NumPy array.
+        receiving: Whether a packet was being received at the start of the block.
+
+    Returns:
+        A tuple of packet start and end offsets in `buffer` as NumPy arrays, the receiving state
+        at the end of the block, and the offset of the unterminated tail to be prepended to the next block.
+    """
+    import numpy as np
+    zeros = np.flatnonzero(buffer == 0)
+    if len(zeros) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, receiving, 0
+    # segments between delimiters, the first one continues the previous block
+    starts = np.concatenate(([0], zeros[:-1] + 1))
+    ends = zeros
+    non_empty = ends > starts
+    # a segment is a packet when receiving at its start: receiving is set by any empty segment
+    # and alternates within runs of non-empty segments
+    index = np.arange(len(starts))
+    last_empty = np.maximum.accumulate(np.where(non_empty, -1, index))
+    position = index - last_empty - 1
+    if not receiving:
+        position[last_empty < 0] += 1
+    is_packet = non_empty & (position % 2 == 0)
+    return starts[is_packet], ends[is_packet], not is_packet[-1], int(zeros[-1]) + 1
+
+
+def decode_imu_batch(buffer, starts, ends):
+    """
+    Decodes IMU data packets found by `split_frames` in batch. Requires NumPy.
+
+    Args:
+        buffer: The bytes as a uint8 NumPy array.
+        starts: Packet start offsets.
+        ends: Packet end offsets.
+
+    Returns:
+        A tuple of sample counts, channel values of shape (n, 6) in `CHANNELS` order, and a boolean mask
+        of the packets that were not decoded, e.g. status packets, to be decoded with `decode_packet`.
+    """
+    import numpy as np
+    is_imu = ((ends - starts) == IMU_PACKET_SIZE) & (buffer[starts] == PacketID.IMU_DATA.value)
+    # one row per byte position, so the columns of the chain are contiguous
+    encoded = buffer[starts[is_imu] + 1 + np.arange(IMU_PACKET_SIZE - 1)[:, None]]
+    # follow the COBS code chain, each code byte is a zero in the payload
+    next_code = np.zeros(encoded.shape[1], dtype=np.int16)
+    zero = np.empty(encoded.shape, dtype=bool)
+    for position in range(IMU_PACKET_SIZE - 1):
+        is_code = next_code == position
+        zero[position] = is_code
+        next_code += encoded[position] * is_code
+    valid = next_code == IMU_PACKET_SIZE - 1
+    encoded[zero] = 0
+    payload = np.ascontiguousarray(encoded[1:, valid].T)
+    records = payload.view(np.dtype([("count", "<u8"), ("values", "<f4", 6)]))[:, 0]
+    undecoded = ~is_imu
+    undecoded[np.flatnonzero(is_imu)[~valid]] = True
+    return records["count"].astype(np.int64), records["values"], undecoded
+
+
+def _capture_metadata(device: DeviceInfo, config: Config, start_time: datetime) -> bytes:
+    """
+    Returns the metadata chunk written at the start of a raw capture: the data file metadata header.
+    """
+    data = AcquisitionData(samples=[], device=device, config=config, start_time=start_time)
+    return data._metadata_header().encode("utf-8")
+
+
+def decode_capture(path: str, output: Optional[str] = None, channels: Union[str, List[str], None] = None,
+                   chunk_size: int = 1 << 24) -> AcquisitionData:
+    """
+    Decodes a raw capture recorded by `PicoQuake.start_capture` into acquisition data. Requires NumPy.
+
+    Packets are framed and decoded in batch, so large captures are decoded much faster than received.
+    The clock is fitted to the recorded arrival times of the samples, see `clock.ClockEstimator`.
+    Samples with counts lower than the last decoded one, e.g. repeated after a restart, are dropped.
+
+    Args:
+        path: Path to the capture file.
+        output: Path of a data file to write, CSV if it ends with '.csv', binary otherwise. Not written if None.
+        channels: Channels to keep, e.g. 'acc', 'acc_z' or 'acc_x,gyro_x'. All channels if None.
+        chunk_size: Number of bytes decoded at once.
+
+    Returns:
+        The acquisition data, with sample counts re-centred on the first sample.
+
+    Raises:
+        ValueError: If the file is not a capture file or it has no metadata.
+    """
+    import numpy as np
+    channels = parse_channels(channels)
+    indices = [CHANNELS.index(c) for c in channels]
+    counts: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    metadata: Optional[List[List[str]]] = None
+    arrivals: List[Tuple[int, int]] = []
+    state = {"tail": np.empty(0, dtype=np.uint8), "receiving": False, "errors": 0}
+
+    def decode_block(chunks: List[CaptureChunk]):
+        block = np.frombuffer(b"".join(c.data for c in chunks), dtype=np.uint8)
+        buffer = np.concatenate((state["tail"], block))
+        chunk_ends = len(state["tail"]) + np.cumsum([len(c.data) for c in chunks])
+        starts, ends, state["receiving"], tail = split_frames(buffer, state["receiving"])
+        state["tail"] = buffer[tail:]
+        block_counts, block_values, undecoded = decode_imu_batch(buffer, starts, ends)
+        counts.append(block_counts)
+        values.append(block_values[:, indices])
+        # arrival time of the last sample completed by each chunk
+        chunk_index = np.searchsorted(chunk_ends, ends[~undecoded], side="right")
+        for i in np.flatnonzero(np.diff(chunk_index, append=-1) != 0):
+            arrivals.append((int(block_counts[i]), chunks[chunk_index[i]].timestamp_ns))
+        for start, end in zip(starts[undecoded], ends[undecoded]):
+            try:
+                decode_packet(buffer[start:end].tobytes())
+            except Exception:
+                state["errors"] += 1
+
+    with CaptureReader(path) as reader:
+        wall_offset_ns = int(reader.wall_time * 1e9) - reader.start_ns
+        pending: List[CaptureChunk] = []
+        size = 0
+        for chunk in reader:
+            if chunk.direction == META:
+                metadata = list(csv.reader(io.StringIO(chunk.data.decode("utf-8"))))
+            elif chunk.direction == READ:
+                pending.append(chunk)
+                size += len(chunk.data)
+                if size >= chunk_size:
+                    decode_block(pending)
+                    pending, size = [], 0
+        decode_block(pending)
+    if metadata is None:
+        raise ValueError("Capture has no metadata")
+    if state["errors"]:
+        _logger.warning(f"{state['errors']} packets could not be decoded")
+    device, config, start_time = _parse_csv_metadata(metadata)
+
+    all_counts = np.concatenate(counts)
+    all_values = np.concatenate(values)
+    # keep increasing counts only
+    keep = all_counts > np.maximum.accumulate(np.concatenate(([-1], all_counts[:-1])))
+    estimator = ClockEstimator(config.sample_rate.param_value, wall_offset_ns=wall_offset_ns)
+    for count, arrival_ns in arrivals:
+        estimator.add(count, arrival_ns)
+    data = AcquisitionData(samples=SampleArray(all_counts[keep], all_values[keep], channels=channels),
+                           device=device,
+                           config=config,
+                           start_time=start_time,
+                           channels=channels,
+                           clock=estimator.fit())
+    data.re_centre(0)
+    if data.clock is not None:
+        data.start_time = data.clock.datetime(data.count_offset)
+    if output is not None:
+        if output.lower().endswith(".csv"):
+            data.to_csv(output)
+        else:
+            data.to_bin(output)
+    return data
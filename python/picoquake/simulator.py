@@ -0,0 +1,171 @@
+"""
+This module implements a simulated PicoQuake device, for tests and benchmarks without a device.
+"""
+
+import math
+import struct
+import time
+from threading import Condition
+from typing import Optional
+
+from cobs import cobs
+
+from .configuration import SampleRate
+from .data import CommandID, PacketID, State
+from .messages import CommandMessage, DeviceInfoMessage, StatusMessage
+from .protocol import FrameDecoder, encode_packet
+from .transport import Transport, _DEFAULT_TIMEOUT
+
+_STATUS_INTERVAL = 0.5
+_IMU_STRUCT = struct.Struct("<Qffffff")
+
+
+class SimulatorTransport(Transport):
+    """
+    Transport to a simulated device, responding to commands as PicoQuake firmware does.
+
+    Samples are generated in real time at the configured sample rate: 1 g on the Z axis
+    plus a sine of `frequency` Hz with amplitude 0.1 on all axes. Status is sent twice per second.
+    As with a serial port, `read` waits for `size` bytes or the timeout, unless in low latency mode.
+
+    Attributes:
+        unique_id: Unique ID reported by the simulated device.
+        firmware: Firmware version reported by the simulated device.
+        frequency: Frequency of the generated sine in Hz.
+        start_ns: Host monotonic time of sample 0 of the current or last sampling in nanoseconds,
+            None before sampling.
+    """
+
+    def __init__(self, unique_id: str = "E66368254F89A225", firmware: str = "1.2.0",
+                 timeout: float = _DEFAULT_TIMEOUT, low_latency: bool = False, frequency: float = 10.0):
+        """
+        Args:
+            unique_id: Unique ID reported by the simulated device, 16 hex digits.
+            firmware: Firmware version reported by the simulated device.
+            timeout: Maximum time in seconds `read` waits for data.
+            low_latency: If True, `read` returns as soon as any bytes are available.
+            frequency: Frequency of the generated sine in Hz.
+        """
+        self.unique_id = unique_id
+        self.firmware = firmware
+        self.timeout = timeout
+        self.low_latency = low_latency
+        self.frequency = frequency
+        self.start_ns: Optional[int] = None
+        self._sampling = False
+        self._period_ns = 0.0
+        self._next_count = 0
+        self._num_to_sample = 0
+        self._next_status_ns = 0
+        self._buffer = bytearray()
+        self._frames = FrameDecoder()
+        self._condition = Condition()
+        self._woken = False
+        self._open = False
+
+    def open(self):
+        with self._condition:
+            self._sampling = False
+            self._buffer.clear()
+            self._frames.reset()
+            self._next_status_ns = time.monotonic_ns()
+            self._woken = False
+            self._open = True
+
+    def sample_time_ns(self, count: int) -> Optional[int]:
+        """
+        Returns the host monotonic time in nanoseconds at which the sample with `count` was generated,
+        or None before sampling.
+        """
+        start_ns = self.start_ns
+        if start_ns is None:
+            return None
+        return start_ns + int(count * self._period_ns)
+
+    def read(self, size: int) -> bytes:
+        deadline = time.monotonic_ns() + int(self.timeout * 1e9)
+        with self._condition:
+            if not self._open:
+                raise ConnectionError("Simulator closed")
+            while True:
+                now = time.monotonic_ns()
+                next_ns = self._generate(now)
+                if len(self._buffer) >= size or (self._buffer and self.low_latency) or now >= deadline:
+                    break
+                if self._woken:
+                    self._woken = False
+                    break
+                self._condition.wait(max(0, min(next_ns, deadline) - now) * 1e-9)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def write(self, data: bytes):
+        with self._condition:
+            for packet in self._frames.feed(data):
+                if packet[0] != PacketID.COMMAND.value:
+                    continue
+                self._command(CommandMessage.decode(cobs.decode(packet[1:])))
+            self._condition.notify_all()
+
+    def wake(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._open = False
+            self._sampling = False
+
+    def _command(self, msg: CommandMessage):
+        command = CommandID(msg.id)
+        if command == CommandID.HANDSHAKE:
+            info = DeviceInfoMessage(bytes.fromhex(self.unique_id), self.firmware.encode().ljust(9, b"\x00"))
+            self._buffer += encode_packet(PacketID.DEVICE_INFO, info.encode())
+            self._status()
+        elif command == CommandID.START_SAMPLING:
+            rate = SampleRate.from_index(msg.data_rate).param_value
+            self._period_ns = 1e9 / rate
+            self._next_count = 0
+            self._num_to_sample = msg.num_to_sample
+            self.start_ns = time.monotonic_ns()
+            self._sampling = True
+            self._status()
+        elif command == CommandID.STOP_SAMPLING:
+            self._sampling = False
+            self._status()
+
+    def _generate(self, now: int) -> int:
+        """
+        Appends the samples and status due at `now` to the buffer. Returns the time of the next due packet.
+        """
+        if now >= self._next_status_ns:
+            self._status()
+            self._next_status_ns = now + int(_STATUS_INTERVAL * 1e9)
+        next_ns = self._next_status_ns
+        if self._sampling:
+            omega = 2 * math.pi * self.frequency
+            while True:
+                due = self.start_ns + int(self._next_count * self._period_ns)
+                if due > now:
+                    next_ns = min(next_ns, due)
+                    break
+                t = self._next_count * self._period_ns * 1e-9
+                wave = 0.1 * math.sin(omega * t)
+                payload = _IMU_STRUCT.pack(self._next_count, wave, wave, 1.0 + wave, wave, wave, wave)
+                self._buffer += encode_packet(PacketID.IMU_DATA, payload)
+                self._next_count += 1
+                if self._num_to_sample and self._next_count >= self._num_to_sample:
+                    self._sampling = False
+                    self._status()
+                    break
+        return next_ns
+
+    def _status(self):
+        state = State.SAMPLING if self._sampling else State.IDLE
+        msg = StatusMessage(state.value, 30.0)
+        self._buffer += encode_packet(PacketID.STATUS, msg.encode())
+
+    def __str__(self) -> str:
+        return "simulated device"
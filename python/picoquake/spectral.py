@@ -0,0 +1,482 @@
+"""
+This module implements spectral analysis of acquired data. Requires NumPy and SciPy.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .data import AcquisitionData, IMUSample, SampleArray, parse_channels
+
+_CACHE_SIZE = 32
+_CHUNK_SIZE = 1 << 16
+
+
+@dataclass
+class SpectralResult:
+    """
+    Spectra of several channels, computed by `analyze`.
+    Arrays have one column per channel. Fields which were not requested are None.
+
+    Attributes:
+        channels: Channel names of the columns.
+        sample_rate: The sample rate in Hz.
+        freqs: Frequencies of the amplitude spectrum, shape (F,).
+        amplitude: Amplitude spectrum, shape (F, k).
+        amplitude_peaks: Indices of the highest amplitude peaks for each channel, in ascending height.
+        psd_freqs: Frequencies of the PSD, shape (P,).
+        psd: Power spectral density using Welch's method, shape (P, k).
+        psd_peaks: Indices of the highest PSD peaks for each channel, in ascending height.
+    """
+    channels: Tuple[str, ...]
+    sample_rate: float
+    freqs: Optional[np.ndarray] = None
+    amplitude: Optional[np.ndarray] = None
+    amplitude_peaks: Optional[List[np.ndarray]] = None
+    psd_freqs: Optional[np.ndarray] = None
+    psd: Optional[np.ndarray] = None
+    psd_peaks: Optional[List[np.ndarray]] = None
+
+
+def analyze(values, sample_rate: float, channels: Optional[Tuple[str, ...]] = None,
+            amplitude: bool = True, psd: bool = True, nperseg: Optional[int] = None,
+            window: Union[str, Tuple] = "hann", freq_min: float = 0, freq_max: Optional[float] = None,
+            num_peaks: int = 3) -> SpectralResult:
+    """
+    Computes the amplitude spectrum, PSD and peaks of all columns at once.
+    Windows and frequency grids are cached, so repeated calls with the same length are cheap.
+
+    Args:
+        values: Array of shape (N,) or (N, k).
+        sample_rate: The sample rate in Hz.
+        channels: Channel names of the columns, stored in the result.
+        amplitude: If True, the windowed amplitude spectrum is computed, with a symmetric window over all samples.
+        psd: If True, the PSD is computed using Welch's method.
+        nperseg: Segment length for the PSD. Defaults to 256, limited to N.
+        window: Window function, as accepted by `scipy.signal.get_window`.
+        freq_min: Lowest frequency of the result.
+        freq_max: Highest frequency of the result. Defaults to the Nyquist frequency.
+        num_peaks: Number of peaks returned for each channel.
+
+    Returns:
+        The spectral result.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    n = len(values)
+    if n == 0:
+        raise ValueError("No samples")
+    if channels is None:
+        channels = tuple(str(i) for i in range(values.shape[1]))
+    if freq_max is None:
+        freq_max = sample_rate / 2
+    result = SpectralResult(tuple(channels), sample_rate)
+
+    if amplitude:
+        spec = np.fft.rfft(values * get_window(window, n, False)[:, np.newaxis], axis=0)
+        amp = np.abs(spec) * (2.0 / n)
+        f = frequency_grid(n, sample_rate)
+        mask = (f >= freq_min) & (f <= freq_max)
+        result.freqs = f[mask]
+        result.amplitude = amp[mask]
+        result.amplitude_peaks = _top_peaks(result.amplitude, num_peaks)
+
+    if psd:
+        nperseg = min(256 if nperseg is None else nperseg, n)
+        window_array = get_window(window, nperseg)
+        scale = 1.0 / (sample_rate * np.sum(window_array ** 2))
+        step = nperseg - nperseg // 2
+        segments = np.lib.stride_tricks.sliding_window_view(values, nperseg, axis=0)[::step]
+        p = _periodograms(segments, window_array, scale, nperseg).mean(axis=0).T
+        f = frequency_grid(nperseg, sample_rate)
+        mask = (f >= freq_min) & (f <= freq_max)
+        result.psd_freqs = f[mask]
+        result.psd = p[mask]
+        result.psd_peaks = _top_peaks(result.psd, num_peaks)
+
+    return result
+
+
+def analyze_data(data: AcquisitionData, channels: Union[str, List[str], None] = "acc",
+                 **kwargs) -> SpectralResult:
+    """
+    Computes spectra of the selected channels of an acquisition, see `analyze`.
+
+    Args:
+        data: Acquisition data.
+        channels: Channels to analyze.
+        **kwargs: Arguments passed to `analyze`.
+
+    Returns:
+        The spectral result.
+    """
+    channels = parse_channels(channels)
+    missing = [c for c in channels if c not in data.channels]
+    if missing:
+        raise ValueError(f"Channels not present in data: {', '.join(missing)}")
+    values = data.to_array()[:, [data.channels.index(c) for c in channels]]
+    return analyze(values, data.sample_rate, channels, **kwargs)
+
+
+@dataclass
+class SpectrogramResult:
+    """
+    Spectrogram of several channels, computed by `spectrogram`.
+
+    Attributes:
+        channels: Channel names.
+        sample_rate: The sample rate in Hz.
+        times: Centre time of each column in seconds from the first sample, shape (T,).
+        freqs: Frequencies, shape (F,).
+        power: Power spectral density, shape (T, F, k).
+    """
+    channels: Tuple[str, ...]
+    sample_rate: float
+    times: np.ndarray
+    freqs: np.ndarray
+    power: np.ndarray
+
+
+def spectrogram(source, sample_rate: float, channels: Optional[Tuple[str, ...]] = None,
+                nperseg: int = 256, noverlap: Optional[int] = None, window: Union[str, Tuple] = "hann",
+                freq_min: float = 0, freq_max: Optional[float] = None,
+                time_decimation: int = 1, freq_decimation: int = 1,
+                chunk_size: int = _CHUNK_SIZE) -> SpectrogramResult:
+    """
+    Computes the spectrogram of all columns, processing the input in chunks.
+    Only one chunk is converted to float at a time, so memory-mapped arrays are read incrementally.
+    Without decimation the result is equal to `scipy.signal.spectrogram` with the same window.
+
+    Args:
+        source: Array of shape (N,) or (N, k), or an iterable of such blocks.
+        sample_rate: The sample rate in Hz.
+        channels: Channel names of the columns, stored in the result.
+        nperseg: Length of each segment.
+        noverlap: Number of samples the segments overlap. Defaults to `nperseg // 8`, as in SciPy.
+        window: Window function, as accepted by `scipy.signal.get_window`.
+        freq_min: Lowest frequency of the result.
+        freq_max: Highest frequency of the result. Defaults to the Nyquist frequency.
+        time_decimation: Number of consecutive segments averaged into one column.
+        freq_decimation: Number of adjacent frequency bins averaged into one row.
+        chunk_size: Number of samples processed at once, if `source` is an array.
+
+    Returns:
+        The spectrogram.
+    """
+    if noverlap is None:
+        noverlap = nperseg // 8
+    if not 0 <= noverlap < nperseg:
+        raise ValueError("noverlap must be in range [0, nperseg)")
+    if time_decimation < 1 or freq_decimation < 1:
+        raise ValueError("Decimation must be >= 1")
+    if freq_max is None:
+        freq_max = sample_rate / 2
+    if hasattr(source, "shape"):
+        source = _iter_chunks(source, chunk_size)
+
+    window_array = get_window(window, nperseg)
+    scale = 1.0 / (sample_rate * np.sum(window_array ** 2))
+    step = nperseg - noverlap
+    f = frequency_grid(nperseg, sample_rate)
+    mask = (f >= freq_min) & (f <= freq_max)
+    bins = np.arange(0, np.count_nonzero(mask), freq_decimation)
+    if len(bins) == 0:
+        raise ValueError("No frequencies in range")
+
+    columns = []
+    pending = []
+    tail = None
+    n_total = 0
+    for block in source:
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        buf = block if tail is None else np.concatenate((tail, block))
+        n_seg = 0 if len(buf) < nperseg else (len(buf) - nperseg) // step + 1
+        if n_seg > 0:
+            n_total += n_seg
+            segments = np.lib.stride_tricks.sliding_window_view(buf, nperseg, axis=0)[::step][:n_seg]
+            p = _periodograms(segments, window_array, scale, nperseg)[..., mask]
+            # average adjacent bins, shape (n_seg, k, F)
+            pending.append(np.add.reduceat(p, bins, axis=-1) / np.diff(np.append(bins, p.shape[-1])))
+            pending = _decimate_segments(pending, time_decimation, columns)
+        tail = buf[n_seg * step:]
+    if pending:
+        columns.append(np.concatenate(pending).mean(axis=0, keepdims=True))
+
+    f = f[mask]
+    freqs = np.add.reduceat(f, bins) / np.diff(np.append(bins, len(f)))
+    k = 1 if tail is None else tail.shape[1]
+    if channels is None:
+        channels = tuple(str(i) for i in range(k))
+    if columns:
+        power = np.concatenate(columns).transpose(0, 2, 1)
+    else:
+        power = np.empty((0, len(freqs), k))
+    # segment centres, averaged over decimated groups
+    centres = (np.arange(n_total) * step + nperseg / 2) / sample_rate
+    groups = np.arange(0, n_total, time_decimation)
+    times = np.add.reduceat(centres, groups) / np.diff(np.append(groups, n_total)) if n_total else centres
+    return SpectrogramResult(tuple(channels), sample_rate, times, freqs, power)
+
+
+def spectrogram_data(data: AcquisitionData, channels: Union[str, List[str], None] = "acc",
+                     **kwargs) -> SpectrogramResult:
+    """
+    Computes the spectrogram of the selected channels of an acquisition, see `spectrogram`.
+    Samples are read in chunks, so data loaded with `AcquisitionData.from_bin(path, mmap=True)`
+    is never fully loaded into memory.
+
+    Args:
+        data: Acquisition data.
+        channels: Channels to analyze.
+        **kwargs: Arguments passed to `spectrogram`.
+
+    Returns:
+        The spectrogram.
+    """
+    channels = parse_channels(channels)
+    missing = [c for c in channels if c not in data.channels]
+    if missing:
+        raise ValueError(f"Channels not present in data: {', '.join(missing)}")
+    chunk_size = kwargs.pop("chunk_size", _CHUNK_SIZE)
+    if isinstance(data.samples, SampleArray):
+        samples = data.samples
+        columns = [samples.channels.index(c) for c in channels]
+        blocks = (samples[i:i + chunk_size].to_array()[:, columns] for i in range(0, len(samples), chunk_size))
+    else:
+        blocks = [data.to_array()[:, [data.channels.index(c) for c in channels]]]
+    return spectrogram(blocks, data.sample_rate, channels, **kwargs)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def get_window(window: Union[str, Tuple], n: int, fftbins: bool = True) -> np.ndarray:
+    """
+    Returns a cached, read-only window of length `n`.
+
+    Args:
+        window: Window function, as accepted by `scipy.signal.get_window`.
+        n: Length of the window.
+        fftbins: If True, the window is periodic, as used for spectral analysis of segments.
+            If False, it is symmetric, e.g. `np.hanning` for 'hann'.
+
+    Returns:
+        The window.
+    """
+    from scipy.signal import get_window as scipy_get_window
+    w = scipy_get_window(window, n, fftbins)
+    w.flags.writeable = False
+    return w
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def frequency_grid(n: int, sample_rate: float) -> np.ndarray:
+    """
+    Returns cached, read-only frequencies of a real FFT of length `n`.
+
+    Args:
+        n: Length of the FFT.
+        sample_rate: The sample rate in Hz.
+
+    Returns:
+        The frequencies.
+    """
+    f = np.fft.rfftfreq(n, 1 / sample_rate)
+    f.flags.writeable = False
+    return f
+
+
+class StreamingPSD:
+    """
+    Power spectral density using Welch's method, accumulated over a stream of sample blocks.
+    Only the samples of an incomplete segment are kept between blocks, so memory does not grow with the stream.
+    With `decay` of 1.0 the result is equal to `scipy.signal.welch` over the concatenated blocks.
+
+    Samples can come from a running device, e.g. `psd.update_samples(device.read(500))`
+    in continuos mode, or from files with `psd.update_data(data)`.
+
+    Attributes:
+        fs: The sample rate in Hz.
+        nperseg: Length of each segment.
+        noverlap: Number of samples the segments overlap.
+        decay: Weight of the previous average for each new segment.
+        channels: Channels used by `update_samples` and `update_data`.
+        num_segments: Number of segments accumulated.
+
+    Methods:
+        update: Adds a block of samples as an array.
+        update_samples: Adds a list of samples or a `SampleArray`.
+        update_data: Adds the samples of an acquisition.
+        spectrum: Returns the current averaged spectrum.
+        reset: Clears the accumulated spectrum.
+    """
+
+    def __init__(self, fs: float, nperseg: int, noverlap: Optional[int] = None,
+                 window: Union[str, Tuple] = "hann", decay: float = 1.0,
+                 channels: Union[str, List[str], None] = "acc"):
+        """
+        Initializes the accumulator.
+
+        Args:
+            fs: The sample rate in Hz.
+            nperseg: Length of each segment.
+            noverlap: Number of samples the segments overlap. Defaults to `nperseg // 2`.
+            window: Window function, as accepted by `scipy.signal.get_window`.
+            decay: Weight of the previous average for each new segment, in range (0, 1].
+                1.0 averages all segments equally, smaller values forget old segments exponentially.
+            channels: Channels used by `update_samples` and `update_data`.
+
+        Raises:
+            ValueError: If parameters are out of range.
+        """
+        if nperseg <= 0:
+            raise ValueError("nperseg must be positive")
+        if noverlap is None:
+            noverlap = nperseg // 2
+        if not 0 <= noverlap < nperseg:
+            raise ValueError("noverlap must be in range [0, nperseg)")
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be in range (0, 1]")
+        self.fs = fs
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.decay = decay
+        self.channels = parse_channels(channels)
+        self._window = get_window(window, nperseg)
+        self._scale = 1.0 / (fs * np.sum(self._window ** 2))
+        self._tail: Optional[np.ndarray] = None
+        self._sum: Optional[np.ndarray] = None
+        self._weight = 0.0
+        self.num_segments = 0
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        return frequency_grid(self.nperseg, self.fs)
+
+    def reset(self):
+        """
+        Clears the accumulated spectrum and the buffered samples.
+        """
+        self._tail = None
+        self._sum = None
+        self._weight = 0.0
+        self.num_segments = 0
+
+    def update(self, block):
+        """
+        Adds a block of samples.
+
+        Args:
+            block: Array of shape (n,) or (n, k). The number of columns must not change between blocks.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if self._tail is None:
+            self._tail = np.empty((0, block.shape[1]))
+        elif block.shape[1] != self._tail.shape[1]:
+            raise ValueError(f"Expected {self._tail.shape[1]} columns, got {block.shape[1]}")
+        buf = np.concatenate((self._tail, block))
+        step = self.nperseg - self.noverlap
+        n_seg = 0 if len(buf) < self.nperseg else (len(buf) - self.nperseg) // step + 1
+        if n_seg > 0:
+            segments = np.lib.stride_tricks.sliding_window_view(buf, self.nperseg, axis=0)[::step][:n_seg]
+            periodograms = _periodograms(segments, self._window, self._scale, self.nperseg)
+            # weights of the new segments, newest has weight 1
+            weights = self.decay ** np.arange(n_seg - 1, -1, -1)
+            new_sum = np.tensordot(weights, periodograms, axes=1)
+            carry = self.decay ** n_seg
+            self._sum = new_sum if self._sum is None else carry * self._sum + new_sum
+            self._weight = carry * self._weight + float(np.sum(weights))
+            self.num_segments += n_seg
+        self._tail = buf[n_seg * step:].copy()
+
+    def update_samples(self, samples: Union[List[IMUSample], SampleArray]):
+        """
+        Adds a list of samples or a `SampleArray`. Uses the channels selected on init.
+
+        Args:
+            samples: Samples to add.
+        """
+        if len(samples) == 0:
+            return
+        if isinstance(samples, SampleArray):
+            values = samples.to_array()[:, [samples.channels.index(c) for c in self.channels]]
+        else:
+            values = np.array([[getattr(s, c) for c in self.channels] for s in samples], dtype=np.float64)
+        self.update(values)
+
+    def update_data(self, data: AcquisitionData):
+        """
+        Adds the samples of an acquisition. Uses the channels selected on init.
+
+        Args:
+            data: Acquisition data.
+        """
+        if data.sample_rate != self.fs:
+            raise ValueError(f"Sample rate {data.sample_rate} Hz does not match {self.fs} Hz")
+        missing = [c for c in self.channels if c not in data.channels]
+        if missing:
+            raise ValueError(f"Channels not present in data: {', '.join(missing)}")
+        values = data.to_array()
+        self.update(values[:, [data.channels.index(c) for c in self.channels]])
+
+    def spectrum(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the current averaged spectrum.
+
+        Returns:
+            Tuple of frequencies with shape (F,) and PSD with shape (F, k).
+
+        Raises:
+            RuntimeError: If no complete segment was received yet.
+        """
+        if self._sum is None:
+            raise RuntimeError("No complete segment received yet")
+        return self.frequencies, (self._sum / self._weight).T
+
+
+def _iter_chunks(values, chunk_size: int) -> Iterator:
+    for i in range(0, len(values), chunk_size):
+        yield values[i:i + chunk_size]
+
+
+def _decimate_segments(pending: List[np.ndarray], decimation: int, columns: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Moves complete groups of `decimation` segments from `pending` to `columns`, averaged.
+    Returns the remaining segments.
+    """
+    segments = np.concatenate(pending)
+    n_groups = len(segments) // decimation
+    if n_groups:
+        grouped = segments[:n_groups * decimation]
+        columns.append(grouped.reshape(n_groups, decimation, *segments.shape[1:]).mean(axis=1))
+    rest = segments[n_groups * decimation:]
+    return [rest] if len(rest) else []
+
+
+def _top_peaks(values: np.ndarray, num_peaks: int) -> List[np.ndarray]:
+    from scipy.signal import find_peaks
+    result = []
+    for column in values.T:
+        peaks, _ = find_peaks(column)
+        result.append(peaks[np.argsort(column[peaks])[max(0, len(peaks) - num_peaks):]] if num_peaks > 0 else peaks[:0])
+    return result
+
+
+def _periodograms(segments: np.ndarray, window: np.ndarray, scale: float, nperseg: int) -> np.ndarray:
+    """
+    One-sided, density scaled periodograms of segments with shape (..., nperseg).
+    Constant detrend is applied to each segment.
+    """
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    spec = np.fft.rfft(segments * window, axis=-1)
+    p = (spec.real ** 2 + spec.imag ** 2) * scale
+    if nperseg % 2:
+        p[..., 1:] *= 2
+    else:
+        p[..., 1:-1] *= 2
+    return p
@@ -0,0 +1,699 @@
+"""
+This module implements transports carrying the byte stream between the host and PicoQuake device,
+and the capture file format used to record and replay the stream.
+"""
+
+import os
+import socket
+import struct
+import time
+from abc import ABC, abstractmethod
+from threading import Condition
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+_DEFAULT_TIMEOUT = 0.1
+_CONNECT_TIMEOUT = 5.0
+
+CAPTURE_MAGIC = b"PQCAPT\x01\x00"
+"""Magic bytes at the start of capture files, including the format version."""
+
+READ = 0
+"""Direction of chunks received from the device."""
+WRITE = 1
+"""Direction of chunks sent to the device."""
+META = 2
+"""Direction of chunks holding metadata written by the host, e.g. the device configuration of a raw capture."""
+
+_CAPTURE_HEADER = struct.Struct("<dq")
+_CHUNK_HEADER = struct.Struct("<qBI")
+
+
+class Transport(ABC):
+    """
+    Base class of transports. A transport carries raw bytes, framing is done by `PicoQuake`.
+    Transports are opened and used by the serial worker thread of `PicoQuake`.
+    Subclasses implement `open`, `read`, `write` and `close`.
+
+    Methods:
+        open: Opens the connection.
+        read: Reads available bytes.
+        write: Writes bytes.
+        close: Closes the connection.
+    """
+
+    timeout: float = _DEFAULT_TIMEOUT
+    """Maximum time in seconds `read` waits for data."""
+
+    low_latency: bool = False
+    """If True, `read` returns as soon as any bytes are available, instead of waiting for `size` bytes
+    or the timeout. Transports which always return available bytes ignore it."""
+
+    @abstractmethod
+    def open(self):
+        """
+        Opens the connection.
+
+        Raises:
+            ConnectionError: If the connection cannot be opened.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, size: int) -> bytes:
+        """
+        Reads up to `size` bytes, waiting at most `timeout` seconds.
+
+        Args:
+            size: Maximum number of bytes to read.
+
+        Returns:
+            Received bytes, empty if none were received within the timeout.
+
+        Raises:
+            ConnectionError: If the connection is lost.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, data: bytes):
+        """
+        Writes bytes.
+
+        Args:
+            data: Bytes to write.
+
+        Raises:
+            ConnectionError: If the connection is lost.
+        """
+        raise NotImplementedError
+
+    def wake(self):
+        """
+        Interrupts a `read` waiting for data, which returns the bytes received so far.
+        Called from another thread when a command is queued, so it is written without waiting for the read.
+        If no `read` is waiting, the next one returns early. Transports which cannot be woken ignore it.
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        Closes the connection. Closing a closed transport has no effect.
+        """
+        raise NotImplementedError
+
+    def __enter__(self) -> "Transport":
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SerialTransport(Transport):
+    """
+    Transport over a serial port, using pyserial.
+
+    By default `read` waits until `size` bytes are received or the timeout expires, which needs few reads
+    at high sample rates. In low latency mode it returns as soon as any bytes are received.
+
+    Attributes:
+        port: The serial port, e.g. '/dev/ttyACM0' or 'COM3'.
+    """
+
+    def __init__(self, port: str, timeout: float = _DEFAULT_TIMEOUT, low_latency: bool = False):
+        """
+        Args:
+            port: The serial port.
+            timeout: Maximum time in seconds `read` waits for data.
+            low_latency: If True, `read` returns as soon as any bytes are received.
+        """
+        self.port = port
+        self.timeout = timeout
+        self.low_latency = low_latency
+        self._serial = None
+
+    def open(self):
+        from serial import Serial, SerialException
+        try:
+            self._serial = Serial(self.port, timeout=self.timeout)
+            self._serial.reset_input_buffer()
+            self._serial.reset_output_buffer()
+        except SerialException:
+            raise ConnectionError(f"Could not connect to port {self.port}")
+        except PermissionError:
+            raise ConnectionError(f"Permission denied on port {self.port}. Check user permissions.")
+
+    def read(self, size: int) -> bytes:
+        from serial import SerialException
+        try:
+            if not self.low_latency:
+                return self._serial.read(size)
+            # wait for the first byte, then take what else is buffered without waiting
+            data = self._serial.read(1)
+            if data and size > 1:
+                waiting = self._serial.in_waiting
+                if waiting:
+                    data += self._serial.read(min(waiting, size - 1))
+            return data
+        except SerialException:
+            raise ConnectionError("Connection lost, port closed")
+
+    def write(self, data: bytes):
+        from serial import SerialException
+        try:
+            self._serial.write(data)
+        except SerialException:
+            raise ConnectionError("Connection lost, port closed")
+
+    def wake(self):
+        serial = self._serial
+        if serial is not None:
+            try:
+                serial.cancel_read()
+            except Exception:
+                # closed meanwhile
+                pass
+
+    def close(self):
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+    def __str__(self) -> str:
+        return f"serial port {self.port}"
+
+
+class FdTransport(Transport):
+    """
+    Transport over a file descriptor with non-blocking reads, e.g. a pseudo-terminal or a character device.
+    Terminals are switched to raw mode. Available on POSIX systems.
+
+    Attributes:
+        path: Path of the device, or None if an open descriptor was given.
+    """
+
+    def __init__(self, path_or_fd: Union[str, int], timeout: float = _DEFAULT_TIMEOUT):
+        """
+        Args:
+            path_or_fd: Path of the device, or an open file descriptor. A given descriptor is not closed.
+            timeout: Maximum time in seconds `read` waits for data.
+        """
+        self.path = path_or_fd if isinstance(path_or_fd, str) else None
+        self.timeout = timeout
+        self._given_fd = path_or_fd if isinstance(path_or_fd, int) else None
+        self._fd: Optional[int] = None
+        self._waker: Optional[_Waker] = None
+
+    def open(self):
+        import tty
+        if self._given_fd is not None:
+            fd = self._given_fd
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            except OSError as e:
+                raise ConnectionError(f"Could not open {self.path}: {e}")
+        os.set_blocking(fd, False)
+        if os.isatty(fd):
+            tty.setraw(fd)
+        self._fd = fd
+        self._waker = _Waker()
+
+    def read(self, size: int) -> bytes:
+        import select
+        try:
+            ready, _, _ = select.select([self._fd, self._waker], [], [], self.timeout)
+            if self._waker in ready:
+                self._waker.clear()
+            if self._fd not in ready:
+                return b""
+            data = os.read(self._fd, size)
+        except BlockingIOError:
+            return b""
+        except OSError as e:
+            raise ConnectionError(f"Connection lost: {e}")
+        if not data:
+            raise ConnectionError("Connection lost, end of file")
+        return data
+
+    def write(self, data: bytes):
+        import select
+        view = memoryview(data)
+        try:
+            while view:
+                try:
+                    view = view[os.write(self._fd, view):]
+                except BlockingIOError:
+                    select.select([], [self._fd], [], self.timeout)
+        except OSError as e:
+            raise ConnectionError(f"Connection lost: {e}")
+
+    def wake(self):
+        waker = self._waker
+        if waker is not None:
+            waker.wake()
+
+    def close(self):
+        if self._fd is not None and self._given_fd is None:
+            os.close(self._fd)
+        self._fd = None
+        if self._waker is not None:
+            self._waker.close()
+            self._waker = None
+
+    def __str__(self) -> str:
+        return f"file {self.path}" if self.path is not None else f"file descriptor {self._given_fd}"
+
+
+class SocketTransport(Transport):
+    """
+    Transport over a TCP or Unix domain socket, e.g. to a serial-over-IP bridge.
+
+    Attributes:
+        address: (host, port) tuple for TCP, or a path for a Unix domain socket.
+    """
+
+    def __init__(self, address: Union[Tuple[str, int], str], timeout: float = _DEFAULT_TIMEOUT,
+                 connect_timeout: float = _CONNECT_TIMEOUT):
+        """
+        Args:
+            address: (host, port) tuple for TCP, or a path for a Unix domain socket.
+            timeout: Maximum time in seconds `read` waits for data.
+            connect_timeout: Maximum time in seconds to establish the connection.
+        """
+        self.address = address
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._socket: Optional[socket.socket] = None
+        self._waker: Optional[_Waker] = None
+
+    def open(self):
+        try:
+            if isinstance(self.address, str):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.connect_timeout)
+                sock.connect(self.address)
+            else:
+                sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            raise ConnectionError(f"Could not connect to {self}: {e}")
+        sock.settimeout(self.timeout)
+        self._socket = sock
+        self._waker = _Waker()
+
+    def read(self, size: int) -> bytes:
+        import select
+        try:
+            ready, _, _ = select.select([self._socket, self._waker], [], [], self.timeout)
+            if self._waker in ready:
+                self._waker.clear()
+            if self._socket not in ready:
+                return b""
+            data = self._socket.recv(size)
+        except socket.timeout:
+            return b""
+        except OSError as e:
+            raise ConnectionError(f"Connection lost: {e}")
+        if not data:
+            raise ConnectionError("Connection lost, socket closed")
+        return data
+
+    def write(self, data: bytes):
+        try:
+            self._socket.sendall(data)
+        except OSError as e:
+            raise ConnectionError(f"Connection lost: {e}")
+
+    def wake(self):
+        waker = self._waker
+        if waker is not None:
+            waker.wake()
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if self._waker is not None:
+            self._waker.close()
+            self._waker = None
+
+    def __str__(self) -> str:
+        if isinstance(self.address, str):
+            return f"socket {self.address}"
+        return f"socket {self.address[0]}:{self.address[1]}"
+
+
+class ReplayTransport(Transport):
+    """
+    Transport replaying a recorded byte stream, for tests and benchmarks without a device.
+
+    Capture files, written by `CaptureWriter`, contain timestamped chunks in both directions.
+    Chunks received after a command are only replayed once the host has written as many chunks
+    as were recorded before them, so handshake and acquisition follow the host as with a device.
+    Chunks are replayed as fast as possible or at `speed` times the recorded rate.
+
+    Other files are replayed as a plain byte stream, as fast as possible.
+    Written bytes are discarded.
+
+    Attributes:
+        path: Path of the recorded file.
+        speed: Replay speed relative to the recording, None for as fast as possible.
+        finished: True when the end of the file was reached.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None, timeout: float = _DEFAULT_TIMEOUT,
+                 chunk_size: int = 4096):
+        """
+        Args:
+            path: Path of the recorded file.
+            speed: Replay speed relative to the recording, e.g. 1.0 for real time.
+                None replays as fast as possible.
+            timeout: Maximum time in seconds `read` waits for data.
+            chunk_size: Read size for plain byte stream files.
+
+        Raises:
+            ValueError: If `speed` is not positive.
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("Speed must be positive")
+        self.path = path
+        self.speed = speed
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.finished = False
+        self._file: Optional[BinaryIO] = None
+        self._chunks: Optional[Iterator[CaptureChunk]] = None
+        self._pending = b""
+        self._next: Optional[CaptureChunk] = None
+        self._writes = 0
+        self._writes_replayed = 0
+        self._condition = Condition()
+        self._woken = False
+        self._base: Optional[Tuple[int, float]] = None
+
+    def open(self):
+        try:
+            self._file = open(self.path, "rb")
+        except OSError as e:
+            raise ConnectionError(f"Could not open {self.path}: {e}")
+        if self._file.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC:
+            self._file.seek(0)
+            self._chunks = iter(CaptureReader(self._file))
+        else:
+            self._file.seek(0)
+            self._chunks = None
+        self.finished = False
+        # a reopened replay starts over, as a reconnected device
+        self._pending = b""
+        self._next = None
+        self._base = None
+        with self._condition:
+            self._writes = 0
+            self._writes_replayed = 0
+
+    def read(self, size: int) -> bytes:
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        if self._chunks is None:
+            data = self._file.read(min(size, self.chunk_size))
+            if not data:
+                self._wait_end()
+            return data
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._next is None:
+                self._next = next(self._chunks, None)
+                if self._next is None:
+                    self._wait_end()
+                    return b""
+            chunk = self._next
+            if chunk.direction == META:
+                self._next = None
+                continue
+            if chunk.direction == WRITE:
+                # hold back the device response until the host sent the command
+                with self._condition:
+                    if self._writes <= self._writes_replayed and not self._woken:
+                        self._condition.wait(max(0.0, deadline - time.monotonic()))
+                    self._woken = False
+                    if self._writes <= self._writes_replayed:
+                        return b""
+                    self._writes_replayed += 1
+                self._base = (chunk.timestamp_ns, time.monotonic())
+                self._next = None
+                continue
+            if self.speed is not None:
+                if self._base is None:
+                    self._base = (chunk.timestamp_ns, time.monotonic())
+                due = self._base[1] + (chunk.timestamp_ns - self._base[0]) * 1e-9 / self.speed
+                now = time.monotonic()
+                if due > now:
+                    if due > deadline:
+                        self._sleep(deadline - now)
+                        return b""
+                    if self._sleep(due - now):
+                        return b""
+            self._next = None
+            data, self._pending = chunk.data[:size], chunk.data[size:]
+            return data
+
+    def write(self, data: bytes):
+        with self._condition:
+            self._writes += 1
+            self._condition.notify_all()
+
+    def wake(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _wait_end(self):
+        # idle like a silent device, the connection is lost when no status arrives
+        self.finished = True
+        self._sleep(self.timeout)
+
+    def _sleep(self, seconds: float) -> bool:
+        """
+        Sleeps unless woken. Returns True if woken.
+        """
+        end = time.monotonic() + seconds
+        with self._condition:
+            while not self._woken:
+                left = end - time.monotonic()
+                if left <= 0:
+                    break
+                self._condition.wait(left)
+            woken, self._woken = self._woken, False
+        return woken
+
+    def __str__(self) -> str:
+        return f"replay of {self.path}"
+
+
+class _Waker:
+    """
+    Socket pair interrupting `select` from another thread. Sockets are used instead of a pipe,
+    as only sockets can be selected on Windows.
+    """
+
+    def __init__(self):
+        self._receiver, self._sender = socket.socketpair()
+        self._receiver.setblocking(False)
+        self._sender.setblocking(False)
+
+    def fileno(self) -> int:
+        return self._receiver.fileno()
+
+    def wake(self):
+        try:
+            self._sender.send(b"\x00")
+        except OSError:
+            # buffer full, already woken, or closed meanwhile
+            pass
+
+    def clear(self):
+        try:
+            while self._receiver.recv(1024):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self._receiver.close()
+        self._sender.close()
+
+
+class CaptureChunk(NamedTuple):
+    """
+    Chunk of a capture file.
+
+    Attributes:
+        timestamp_ns: Host monotonic time of the chunk in nanoseconds, see `time.monotonic_ns`.
+        direction: `READ` for chunks received from the device, `WRITE` for chunks sent to it,
+            `META` for metadata written by the host.
+        data: The bytes.
+    """
+    timestamp_ns: int
+    direction: int
+    data: bytes
+
+
+class CaptureWriter:
+    """
+    Writes a capture file: a header followed by timestamped chunks of the raw byte stream.
+    The header records the host wall clock and monotonic clock at the start of the capture.
+
+    Methods:
+        write_chunk: Appends a chunk.
+        flush: Flushes buffered chunks to the file.
+        close: Closes the file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Creates the capture file.
+
+        Args:
+            path: Path of the file. An existing file is overwritten.
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC + _CAPTURE_HEADER.pack(time.time(), time.monotonic_ns()))
+
+    def write_chunk(self, data: bytes, direction: int = READ, timestamp_ns: Optional[int] = None):
+        """
+        Appends a chunk.
+
+        Args:
+            data: The bytes.
+            direction: `READ`, `WRITE` or `META`.
+            timestamp_ns: Host monotonic time in nanoseconds. Defaults to the current time.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self._file.write(_CHUNK_HEADER.pack(timestamp_ns, direction, len(data)))
+        self._file.write(data)
+
+    def flush(self):
+        """
+        Flushes buffered chunks to the file.
+        """
+        self._file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CaptureReader:
+    """
+    Reads a capture file written by `CaptureWriter`. Iterating yields `CaptureChunk` tuples.
+    A chunk truncated at the end of the file, e.g. by a power loss, is ignored.
+
+    Attributes:
+        wall_time: Host wall clock time at the start of the capture, as returned by `time.time`.
+        start_ns: Host monotonic time at the start of the capture in nanoseconds.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO]):
+        """
+        Opens the capture file and reads the header.
+
+        Args:
+            source: Path of the file, or a binary file object positioned at the start of the capture.
+
+        Raises:
+            ValueError: If the file is not a capture file.
+        """
+        self._file: BinaryIO = open(source, "rb") if isinstance(source, str) else source
+        self._owned = isinstance(source, str)
+        header = self._file.read(len(CAPTURE_MAGIC) + _CAPTURE_HEADER.size)
+        if header[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC or len(header) < len(CAPTURE_MAGIC) + _CAPTURE_HEADER.size:
+            self.close()
+            raise ValueError("Not a PicoQuake capture file")
+        self.wall_time, self.start_ns = _CAPTURE_HEADER.unpack(header[len(CAPTURE_MAGIC):])
+
+    def __iter__(self) -> Iterator[CaptureChunk]:
+        while True:
+            header = self._file.read(_CHUNK_HEADER.size)
+            if len(header) < _CHUNK_HEADER.size:
+                return
+            timestamp_ns, direction, length = _CHUNK_HEADER.unpack(header)
+            data = self._file.read(length)
+            if len(data) < length:
+                return
+            yield CaptureChunk(timestamp_ns, direction, data)
+
+    def close(self):
+        """
+        Closes the file, if it was opened by the reader.
+        """
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def create_transport(url: str, **kwargs) -> Transport:
+    """
+    Creates a transport from a URL or a serial port name.
+
+    - `tcp://host:port`: TCP socket.
+    - `unix:///path/to/socket`: Unix domain socket.
+    - `fd:///dev/pts/3`: Non-blocking file descriptor of a device.
+    - `replay:///path/to/file?speed=1.0`: Replay of a recorded file, `speed` is optional.
+    - `sim://`: Simulated device, see `picoquake.simulator.SimulatorTransport`.
+    - Anything else is a serial port, e.g. '/dev/ttyACM0' or 'COM3'.
+
+    Args:
+        url: The URL or serial port name.
+        **kwargs: Arguments passed to the transport.
+
+    Returns:
+        The transport, not opened yet.
+
+    Raises:
+        ValueError: If the URL is invalid.
+    """
+    if "://" not in url:
+        return SerialTransport(url, **kwargs)
+    parts = urlsplit(url)
+    if parts.scheme == "tcp":
+        if parts.hostname is None or parts.port is None:
+            raise ValueError(f"Invalid TCP address: {url}, expected tcp://host:port")
+        return SocketTransport((parts.hostname, parts.port), **kwargs)
+    if parts.scheme == "unix":
+        return SocketTransport(parts.netloc + parts.path, **kwargs)
+    if parts.scheme == "fd":
+        return FdTransport(parts.netloc + parts.path, **kwargs)
+    if parts.scheme == "replay":
+        query = parse_qs(parts.query)
+        if "speed" in query:
+            kwargs.setdefault("speed", float(query["speed"][0]))
+        return ReplayTransport(parts.netloc + parts.path, **kwargs)
+    if parts.scheme == "sim":
+        from .simulator import SimulatorTransport
+        return SimulatorTransport(**kwargs)
+    raise ValueError(f"Unknown transport: {parts.scheme}")
@@ -4,6 +4,17 @@ from typing import List, Any, Optional
 import os
 
 
+def import_numpy():
+    """
+    Returns the NumPy module, or None if NumPy is not installed.
+    """
+    try:
+        import numpy
+    except ModuleNotFoundError:
+        return None
+    return numpy
+
+
 def get_axis_combinations(axis: str) -> set:
     return set(''.join(p) for i in range(1, len(axis) + 1) for p in permutations(axis, i))
 
@@ -23,6 +34,25 @@ def deque_get_last_n(data: deque, n: int) -> List[Any]:
     return [data[i] for i in range(start_idx, len(data))]
 
 
+def deque_get_after(data: deque, count: int) -> List[Any]:
+    """
+    Get the elements at the end of a deque with `count` attribute greater than `count`,
+    e.g. the samples received after a sample. Only the new elements are scanned, from the end.
+
+    Args:
+    data: Deque with elements ordered by count, e.g. samples.
+    count: Count of the last element not to get.
+
+    Returns:
+    List with the elements after `count`, in order.
+    """
+    end = len(data)
+    start = end
+    while start > 0 and data[start - 1].count > count:
+        start -= 1
+    return [data[i] for i in range(start, end)]
+
+
 def deque_slice(dq: deque, start: Optional[int], end: Optional[int] = None) -> List[Any]:
     """
     Return a slice from the deque. Behaves like the list slice method.
@@ -1,7 +1,7 @@
 from pytest import approx
 import numpy as np
 
-from picoquake.data import IMUSample
+from picoquake.data import IMUSample, SampleArray
 from picoquake.analisys import *
 
 
@@ -162,3 +162,112 @@ def test_running_rms():
     assert approx(rms_values[220], 1e-3) == 3 * 0.707
 
     assert running_rms([], 10) == []
+
+
+def test_imu_rms_channel_subset():
+    samples = [
+        IMUSample(0, None, None, 5, 8, None, None),
+        IMUSample(1, None, None, 6, 9, None, None),
+        IMUSample(2, None, None, 7, 0, None, None),
+    ]
+    acc_rms, gyro_rms = imu_rms(samples, 'xyz')
+    assert approx(acc_rms, 1e-3) == ((5 ** 2 + 6 ** 2 + 7 ** 2) / 3) ** 0.5
+    assert approx(gyro_rms, 1e-3) == ((8 ** 2 + 9 ** 2 + 0 ** 2) / 3) ** 0.5
+    assert imu_rms(samples, 'y') == (0, 0)
+
+
+def test_rms_array():
+    rng = np.random.default_rng(0)
+    block = rng.normal(1.0, 2.0, size=(1000, 3))
+    columns = tuple(block[:, i].tolist() for i in range(3))
+    expected = np.sqrt(np.sum(block ** 2) / 1000)
+    expected_dtr = np.sqrt(np.sum((block - block.mean(axis=0)) ** 2) / 1000)
+    assert approx(rms_array(block), 1e-9) == expected
+    assert approx(rms_array(block, de_trend=True), 1e-9) == expected_dtr
+    assert approx(rms(block), 1e-9) == expected
+    assert approx(rms(columns), 1e-9) == expected
+    assert approx(rms(columns, de_trend=True), 1e-9) == expected_dtr
+    assert approx(rms(block[:, 0]), 1e-9) == rms(columns[0])
+    assert rms_array(np.zeros((0, 3))) == 0
+    assert np.allclose(detrend(block[:, 0]), block[:, 0] - block[:, 0].mean())
+
+    samples = [IMUSample(i, *row) for i, row in enumerate(rng.normal(size=(100, 6)))]
+    array = SampleArray.from_samples(samples)
+    for axes in ["x", "yz", "xyz"]:
+        for de_trend in [False, True]:
+            assert imu_rms(array, axes, de_trend) == approx(imu_rms(samples, axes, de_trend), 1e-9)
+
+
+def test_imu_rms_window_sizes(monkeypatch):
+    import picoquake.analisys
+    rng = np.random.default_rng(2)
+    # e.g. trigger windows of 0.1 s at 200 Hz and 1 s at 1 kHz, computed in Python and with NumPy
+    for n in [20, 1000]:
+        samples = [IMUSample(i, *row) for i, row in enumerate(rng.normal(1.0, 0.1, size=(n, 6)))]
+        values = np.array([[s.acc_x, s.acc_y, s.acc_z] for s in samples])
+        expected = float(np.sqrt(np.sum((values - values.mean(axis=0)) ** 2) / n))
+        assert imu_rms(samples, "xyz", de_trend=True)[0] == approx(expected, 1e-9)
+        assert imu_rms(samples, "z", de_trend=True)[0] == approx(values[:, 2].std(), 1e-9)
+        assert rms([s.acc_x for s in samples]) == approx(float(np.sqrt(np.mean(values[:, 0] ** 2))), 1e-9)
+
+    # short windows are not converted to arrays
+    samples = [IMUSample(i, *row) for i, row in enumerate(rng.normal(size=(100, 6)))]
+    monkeypatch.setattr(picoquake.analisys, "rms_array", None)
+    imu_rms(samples, "xyz", de_trend=True)
+    rms([s.acc_x for s in samples], de_trend=True)
+
+
+def test_rms_without_numpy(monkeypatch):
+    import picoquake.analisys
+    monkeypatch.setattr(picoquake.analisys, "import_numpy", lambda: None)
+    data = ([1., 2., 3., 4., 5.], [1., 2., 3., 4., 5.])
+    assert approx(rms(data), 1e-3) == 4.69
+    assert approx(rms(data, de_trend=True), 1e-3) == 2.0
+    samples = [
+        IMUSample(0, 1, 2, 5, 8, 1, 4),
+        IMUSample(1, 2, 3, 6, 9, 2, 5),
+        IMUSample(2, 3, 4, 7, 0, 3, 6),
+    ]
+    acc_rms, gyro_rms = imu_rms(samples, 'x')
+    assert approx(acc_rms, 1e-3) == ((1 ** 2 + 2 ** 2 + 3 ** 2) / 3) ** 0.5
+    assert approx(gyro_rms, 1e-3) == ((8 ** 2 + 9 ** 2 + 0 ** 2) / 3) ** 0.5
+
+
+def _running_rms_reference(data, window_size, de_trend, offset):
+    ret = []
+    for i in range(len(data)):
+        window = data[max(0, i + offset):max(0, min(len(data), i + offset + window_size))]
+        ret.append(0 if len(window) == 0 else float(np.sqrt(np.mean(np.square(window - np.mean(window) * de_trend)))))
+    return ret
+
+
+def test_running_rms_align(monkeypatch):
+    import picoquake.analisys
+    rng = np.random.default_rng(1)
+    data = rng.normal(5.0, 1.0, 300)
+    for window_size in [1, 7, 50, 400]:
+        for align, offset in [("trailing", -window_size), ("centered", -(window_size // 2)), ("leading", 0)]:
+            for de_trend in [False, True]:
+                expected = _running_rms_reference(data, window_size, de_trend, offset)
+                result = running_rms(data, window_size, de_trend, align)
+                assert isinstance(result, np.ndarray)
+                assert result == approx(expected, abs=1e-6)
+                assert running_rms(data.tolist(), window_size, de_trend, align) == approx(expected, abs=1e-6)
+
+    monkeypatch.setattr(picoquake.analisys, "import_numpy", lambda: None)
+    expected = _running_rms_reference(data, 20, True, -10)
+    assert running_rms(data.tolist(), 20, True, "centered") == approx(expected, abs=1e-6)
+
+    try:
+        running_rms(data, 10, align="middle")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_running_rms_long():
+    # large offset and many blocks, accumulated sums must stay accurate
+    t = np.arange(500_000)
+    data = 1000.0 + np.sin(2 * np.pi * t / 100)
+    result = running_rms(data, 1000, de_trend=True)
+    assert result[1000:] == approx(0.707, abs=1e-3)
@@ -0,0 +1,85 @@
+import csv
+import os
+import time
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from picoquake.batch import find_files, output_path, run_batch
+from picoquake.data import *
+
+
+def _write_recordings(directory: str, num: int):
+    config = Config(SampleRate.hz_1000, Filter.hz_536, AccRange.g_4, GyroRange.dps_1000)
+    rng = np.random.default_rng(0)
+    for i in range(num):
+        values = rng.normal(scale=0.1 * (i + 1), size=(4000, 6))
+        data = AcquisitionData(SampleArray(np.arange(4000), values), DeviceInfo("E66368254F89A225", "1.0.0"),
+                               config, datetime(2024, 5, 1, 12, i, 0))
+        if i % 2:
+            data.to_bin(os.path.join(directory, f"rec_{i}.pqb"))
+        else:
+            data.to_csv(os.path.join(directory, f"rec_{i}.csv"))
+
+
+def _read_summary(path: str):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_find_files():
+    with TemporaryDirectory() as tmp:
+        _write_recordings(tmp, 3)
+        open(os.path.join(tmp, "rec_0_features.csv"), "w").close()
+        open(os.path.join(tmp, "notes.txt"), "w").close()
+        names = [os.path.basename(p) for p in find_files(tmp)]
+        assert names == ["rec_0.csv", "rec_1.pqb", "rec_2.csv"]
+        assert find_files(os.path.join(tmp, "*.csv")) == [os.path.join(tmp, "rec_0.csv"),
+                                                          os.path.join(tmp, "rec_2.csv")]
+
+
+def test_batch_incremental():
+    with TemporaryDirectory() as tmp:
+        _write_recordings(tmp, 3)
+        with open(os.path.join(tmp, "broken.csv"), "w") as f:
+            f.write("not a recording\n")
+        summary = os.path.join(tmp, "out", "summary.csv")
+        out = os.path.join(tmp, "out")
+
+        results = run_batch(tmp, ["features"], out, workers=1, summary_path=summary)
+        assert [r.written for r in results] == [[], ["features"], ["features"], ["features"]]
+        assert results[0].error is not None
+        rows = _read_summary(summary)
+        assert len(rows) == 4
+        assert rows[1]["num_samples"] == "4000"
+        assert float(rows[3]["rms_z"]) == pytest.approx(0.3, rel=0.05)
+        table = np.loadtxt(output_path(os.path.join(tmp, "rec_2.csv"), "features", out),
+                           delimiter=",", skiprows=1)
+        assert table.shape[0] == 4
+
+        # nothing changed, only the broken file is loaded again
+        loaded = []
+        results = run_batch(tmp, ["features"], out, workers=1, incremental=True, summary_path=summary,
+                            progress=lambda done, total, r: loaded.append(r))
+        assert [r.skipped for r in results[1:]] == [["features"]] * 3
+        assert sum(1 for r in results if r.written) == 0
+        assert _read_summary(summary) == rows
+
+        later = time.time() + 10
+        os.utime(os.path.join(tmp, "rec_1.pqb"), (later, later))
+        results = run_batch(tmp, ["features"], out, workers=1, incremental=True, summary_path=summary)
+        assert [r.written for r in results] == [[], [], ["features"], []]
+        assert _read_summary(summary)[2]["mtime"] == repr(later)
+
+
+def test_batch_pool():
+    pytest.importorskip("matplotlib")
+    with TemporaryDirectory() as tmp:
+        _write_recordings(tmp, 2)
+        results = run_batch(tmp, ["plot", "psd"], workers=2, freq_max=400)
+        assert [r.error for r in results] == [None, None]
+        for r in results:
+            assert r.written == ["plot", "psd"]
+            assert os.path.exists(output_path(r.path, "plot")) and os.path.exists(output_path(r.path, "psd"))
@@ -0,0 +1,58 @@
+import os
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+
+from picoquake.catalog import *
+from picoquake.data import *
+
+
+def _make_data(unique_id: str, sample_rate: SampleRate, n: int, start_time: datetime) -> AcquisitionData:
+    config = Config(sample_rate, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+    samples = [IMUSample(i, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0) for i in range(n)]
+    return AcquisitionData(samples, DeviceInfo(unique_id, "1.0.0"), config, start_time)
+
+
+def test_catalog(monkeypatch):
+    t0 = datetime(2024, 5, 1, 12, 0, 0)
+    with TemporaryDirectory() as temp_dir:
+        os.mkdir(os.path.join(temp_dir, "sub"))
+        a = _make_data("E66368254F89A225", SampleRate.hz_100, 100, t0)
+        b = _make_data("E66368254F89A226", SampleRate.hz_200, 600, t0 + timedelta(hours=1))
+        a.to_csv(os.path.join(temp_dir, "a.csv"))
+        b.to_bin(os.path.join(temp_dir, "sub", "b.pqb"))
+        with open(os.path.join(temp_dir, "broken.csv"), "w") as f:
+            f.write("not a recording\n")
+
+        with Catalog(temp_dir) as catalog:
+            assert catalog.update() == 2
+            entries = catalog.query()
+            assert [e.filename for e in entries] == ["a.csv", "b.pqb"]
+            assert entries[1].config == b.config
+            assert entries[1].num_samples == 600
+            assert [e.filename for e in catalog.query(short_id=a.device.short_id)] == ["a.csv"]
+            assert [e.filename for e in catalog.query(min_duration=2.0)] == ["b.pqb"]
+            assert [e.filename for e in catalog.query(since=t0 + timedelta(minutes=1))] == ["b.pqb"]
+
+            # unchanged files are not read again, including ones which are not recordings
+            with monkeypatch.context() as m:
+                m.setattr(AcquisitionData, "read_metadata", None)
+                assert catalog.update() == 0
+
+            # a skipped file is read again when it changes
+            a.to_csv(os.path.join(temp_dir, "broken.csv"))
+            assert catalog.update() == 1
+            assert len(catalog.query()) == 3
+            os.remove(os.path.join(temp_dir, "broken.csv"))
+
+            os.remove(os.path.join(temp_dir, "sub", "b.pqb"))
+            a = _make_data("E66368254F89A225", SampleRate.hz_100, 300, t0)
+            a.to_csv(os.path.join(temp_dir, "a.csv"))
+            os.utime(os.path.join(temp_dir, "a.csv"), (0, 1))
+            assert catalog.update() == 1
+            entries = catalog.query()
+            assert len(entries) == 1
+            assert entries[0].num_samples == 300
+
+        entries = scan_directory(temp_dir, recursive=False)
+        assert [e.filename for e in entries] == ["a.csv"]
+        assert scan_directory(temp_dir, "*.pqb") == []
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+import picoquake
+from picoquake.data import *
+
+DEVICE_MODULES = ("serial", "cobs", "google.protobuf", "picoquake.interface", "picoquake.transport")
+PLOT_MODULES = ("numpy", "scipy", "matplotlib", "picoquake.plot")
+
+_SCRIPT = """
+import sys
+from picoquake.cli import main
+sys.argv = ["picoquake"] + sys.argv[1:]
+try:
+    main()
+except SystemExit:
+    pass
+"""
+
+
+def _run(args, home):
+    """
+    Runs the CLI under `python -X importtime` and returns the output and the imported modules.
+    """
+    env = dict(os.environ, HOME=home, LOCALAPPDATA=home,
+               PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(picoquake.__file__))))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", _SCRIPT] + args, env=env,
+                            capture_output=True, text=True, timeout=120)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return result.stdout, modules
+
+
+def _loaded(modules, prefixes):
+    return sorted(m for m in modules if any(m == p or m.startswith(p + ".") for p in prefixes))
+
+
+def test_import_time():
+    with TemporaryDirectory() as tmp:
+        _, modules = _run(["--help"], tmp)
+        assert "picoquake.cli" in modules
+        assert _loaded(modules, DEVICE_MODULES + PLOT_MODULES) == []
+
+        output, modules = _run(["catalog", tmp], tmp)
+        assert "0 recordings" in output
+        assert _loaded(modules, DEVICE_MODULES + PLOT_MODULES) == []
+
+        # no device stack for file commands
+        config = Config(SampleRate.hz_200, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+        data = AcquisitionData(SampleArray(np.arange(1000), np.zeros((1000, 6))),
+                               DeviceInfo("E66368254F89A225", "1.0.0"), config, datetime.now())
+        path = os.path.join(tmp, "data.csv")
+        data.to_csv(path)
+        output, modules = _run(["plot_psd", path, "."], tmp)
+        assert "Plot saved" in output or "not supported" in output
+        assert _loaded(modules, DEVICE_MODULES) == []
+
+        # no plotting stack for device commands
+        output, modules = _run(["acquire", "ABCD", os.path.join(tmp, "out.csv")], tmp)
+        assert "not found" in output
+        assert "picoquake.interface" in modules
+        assert _loaded(modules, PLOT_MODULES) == []
+
+
+def test_plot_export():
+    # 'picoquake.plot' is the function even when the submodule is imported first
+    script = ("import picoquake.plot\n"
+              "import picoquake\n"
+              "from picoquake import plot\n"
+              "assert callable(picoquake.plot) and plot is picoquake.plot\n"
+              "assert picoquake.plot_psd is sys.modules['picoquake.plot'].plot_psd\n")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(picoquake.__file__))))
+    result = subprocess.run([sys.executable, "-c", "import sys\n" + script], env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,61 @@
+import os
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from picoquake.clock import ClockEstimator, ClockFit
+from picoquake.data import *
+
+
+def test_clock_estimator():
+    rng = np.random.default_rng(0)
+    rate = 1000.05  # 50 ppm fast
+    wall_offset_ns = 1_700_000_000 * 10 ** 9
+    start_ns = 5 * 10 ** 9
+    estimator = ClockEstimator(1000.0, wall_offset_ns=wall_offset_ns)
+    assert estimator.fit() is None
+    # 20 minutes in chunks of 8 samples, with USB latency and jitter and a few stalls of the host
+    counts = np.arange(7, int(1200 * rate), 8)
+    latency = 1e-3 + rng.exponential(0.5e-3, len(counts))
+    stalls = rng.integers(0, len(counts), 40)
+    for i in stalls:
+        latency[i:i + 1000] += 0.05
+    arrivals = start_ns + ((counts / rate + latency) * 1e9).astype(np.int64)
+    for count, arrival in zip(counts, arrivals):
+        estimator.add(int(count), int(arrival))
+
+    clock = estimator.fit()
+    assert clock.drift_ppm(1000.0) == pytest.approx(50, abs=0.1)
+    true_origin = (start_ns + wall_offset_ns) * 1e-9 + 1e-3
+    for count in (0, counts[-1]):
+        assert abs(clock.time(count) - (true_origin + count / rate)) < 0.2e-3
+    assert clock.jitter < 0.5e-3
+    assert clock.count(clock.time(1234)) == pytest.approx(1234)
+
+
+def test_clock_in_file():
+    clock = ClockFit(1000.02, datetime(2024, 5, 1, 12, 0, 0).timestamp(), 0.25e-3)
+    config = Config(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+    data = AcquisitionData(SampleArray(np.arange(500, 1500), np.zeros((1000, 6))),
+                           DeviceInfo("E66368254F89A225", "1.0.0"), config, clock.datetime(500), clock=clock)
+    data.re_centre(0)
+    times = data.host_times()
+    assert times[0] == pytest.approx(clock.time(500), abs=1e-6)
+    assert times[-1] - times[0] == pytest.approx(999 / 1000.02)
+    with TemporaryDirectory() as tmp:
+        for name in ("data.csv", "data.pqb"):
+            path = os.path.join(tmp, name)
+            if name.endswith(".csv"):
+                data.to_csv(path)
+            else:
+                data.to_bin(path)
+            loaded = AcquisitionData.from_file(path)
+            assert loaded.clock.rate == clock.rate
+            assert loaded.clock.jitter == pytest.approx(clock.jitter)
+            assert loaded.host_times() == pytest.approx(times, abs=1e-6)
+            assert AcquisitionData.read_metadata(path).num_samples == 1000
+
+    data.clock = None
+    assert data.host_times()[1] - data.host_times()[0] == pytest.approx(1e-3, abs=1e-6)
@@ -1,7 +1,10 @@
+from dataclasses import replace
 from typing import List
 from random import uniform
 import tempfile
+import os
 from pytest import approx
+import numpy as np
 
 from picoquake.data import *
 from picoquake.configuration import *
@@ -58,11 +61,204 @@ def test_acquisition_data():
         loaded_data = AcquisitionData.from_csv(path)
         assert data == loaded_data
 
-    assert data.samples[0].count == -N
+    assert data.sample_count(0) == -N
     data.re_centre(0)
-    assert data.samples[0].count == 0
+    assert data.sample_count(0) == 0
+    assert data.samples[0].count == -N
     data.re_centre(100)
-    assert data.samples[0].count == -100
+    assert data.sample_count(0) == -100
+    assert data.counts == list(range(-100, 2 * N - 100))
+    assert data == replace(data, count_offset=0)
+
+    with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
+        path = f.name
+        data.to_csv(path)
+        loaded_data = AcquisitionData.from_csv(path)
+        assert loaded_data.counts == data.counts
+        assert loaded_data.sample_count(100) == 0
+        assert [s.acc_x for s in loaded_data.samples] == [s.acc_x for s in data.samples]
+
+    sliced = data.slice_counts(0, 10)
+    assert sliced.counts == list(range(10))
+    assert sliced.samples[0] is data.samples[100]
 
     data.samples.pop(N)
     assert data.integrity == False
+
+
+def test_read_metadata():
+    device_info = DeviceInfo(
+        unique_id="E66368254F89A225",
+        firmware="1.0.0")
+
+    config = Config(
+        sample_rate=SampleRate.hz_500,
+        filter=Filter.hz_213,
+        acc_range=AccRange.g_8,
+        gyro_range=GyroRange.dps_250,
+    )
+
+    samples = [IMUSample(i, 0.1, 0.2, 1.0, 1.0, 2.0, 3.0) for i in range(500) if i != 100]
+    data = AcquisitionData(
+        samples=samples,
+        device=device_info,
+        config=config,
+        start_time=datetime.now())
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "data.csv")
+        data.to_csv(path)
+        meta = AcquisitionData.read_metadata(path)
+        assert meta.path == path
+        assert meta.device == device_info
+        assert meta.config == config
+        assert meta.start_time == data.start_time
+        assert meta.num_samples == data.num_samples
+        assert meta.duration == approx(data.duration)
+        assert meta.integrity == False
+        assert meta.skipped_samples == 1
+        assert meta.file_size == os.path.getsize(path)
+
+
+def test_slice():
+    device_info = DeviceInfo(
+        unique_id="E66368254F89A225",
+        firmware="1.0.0")
+
+    config = Config(
+        sample_rate=SampleRate.hz_200,
+        filter=Filter.hz_42,
+        acc_range=AccRange.g_4,
+        gyro_range=GyroRange.dps_1000,
+    )
+
+    samples = [IMUSample(i, i, 0, 0, 0, 0, 0) for i in range(-200, 1000)]
+    data = AcquisitionData(samples, device_info, config, datetime.now())
+
+    def expected(tstart, tend):
+        return [s for s in samples if tstart <= s.count / 200 <= tend]
+
+    for tstart, tend in [(0.1, 0.5), (-0.5, 0.0), (-10, 10), (2.0, 1.0), (4.995, 5.1),
+                         (float("-inf"), 0.5), (0.5, float("inf"))]:
+        sliced = data.slice(tstart, tend)
+        assert sliced.samples == expected(tstart, tend)
+        assert sliced.config == config
+
+    sliced = data.slice_counts(10, 20)
+    assert [s.count for s in sliced.samples] == list(range(10, 20))
+    assert sliced.samples[0] is samples[210]
+    assert data.slice_counts().samples == samples
+
+    # skipped samples
+    samples = [s for s in samples if not (100 <= s.count < 150)]
+    data = AcquisitionData(samples, device_info, config, datetime.now())
+    assert [s.count for s in data.slice_counts(90, 160).samples] == list(range(90, 100)) + list(range(150, 160))
+    assert [s.count for s in data.slice_counts(120, 152).samples] == [150, 151]
+    assert data.slice_counts(120, 130).samples == []
+    assert data.slice(0.1, 0.5).samples == expected(0.1, 0.5)
+
+
+def test_quantized_binary():
+    device_info = DeviceInfo(
+        unique_id="E66368254F89A225",
+        firmware="1.0.0")
+
+    config = Config(
+        sample_rate=SampleRate.hz_1000,
+        filter=Filter.hz_394,
+        acc_range=AccRange.g_4,
+        gyro_range=GyroRange.dps_500,
+    )
+
+    samples = [IMUSample(i, uniform(-4, 4), uniform(-4, 4), uniform(-4, 4),
+                         uniform(-500, 500), uniform(-500, 500), uniform(-500, 500))
+               for i in range(1000) if i != 500]
+    data = AcquisitionData(samples, device_info, config, datetime.now())
+    data.re_centre(100)
+
+    acc_lsb = 4 / 32768
+    gyro_lsb = 500 / 32768
+    quantized = data.quantize()
+    assert quantized.quantized
+    assert quantized.samples.values.dtype == np.int16
+    assert quantized.counts == data.counts
+    assert quantized.skipped_samples == 1
+    assert quantized.to_array()[:, :3] == approx(data.to_array()[:, :3], abs=acc_lsb)
+    assert quantized.to_array()[:, 3:] == approx(data.to_array()[:, 3:], abs=gyro_lsb)
+    assert quantized.samples[10].acc_x == approx(samples[10].acc_x, abs=acc_lsb)
+    sliced = quantized.slice_counts(0, 10)
+    assert sliced.counts == list(range(10))
+    assert np.shares_memory(sliced.samples.values, quantized.samples.values)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path_q = os.path.join(temp_dir, "data_q.pqb")
+        path_f = os.path.join(temp_dir, "data_f.pqb")
+        quantized.to_bin(path_q)
+        data.to_bin(path_f)
+        assert os.path.getsize(path_q) < os.path.getsize(path_f)
+
+        loaded = AcquisitionData.from_file(path_q)
+        assert loaded.quantized
+        assert loaded.counts == data.counts
+        assert np.array_equal(loaded.samples.values, quantized.samples.values)
+        assert loaded.config == config and loaded.device == device_info
+
+        loaded = AcquisitionData.from_bin(path_f)
+        assert not loaded.quantized
+        assert loaded.counts == data.counts
+        assert loaded.to_array() == approx(data.to_array(), rel=1e-6)
+
+        meta = AcquisitionData.read_metadata(path_q)
+        assert meta.num_samples == data.num_samples
+        assert meta.skipped_samples == 1
+
+
+def test_channels():
+    assert parse_channels(None) == CHANNELS
+    assert parse_channels("all") == CHANNELS
+    assert parse_channels("acc") == ("acc_x", "acc_y", "acc_z")
+    assert parse_channels("gyro_z, acc_z") == ("acc_z", "gyro_z")
+    assert parse_channels(["gyro", "acc_x"]) == ("acc_x", "gyro_x", "gyro_y", "gyro_z")
+    for invalid in ["", "acc_w", "accel"]:
+        try:
+            parse_channels(invalid)
+            assert False
+        except ValueError:
+            pass
+
+    device_info = DeviceInfo(
+        unique_id="E66368254F89A225",
+        firmware="1.0.0")
+
+    config = Config(
+        sample_rate=SampleRate.hz_100,
+        filter=Filter.hz_42,
+        acc_range=AccRange.g_2,
+        gyro_range=GyroRange.dps_250,
+    )
+
+    channels = parse_channels("acc_z,gyro_x")
+    samples = [IMUSample(i, None, None, uniform(-2, 2), uniform(-250, 250), None, None) for i in range(100)]
+    data = AcquisitionData(samples, device_info, config, datetime.now(), channels=channels)
+    assert data.to_array().shape == (100, 2)
+    assert "a_x" not in str(samples[0]) and "a_z" in str(samples[0])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "data.csv")
+        data.to_csv(path)
+        with open(path) as f:
+            assert f.readlines()[5].strip() == "count,a_z,g_x"
+        loaded = AcquisitionData.from_csv(path)
+        assert loaded.channels == channels
+        assert loaded.samples == samples
+        assert AcquisitionData.read_metadata(path).channels == channels
+
+        path = os.path.join(temp_dir, "data.pqb")
+        data.to_bin(path, quantized=True)
+        loaded = AcquisitionData.from_bin(path)
+        assert loaded.channels == channels
+        assert loaded.samples.values.shape == (100, 2)
+        assert loaded.samples[5].acc_x is None
+        assert loaded.samples[5].acc_z == approx(samples[5].acc_z, abs=2 / 32768)
+        assert loaded.samples[5].gyro_x == approx(samples[5].gyro_x, abs=250 / 32768)
+        assert AcquisitionData.read_metadata(path).channels == channels
@@ -0,0 +1,85 @@
+import os
+from datetime import datetime
+from fractions import Fraction
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from pytest import approx
+from scipy.signal import resample_poly
+
+from picoquake.catalog import Catalog
+from picoquake.data import *
+from picoquake.decimation import Resampler, resample, decimate
+
+
+def test_resampler_blocks():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(5001, 3))
+    for up, down in ((1, 20), (2, 3), (3, 2), (1, 1)):
+        resampler = Resampler(up, down)
+        blocks = []
+        i = 0
+        for size in rng.integers(1, 300, size=200):
+            blocks.append(resampler.process(values[i:i + size]))
+            i += size
+            if i >= len(values):
+                break
+        blocks.append(resampler.process(values[i:]))
+        blocks.append(resampler.flush())
+        assert np.allclose(np.concatenate(blocks), resample_poly(values, up, down, axis=0))
+
+    resampler = Resampler(4, 6)
+    assert (resampler.up, resampler.down, resampler.ratio) == (2, 3, Fraction(2, 3))
+
+
+def test_resampler_samples():
+    values = np.random.default_rng(1).normal(size=(1000, 6))
+    resampler = Resampler(1, 4)
+    first = resampler.process_samples(SampleArray(np.arange(400, 1000), values[:600]))
+    second = resampler.process_samples([IMUSample(i + 1000, *v) for i, v in enumerate(values[600:])])
+    rest = resampler.flush(CHANNELS)
+    counts = np.concatenate([first.counts, second.counts, rest.counts])
+    assert np.array_equal(counts, np.arange(100, 350))
+    result = np.concatenate([first.to_array(), second.to_array(), rest.to_array()])
+    assert np.allclose(result, resample_poly(values, 1, 4, axis=0))
+
+
+def test_decimate_data():
+    fs = 4000
+    t = np.arange(4 * fs) / fs
+    values = np.zeros((len(t), 6))
+    values[:, 0] = np.sin(2 * np.pi * 10 * t)
+    values[:, 1] = np.sin(2 * np.pi * 1500 * t)
+    config = Config(SampleRate.hz_4000, Filter.hz_536, AccRange.g_4, GyroRange.dps_1000)
+    data = AcquisitionData(SampleArray(np.arange(len(t)), values), DeviceInfo("E66368254F89A225", "1.0.0"),
+                           config, datetime(2024, 5, 1, 12, 0, 0))
+
+    low = decimate(data, 20)
+    assert low.resample_ratio == Fraction(1, 20)
+    assert low.sample_rate == 200.0
+    assert low.num_samples == len(t) // 20
+    assert low.duration == approx(data.duration)
+    assert low.counts[:3] == [0, 1, 2]
+    # 10 Hz passes, 1500 Hz is removed instead of aliased
+    middle = low.to_array()[20:-20]
+    assert np.allclose(middle[:, 0], np.sin(2 * np.pi * 10 * np.arange(20, low.num_samples - 20) / 200), atol=5e-3)
+    assert np.max(np.abs(middle[:, 1])) < 1e-3
+    assert low.slice(1.0, 2.0).num_samples == 201
+
+    with TemporaryDirectory() as temp_dir:
+        for name in ("low.csv", "low.pqb"):
+            path = os.path.join(temp_dir, name)
+            low.to_csv(path) if name.endswith(".csv") else low.to_bin(path)
+            loaded = AcquisitionData.from_file(path)
+            assert loaded.resample_ratio == Fraction(1, 20)
+            assert loaded.sample_rate == 200.0
+            assert AcquisitionData.read_metadata(path).sample_rate == 200.0
+        data.to_csv(os.path.join(temp_dir, "full.csv"))
+        with Catalog(temp_dir) as catalog:
+            catalog.update("*")
+            assert [e.filename for e in catalog.query(sample_rate=200.0)] == ["low.csv", "low.pqb"]
+            assert catalog.query(sample_rate=200.0)[0].config == config
+            assert [e.filename for e in catalog.query(sample_rate=4000.0)] == ["full.csv"]
+
+    # resampling again accumulates the ratio
+    assert resample(low, 3, 2).sample_rate == 300.0
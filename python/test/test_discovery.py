@@ -0,0 +1,130 @@
+import os
+import time
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+import pytest
+
+import picoquake.discovery as discovery
+import picoquake.interface as interface
+from picoquake.data import DeviceInfo
+from picoquake.discovery import VID, PID, DeviceEntry, DeviceRegistry
+from picoquake.exceptions import DeviceNotFound
+from picoquake.interface import PicoQuake
+from picoquake.simulator import SimulatorTransport
+
+UNIQUE_IDS = ("E66368254F89A225", "E6614C311B8B4D2A")
+
+
+@pytest.fixture
+def ports(monkeypatch):
+    """Fake serial ports, device nodes are temporary files. Counts port enumerations."""
+    with TemporaryDirectory() as tmp:
+        state = SimpleNamespace(dir=tmp, ports=[], enumerations=0)
+
+        def add(unique_id, name, vid=VID, pid=PID):
+            path = os.path.join(tmp, name)
+            open(path, "w").close()
+            state.ports.append(SimpleNamespace(device=path, vid=vid, pid=pid, serial_number=unique_id,
+                                               description=name))
+            return path
+
+        def comports():
+            state.enumerations += 1
+            return [p for p in state.ports if os.path.exists(p.device)]
+
+        state.add = add
+        monkeypatch.setattr(discovery, "comports", comports)
+        monkeypatch.setattr(discovery, "_DEV_DIR", tmp)
+        monkeypatch.setattr(discovery, "_DEV_PREFIXES", ("ttyACM",))
+        yield state
+
+
+def test_registry(ports):
+    port_0 = ports.add(UNIQUE_IDS[0], "ttyACM0")
+    port_1 = ports.add(UNIQUE_IDS[1], "ttyACM1")
+    ports.add("123456", "ttyUSB0", vid=0x1234)
+    short_ids = [DeviceInfo.unique_id_to_short_id(u) for u in UNIQUE_IDS]
+    cache = os.path.join(ports.dir, "cache", "devices.json")
+
+    registry = DeviceRegistry(cache)
+    assert registry.discover() == [DeviceEntry(short_ids[0], UNIQUE_IDS[0], port_0),
+                                   DeviceEntry(short_ids[1], UNIQUE_IDS[1], port_1)]
+    assert ports.enumerations == 1
+
+    # another process uses the cache file
+    registry = DeviceRegistry(cache)
+    assert registry.find(short_ids[1].lower()) == port_1
+    assert registry.find(short_ids[0]) == port_0
+    assert ports.enumerations == 1
+
+    # a removed node is not used, COM ports on Windows are not files
+    if os.name != "nt":
+        os.remove(port_0)
+        assert registry.find(short_ids[0]) is None
+        assert ports.enumerations == 2
+        assert [e.short_id for e in registry.devices()] == [short_ids[1]]
+    assert registry.find("ABCD", refresh=False) is None
+
+    registry.invalidate(short_ids[0])
+    registry.invalidate(short_ids[1])
+    assert DeviceRegistry(cache).devices() == []
+
+
+def test_stale_port(ports, monkeypatch):
+    port_0 = ports.add(UNIQUE_IDS[0], "ttyACM0")
+    port_1 = ports.add(UNIQUE_IDS[1], "ttyACM1")
+    short_id = DeviceInfo.unique_id_to_short_id(UNIQUE_IDS[0])
+    registry = DeviceRegistry("")
+    registry.discover()
+    monkeypatch.setattr(discovery, "_registry", registry)
+    # cached ports cannot be checked, as on Windows
+    monkeypatch.setattr(discovery, "_is_valid", lambda entry: True)
+
+    def serial_transport(port, low_latency=False):
+        owner = next((p.serial_number for p in ports.ports if p.device == port and os.path.exists(port)), None)
+        transport = SimulatorTransport(owner or UNIQUE_IDS[0], low_latency=low_latency)
+        if owner is None:
+            def fail():
+                raise ConnectionError(f"could not open port {port}")
+            transport.open = fail
+        return transport
+
+    monkeypatch.setattr(interface, "SerialTransport", serial_transport)
+
+    # the cached port was reassigned to another device
+    ports.ports[0].serial_number, ports.ports[1].serial_number = UNIQUE_IDS[1], UNIQUE_IDS[0]
+    enumerations = ports.enumerations
+    device = PicoQuake(short_id)
+    device.stop()
+    assert device.device_info.unique_id == UNIQUE_IDS[0]
+    assert registry.find(short_id, refresh=False) == port_1
+    assert ports.enumerations == enumerations + 1
+
+    # the cached port of an unplugged device cannot be opened
+    os.remove(port_1)
+    with pytest.raises(DeviceNotFound):
+        PicoQuake(short_id)
+    assert registry.find(short_id, refresh=False) is None
+
+
+def test_watch(ports):
+    added, removed = [], []
+    registry = DeviceRegistry("")
+    port = ports.add(UNIQUE_IDS[0], "ttyACM0")
+    watcher = registry.watch(added.append, removed.append, interval=0.02)
+    try:
+        time.sleep(0.1)
+        assert [e.port for e in added] == [port]
+        enumerations = ports.enumerations
+        time.sleep(0.1)
+        assert ports.enumerations == enumerations
+
+        port_1 = ports.add(UNIQUE_IDS[1], "ttyACM1")
+        os.remove(port)
+        time.sleep(0.1)
+    finally:
+        watcher.stop()
+    assert [e.port for e in added] == [port, port_1]
+    assert [e.port for e in removed] == [port]
+    assert list(watcher.devices) == [DeviceInfo.unique_id_to_short_id(UNIQUE_IDS[1])]
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import numpy as np
+from pytest import approx
+from scipy.stats import kurtosis, skew
+
+from picoquake.data import *
+from picoquake.features import FeatureExtractor, extract, extract_data
+
+
+def test_extract():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(10000, 3)) + [0.0, 0.0, 1.0]
+    result = extract(values, 1000.0, 500, step=250)
+    assert len(result) == 39
+    assert result.time[:3] == approx([0.0, 0.25, 0.5])
+    for i in (0, 17, 38):
+        window = values[i * 250:i * 250 + 500]
+        centred = window - window.mean(axis=0)
+        for c, name in enumerate(("acc_x", "acc_y", "acc_z")):
+            x = centred[:, c]
+            rms = np.sqrt(np.mean(x ** 2))
+            assert result[f"{name}_rms"][i] == approx(rms)
+            assert result[f"{name}_peak"][i] == approx(np.max(np.abs(x)))
+            assert result[f"{name}_crest"][i] == approx(np.max(np.abs(x)) / rms)
+            assert result[f"{name}_p2p"][i] == approx(np.ptp(x))
+            assert result[f"{name}_kurtosis"][i] == approx(kurtosis(x, fisher=False))
+            assert result[f"{name}_skewness"][i] == approx(skew(x))
+
+    result = extract(values, 1000.0, 500, features=("rms",), detrend=False)
+    assert result.dtype.names == ("time", "acc_x_rms", "acc_y_rms", "acc_z_rms")
+    assert result.acc_z_rms[0] == approx(np.sqrt(np.mean(values[:500, 2] ** 2)))
+
+
+def test_velocity_and_bands():
+    fs = 1000.0
+    t = np.arange(2000) / fs
+    values = np.sin(2 * np.pi * 100 * t) + 0.5 * np.sin(2 * np.pi * 300 * t)
+    result = extract(values, fs, 1000, features=("velocity_rms",), bands=[(50, 150), (250, 350)],
+                     velocity_band=(10, 200))
+    assert result.dtype.names == ("time", "0_velocity_rms", "0_band_50_150", "0_band_250_350")
+    # 1 g at 100 Hz, velocity amplitude 9.80665 / (2 pi 100) m/s
+    assert result["0_velocity_rms"] == approx(9806.65 / (2 * np.pi * 100) / np.sqrt(2))
+    assert result["0_band_50_150"] == approx(0.5)
+    assert result["0_band_250_350"] == approx(0.125)
+
+
+def test_streaming_features():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(5000, 6))
+    samples = SampleArray(np.arange(1000, 6000), values)
+    expected = extract(values[:, :3], 100.0, 200, step=150, bands=[(1, 10)])
+
+    extractor = FeatureExtractor(100.0, 200, step=150, bands=[(1, 10)])
+    results = [extractor.update_samples(samples[i:i + 333]) for i in range(0, 5000, 333)]
+    streamed = np.concatenate(results)
+    assert len(streamed) == len(expected)
+    assert streamed["time"] == approx(expected["time"] + 10.0)
+    for name in expected.dtype.names[1:]:
+        assert np.allclose(streamed[name], expected[name])
+
+    config = Config(SampleRate.hz_100, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+    data = AcquisitionData(samples, DeviceInfo("E66368254F89A225", "1.0.0"), config, datetime.now())
+    data.re_centre(2500)
+    from_data = extract_data(data, 2.0, 1.5, bands=[(1, 10)])
+    assert from_data.time[0] == approx(-25.0)
+    for name in expected.dtype.names[1:]:
+        assert np.allclose(from_data[name], expected[name])
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import numpy as np
+from pytest import approx
+from scipy.signal import sosfilt
+
+from picoquake.data import *
+from picoquake.features import FeatureExtractor
+from picoquake.filtering import *
+
+
+def test_filter_blocks():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(5000, 3)) + 1.0
+    sos_filter = cascade(highpass(1.0, 500.0), notch(50.0, 500.0), lowpass(100.0, 500.0, order=2))
+    assert sos_filter.sos.shape == (4, 6)
+    blocks = []
+    i = 0
+    for size in rng.integers(1, 400, size=100):
+        blocks.append(sos_filter.process(values[i:i + size]))
+        i += size
+        if i >= len(values):
+            break
+    blocks.append(sos_filter.process(values[i:]))
+    assert np.allclose(np.concatenate(blocks), sosfilt(sos_filter.sos, values, axis=0))
+
+    # one dimensional input keeps its shape
+    sos_filter.reset()
+    assert sos_filter.process(values[:100, 0]).shape == (100,)
+
+
+def test_filter_response():
+    fs = 1000.0
+    t = np.arange(4000) / fs
+    mains = np.sin(2 * np.pi * 50 * t)
+    bearing = np.sin(2 * np.pi * 160 * t)
+    values = 1.0 + mains + bearing
+
+    out = notch(50.0, fs).process(values)[2000:]
+    assert np.sqrt(np.mean((out - 1.0 - bearing[2000:]) ** 2)) < 0.01
+
+    out = bandpass(120.0, 200.0, fs).process(values)[2000:]
+    assert np.sqrt(np.mean(out ** 2)) == approx(np.sqrt(0.5), rel=0.05)
+
+
+def test_filter_data_and_features():
+    fs = 1000.0
+    t = np.arange(3000) / fs
+    values = np.zeros((3000, 6))
+    values[:, 2] = 1.0 + np.sin(2 * np.pi * 50 * t) + 0.2 * np.sin(2 * np.pi * 160 * t)
+    config = Config(SampleRate.hz_1000, Filter.hz_394, AccRange.g_4, GyroRange.dps_1000)
+    data = AcquisitionData(SampleArray(np.arange(3000), values), DeviceInfo("E66368254F89A225", "1.0.0"),
+                           config, datetime.now())
+
+    band = bandpass(120.0, 200.0, fs)
+    filtered = filter_data(data, band)
+    assert filtered.counts == data.counts
+    assert np.allclose(filtered.to_array()[:, 2], sosfilt(band.sos, values[:, 2]))
+
+    # band-limited RMS only sees the 160 Hz component
+    extractor = FeatureExtractor(fs, 1000, features=("rms",), sos_filter=bandpass(120.0, 200.0, fs))
+    result = np.concatenate([extractor.update_samples(data.samples[i:i + 700]) for i in range(0, 3000, 700)])
+    assert result["acc_z_rms"][-1] == approx(0.2 / np.sqrt(2), rel=0.05)
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from picoquake.data import *
+from picoquake.interface import PicoQuake
+from picoquake.latency import *
+from picoquake.simulator import SimulatorTransport
+from picoquake.transport import create_transport
+
+
+def test_simulator():
+    transport = create_transport("sim://")
+    assert isinstance(transport, SimulatorTransport)
+    device = PicoQuake(transport=transport)
+    try:
+        assert device.device_info.unique_id == "E66368254F89A225"
+        device.configure(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+        start = time.monotonic()
+        data, exception = device.acquire(n_samples=500)
+        assert time.monotonic() - start == pytest.approx(0.5, abs=0.2)
+    finally:
+        device.stop()
+    assert exception is None
+    assert data.num_samples == 500 and data.integrity
+    assert data.samples[0].acc_z == pytest.approx(1.0)
+    assert transport.sample_time_ns(500) - transport.sample_time_ns(0) == 500_000_000
+
+
+def test_recorder():
+    rate = 100.0
+    recorder = LatencyRecorder()
+    t0 = 1_000_000_000
+    for count in range(300):
+        taken = t0 + count * 10_000_000
+        read = taken + 2_000_000 + (count % 3) * 1_000_000
+        recorder.received(count, read, read + 10_000, read + 20_000)
+        recorder.mark(count, QUEUE)
+        recorder.mark(count, STORE)
+        if count % 2 == 0:
+            recorder.consumed([IMUSample(count, 0, 0, 0, 0, 0, 0)])
+    assert recorder.count == 150
+    assert recorder.stats() and [s.name for s in recorder.stats()] == list(STAGES[1:])
+
+    stats = {s.name: s for s in recorder.stats(rate)}
+    assert list(stats) == list(STAGES) + ["total"]
+    # read latency in excess of the minimum
+    assert stats["read"].p50 == pytest.approx(1e-3, abs=0.2e-3)
+    assert stats["read"].max == pytest.approx(2e-3, abs=0.2e-3)
+    assert stats["framing"].p50 == pytest.approx(10e-6)
+    assert sum(c for _, c in stats["decode"].histogram) == 150
+    assert "p99" in format_stats(list(stats.values()), histogram=True)
+
+    recorder.reset()
+    assert recorder.count == 0 and recorder.stats() == []
+
+
+@pytest.mark.parametrize("low_latency", [True, False])
+def test_measure_latency(low_latency):
+    device = PicoQuake(port="sim://", low_latency=low_latency)
+    try:
+        device.configure(SampleRate.hz_100, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+        stats = {s.name: s for s in measure_latency(device, 1.0, warmup=0.2)}
+        assert device.latency is None
+    finally:
+        device.stop()
+    assert list(stats) == list(STAGES) + ["total"]
+    assert stats["read"].count == pytest.approx(100, abs=10)
+    assert all(s.p50 <= s.p99 <= s.max for s in stats.values())
+    assert stats["total"].p50 >= stats["read"].p50
+    if low_latency:
+        assert stats["read"].p50 < 0.01
+    else:
+        # samples wait in the read for 1000 bytes or the timeout
+        assert stats["read"].p50 > 0.02
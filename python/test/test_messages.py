@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from picoquake.messages import *
+from picoquake.msg import messages_pb2
+
+CASES = [
+    (StatusMessage, messages_pb2.Status, dict(state=0, temperature=0.0, missed_samples=0, error_code=0)),
+    (StatusMessage, messages_pb2.Status, dict(state=2, temperature=-0.0, missed_samples=300, error_code=255)),
+    (StatusMessage, messages_pb2.Status, dict(state=4, temperature=36.5, missed_samples=2 ** 32 - 1, error_code=7)),
+    (DeviceInfoMessage, messages_pb2.DeviceInfo, dict(unique_id=bytes.fromhex("E66368254F89A225"),
+                                                      firmware=b"1.2.0\x00\x00\x00\x00")),
+    (DeviceInfoMessage, messages_pb2.DeviceInfo, dict(unique_id=b"", firmware=b"")),
+    (CommandMessage, messages_pb2.Command, dict(id=3, filter_config=1, data_rate=12, acc_range=2, gyro_range=3,
+                                                num_to_sample=2 ** 40 + 5)),
+    (CommandMessage, messages_pb2.Command, dict(id=1)),
+]
+
+
+@pytest.mark.parametrize("cls, generated, values", CASES)
+def test_matches_generated(cls, generated, values):
+    encoded = generated(**values).SerializeToString()
+    assert cls(**values).encode() == encoded
+    decoded = cls.decode(encoded)
+    for name, value in values.items():
+        assert getattr(decoded, name) == value
+
+
+def test_random_round_trip():
+    rng = random.Random(0)
+    for _ in range(500):
+        values = dict(id=rng.randrange(256), filter_config=rng.randrange(8), data_rate=rng.randrange(16),
+                      acc_range=rng.randrange(4), gyro_range=rng.randrange(4), num_to_sample=rng.randrange(2 ** 64))
+        encoded = CommandMessage(**values).encode()
+        assert encoded == messages_pb2.Command(**values).SerializeToString()
+        assert CommandMessage.decode(encoded) == CommandMessage(**values)
+
+        msg = messages_pb2.Status(state=rng.randrange(5), temperature=rng.uniform(-40, 85),
+                                  missed_samples=rng.randrange(2 ** 32), error_code=rng.randrange(256))
+        decoded = StatusMessage.decode(msg.SerializeToString())
+        assert (decoded.state, decoded.temperature, decoded.missed_samples, decoded.error_code) == \
+            (msg.state, msg.temperature, msg.missed_samples, msg.error_code)
+        assert decoded.encode() == msg.SerializeToString()
+
+
+def test_invalid():
+    # unknown fields are skipped, as by protobuf
+    extra = StatusMessage(state=2).encode() + bytes([9 << 3 | 2, 2, 0xAA, 0xBB, 10 << 3 | 5, 0, 0, 0, 0])
+    assert StatusMessage.decode(extra) == StatusMessage(state=2)
+    encoded = StatusMessage(state=2, temperature=25.0).encode()
+    with pytest.raises(ValueError):
+        StatusMessage.decode(encoded[:-1])
+    with pytest.raises(ValueError):
+        StatusMessage.decode(bytes([1 << 3 | 2, 0]))  # state as bytes
+    with pytest.raises(ValueError):
+        CommandMessage.decode(b"\x08\xff")
@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from picoquake.data import *
+from picoquake.overview import Overview, build_overview, get_overview, overview_path
+
+
+def _data(values, counts=None) -> AcquisitionData:
+    if counts is None:
+        counts = np.arange(len(values))
+    config = Config(SampleRate.hz_4000, Filter.hz_536, AccRange.g_4, GyroRange.dps_1000)
+    return AcquisitionData(SampleArray(counts, values), DeviceInfo("E66368254F89A225", "1.0.0"),
+                           config, datetime(2024, 5, 1, 12, 0, 0))
+
+
+def test_build_overview():
+    values = np.random.default_rng(0).normal(size=(10007, 6))
+    data = _data(values, np.arange(100, 10107))
+    overview = build_overview(data, bin_size=16, factor=4, min_bins=10, chunk_size=1000)
+    assert overview.num_samples == 10007
+    assert overview.channels == CHANNELS
+    assert [level.bin_size for level in overview.levels] == [16, 64, 256, 1024]
+    for level in overview.levels:
+        n = level.bin_size
+        assert len(level) == -(-10007 // n)
+        assert np.array_equal(level.counts, np.arange(100, 10107, n))
+        for i in (0, len(level) - 1):
+            block = values[i * n:(i + 1) * n]
+            assert np.allclose(level.minimum[i], block.min(axis=0))
+            assert np.allclose(level.maximum[i], block.max(axis=0))
+            assert np.allclose(level.mean[i], block.mean(axis=0), atol=1e-6)
+            assert np.allclose(level.mean_square[i], (block ** 2).mean(axis=0), atol=1e-6)
+    assert len(overview.levels[-1]) <= 10
+
+
+def test_overview_select():
+    data = _data(np.random.default_rng(1).normal(size=(100000, 6)))
+    overview = build_overview(data, bin_size=16, factor=4)
+    bins = overview.select(None, None, 100)
+    assert bins.bin_size == 16 * 4 ** 2
+    assert len(bins) >= 200
+    bins = overview.select(50000, 60000, 100)
+    assert bins.bin_size == 16
+    assert bins.counts[0] >= 50000 and bins.counts[-1] < 60000
+    assert overview.select(50000, 51000, 100) is None
+
+
+def test_overview_file():
+    data = _data(np.random.default_rng(2).normal(size=(5000, 6)))
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.bin")
+        data.to_bin(path)
+        data = AcquisitionData.from_file(path, mmap=True)
+        built = get_overview(data, bin_size=16)
+        assert os.path.exists(overview_path(path))
+        loaded = Overview.load(overview_path(path))
+        assert loaded.channels == built.channels and loaded.num_samples == built.num_samples
+        for a, b in zip(loaded.levels, built.levels):
+            assert a.bin_size == b.bin_size
+            assert np.array_equal(a.counts, b.counts) and np.array_equal(a.maximum, b.maximum)
+        # file is used while it is newer than the data
+        assert get_overview(data).levels[0].bin_size == 16
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert get_overview(data).levels[0].bin_size == 64
+
+
+def test_plot_overview():
+    pytest.importorskip("matplotlib")
+    import matplotlib
+    matplotlib.use("Agg")
+    from picoquake.plot import plot
+
+    t = np.arange(600000) / 4000
+    values = np.zeros((len(t), 6))
+    values[:, 0] = np.sin(2 * np.pi * 50 * t)
+    data = _data(values)
+    with TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        plot(data, os.path.join(tmp, "plot.png"), "x", rms=True)
+        assert time.perf_counter() - start < 10
+        plot(data, os.path.join(tmp, "slice.png"), "x", tstart=10, tend=10.5, rms=True)
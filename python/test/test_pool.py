@@ -0,0 +1,54 @@
+import os
+import time
+from tempfile import TemporaryDirectory
+
+from picoquake.exceptions import ConnectionError
+from picoquake.pool import DevicePool, connect_many
+from picoquake.transport import *
+
+from test_transport import _device_info, _status, State
+
+
+def _slow_handshake_capture(path: str, delay: float):
+    with CaptureWriter(path) as writer:
+        writer.write_chunk(_status(State.IDLE), READ, 0)
+        writer.write_chunk(b"handshake", WRITE, 1_000_000)
+        writer.write_chunk(_device_info() + _status(State.IDLE), READ, int(delay * 1e9))
+        for i in range(1, 20):
+            writer.write_chunk(_status(State.IDLE), READ, int((delay + i * 0.1) * 1e9))
+
+
+def test_connect_many():
+    with TemporaryDirectory() as tmp:
+        targets = []
+        for i in range(6):
+            path = os.path.join(tmp, f"session_{i}.pqcap")
+            _slow_handshake_capture(path, 0.3)
+            targets.append(f"replay://{path}?speed=1")
+        missing = f"replay://{os.path.join(tmp, 'missing.pqcap')}"
+
+        with DevicePool() as pool:
+            start = time.monotonic()
+            devices, errors = connect_many(targets + [missing], pool=pool)
+            assert time.monotonic() - start < 1.0
+            assert list(devices) == targets
+            assert list(errors) == [missing] and isinstance(errors[missing], ConnectionError)
+            assert all(d.device_info.unique_id == "E66368254F89A225" for d in devices.values())
+
+            # connected devices are reused
+            start = time.monotonic()
+            assert pool.get(targets[0]) is devices[targets[0]]
+            assert time.monotonic() - start < 0.1
+
+            devices[targets[1]].stop()
+            assert not devices[targets[1]].connected
+            again, errors = pool.connect(targets[:2])
+            assert not errors
+            assert again[targets[0]] is devices[targets[0]]
+            assert again[targets[1]] is not devices[targets[1]] and again[targets[1]].connected
+
+            pool.release(targets[0])
+            assert targets[0] not in pool and len(pool) == 5
+            assert not devices[targets[0]].connected
+        assert len(pool) == 0
+        assert not again[targets[1]].connected
@@ -0,0 +1,129 @@
+import os
+import struct
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from picoquake.data import *
+from picoquake.interface import PicoQuake
+from picoquake.messages import StatusMessage
+from picoquake.protocol import *
+from picoquake.protocol import _capture_metadata
+from picoquake.transport import *
+
+from test_transport import _samples, _status, write_session_capture
+
+
+def _reference_frames(data: bytes):
+    """Framing loop of the original serial worker."""
+    packets, buffer, receiving = [], bytearray(), False
+    for b in data:
+        if b == 0:
+            if receiving:
+                if buffer:
+                    packets.append(bytes(buffer))
+                    buffer.clear()
+                    receiving = False
+            else:
+                receiving = True
+        elif receiving:
+            buffer.append(b)
+    return packets
+
+
+def _stream(rng) -> bytes:
+    parts = []
+    for _ in range(300):
+        kind = rng.integers(4)
+        if kind == 0:
+            parts.append(_samples(int(rng.integers(1 << 40)), 1))
+        elif kind == 1:
+            parts.append(_status(State.SAMPLING))
+        elif kind == 2:
+            parts.append(bytes(rng.integers(0, 3, size=rng.integers(1, 6), dtype=np.uint8)))
+        else:
+            parts.append(b"\x00" * int(rng.integers(1, 3)))
+    return b"".join(parts)
+
+
+def test_framing():
+    rng = np.random.default_rng(0)
+    data = _stream(rng)
+    expected = _reference_frames(data)
+    cuts = np.sort(rng.integers(0, len(data), size=50))
+    blocks = [data[a:b] for a, b in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(data)])))]
+
+    decoder = FrameDecoder()
+    assert [p for block in blocks for p in decoder.feed(block)] == expected
+
+    packets, tail, receiving = [], np.empty(0, dtype=np.uint8), False
+    for block in blocks:
+        buffer = np.concatenate((tail, np.frombuffer(block, dtype=np.uint8)))
+        starts, ends, receiving, offset = split_frames(buffer, receiving)
+        packets += [buffer[a:b].tobytes() for a, b in zip(starts, ends)]
+        tail = buffer[offset:]
+    assert packets == expected
+
+
+def test_decode_imu_batch():
+    packets = [_samples(i, 1)[1:-1] for i in (0, 1, 255, 256, 1 << 40)]
+    # not COBS encoded, decoded with decode_packet
+    packets.append(b"\x01" + struct.pack("<Qffffff", 7, 0, -1.5, 0, 2.5, 0, 1e-3).replace(b"\x00", b"\x01"))
+    packets.append(_status(State.IDLE)[1:-1])
+    buffer = np.frombuffer(b"\x00".join(packets), dtype=np.uint8)
+    lengths = np.array([len(p) for p in packets])
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    counts, values, undecoded = decode_imu_batch(buffer, starts, starts + lengths)
+    assert list(undecoded) == [False] * 5 + [True, True]
+    for i, packet in enumerate(packets[:5]):
+        sample = decode_packet(packet)
+        assert counts[i] == sample.count
+        assert list(values[i]) == [sample.acc_x, sample.acc_y, sample.acc_z,
+                                   sample.gyro_x, sample.gyro_y, sample.gyro_z]
+    assert isinstance(decode_packet(packets[-1]), StatusMessage)
+
+
+def test_capture_and_decode():
+    with TemporaryDirectory() as tmp:
+        session = os.path.join(tmp, "session.pqcap")
+        write_session_capture(session, 3000)
+        capture = os.path.join(tmp, "raw.pqcap")
+        device = PicoQuake(transport=ReplayTransport(session))
+        try:
+            device.configure(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+            device.capture(capture, seconds=0.3)
+            assert len(device._sample_deque) == 0
+        finally:
+            device.stop()
+        with CaptureReader(capture) as reader:
+            assert [c.direction for c in reader][:2] == [META, WRITE]
+
+        output = os.path.join(tmp, "data.pqb")
+        data = decode_capture(capture, output=output, channels="acc", chunk_size=1000)
+        assert data.num_samples == 3000 and data.integrity
+        assert data.channels == ("acc_x", "acc_y", "acc_z")
+        assert data.config.sample_rate == SampleRate.hz_1000
+        assert data.device.unique_id == "E66368254F89A225"
+        assert data.samples[10].acc_x == pytest.approx(0.1)
+        assert AcquisitionData.from_file(output).num_samples == 3000
+
+        with pytest.raises(ValueError):
+            decode_capture(session)
+
+
+def test_decode_capture_clock():
+    config = Config(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+    with TemporaryDirectory() as tmp:
+        session = os.path.join(tmp, "session.pqcap")
+        write_session_capture(session, 5000, sample_rate=1000.1)
+        capture = os.path.join(tmp, "raw.pqcap")
+        with CaptureReader(session) as reader, CaptureWriter(capture) as writer:
+            writer.write_chunk(_capture_metadata(DeviceInfo("E66368254F89A225", "1.0.0"), config, datetime.now()),
+                               META)
+            for chunk in reader:
+                writer.write_chunk(chunk.data, chunk.direction, chunk.timestamp_ns)
+        data = decode_capture(capture)
+        assert data.clock.rate == pytest.approx(1000.1, rel=1e-6)
+        assert data.start_time == data.clock.datetime(0)
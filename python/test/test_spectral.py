@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+from pytest import approx
+from scipy.signal import welch
+
+from picoquake.data import IMUSample, SampleArray
+from picoquake.spectral import (StreamingPSD, analyze, get_window, frequency_grid, spectrogram, spectrogram_data,
+                                _top_peaks)
+
+
+def test_streaming_psd_matches_welch():
+    rng = np.random.default_rng(0)
+    fs = 500.0
+    t = np.arange(5003) / fs
+    data = rng.normal(size=(len(t), 3)) + np.sin(2 * np.pi * 50 * t)[:, np.newaxis] + 0.3
+    for nperseg, noverlap in ((256, None), (255, 100), (128, 0)):
+        psd = StreamingPSD(fs, nperseg, noverlap)
+        i = 0
+        for size in rng.integers(1, 400, size=100):
+            psd.update(data[i:i + size])
+            i += size
+            if i >= len(data):
+                break
+        psd.update(data[i:])
+        freqs, pxx = psd.spectrum()
+        f_ref, p_ref = welch(data, fs, nperseg=nperseg, noverlap=noverlap, axis=0)
+        assert np.allclose(freqs, f_ref)
+        assert np.allclose(pxx, p_ref)
+
+
+def test_streaming_psd_decay():
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(1024, 1))
+    psd = StreamingPSD(100.0, 128, 0, decay=0.5)
+    psd.update(data[:512])
+    psd.update(data[512:])
+    assert psd.num_segments == 8
+    weights = 0.5 ** np.arange(7, -1, -1)
+    segments = [welch(data[i:i + 128], 100.0, nperseg=128, axis=0)[1] for i in range(0, 1024, 128)]
+    expected = np.tensordot(weights, segments, axes=1) / weights.sum()
+    assert np.allclose(psd.spectrum()[1], expected)
+
+
+def test_streaming_psd_samples():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=(300, 6))
+    samples = [IMUSample(i, *row) for i, row in enumerate(values)]
+    psd_list = StreamingPSD(100.0, 64, channels="acc")
+    psd_list.update_samples(samples)
+    psd_array = StreamingPSD(100.0, 64, channels="acc")
+    psd_array.update_samples(SampleArray.from_samples(samples))
+    assert np.allclose(psd_list.spectrum()[1], psd_array.spectrum()[1])
+    assert np.allclose(psd_list.spectrum()[1], welch(values[:, :3], 100.0, nperseg=64, axis=0)[1])
+
+    with pytest.raises(RuntimeError):
+        StreamingPSD(100.0, 64).spectrum()
+
+
+def test_analyze():
+    rng = np.random.default_rng(3)
+    fs = 200.0
+    for n in (1000, 1001):
+        t = np.arange(n) / fs
+        values = np.stack([np.sin(2 * np.pi * f * t) for f in (10, 25, 40)], axis=1) + 0.01 * rng.normal(size=(n, 3))
+        result = analyze(values, fs, ("acc_x", "acc_y", "acc_z"), nperseg=128, freq_max=60)
+
+        window = np.hanning(n)
+        for i in range(3):
+            expected = 2.0 / n * np.abs(np.fft.rfft(values[:, i] * window))
+            assert np.allclose(result.amplitude[:, i], expected[:len(result.freqs)])
+        assert result.freqs[-1] <= 60
+        assert result.amplitude.shape == (len(result.freqs), 3)
+
+        f_ref, p_ref = welch(values, fs, nperseg=128, axis=0)
+        mask = f_ref <= 60
+        assert np.allclose(result.psd_freqs, f_ref[mask])
+        assert np.allclose(result.psd, p_ref[mask])
+        for i, f in enumerate((10, 25, 40)):
+            assert result.freqs[result.amplitude_peaks[i][-1]] == approx(f, abs=0.5)
+            assert result.psd_freqs[result.psd_peaks[i][-1]] == approx(f, abs=2)
+            assert len(result.amplitude_peaks[i]) == 3
+
+    # fewer peaks than requested
+    values = np.array([0.0, 5.0, 0.0, 3.0, 0.0, 0.0])[:, np.newaxis]
+    assert _top_peaks(values, 3)[0].tolist() == [3, 1]
+    assert _top_peaks(values, 1)[0].tolist() == [1]
+    assert _top_peaks(values, 0)[0].tolist() == []
+
+    assert get_window("hann", 1000) is get_window("hann", 1000)
+    assert frequency_grid(1000, fs) is frequency_grid(1000, fs)
+
+
+def test_spectrogram():
+    from scipy.signal import spectrogram as scipy_spectrogram
+    rng = np.random.default_rng(4)
+    fs = 500.0
+    values = rng.normal(size=(10007, 3))
+    f_ref, t_ref, s_ref = scipy_spectrogram(values, fs, "hann", nperseg=128, noverlap=32, axis=0)
+
+    # chunks not aligned to segments
+    result = spectrogram(values, fs, nperseg=128, noverlap=32, chunk_size=1000)
+    assert np.allclose(result.freqs, f_ref)
+    assert np.allclose(result.times, t_ref)
+    assert result.power.shape == (len(t_ref), len(f_ref), 3)
+    assert np.allclose(result.power, s_ref.transpose(2, 0, 1))
+
+    # decimation averages segments and bins, including incomplete groups
+    result = spectrogram(values, fs, nperseg=128, noverlap=32, chunk_size=777,
+                         time_decimation=4, freq_decimation=5, freq_max=100)
+    mask = f_ref <= 100
+    n_t, n_f = -(-len(t_ref) // 4), -(-np.count_nonzero(mask) // 5)
+    assert result.power.shape == (n_t, n_f, 3)
+    assert result.times[0] == approx(t_ref[:4].mean())
+    assert result.times[-1] == approx(t_ref[(n_t - 1) * 4:].mean())
+    assert result.freqs[-1] == approx(f_ref[mask][(n_f - 1) * 5:].mean())
+    expected = s_ref[mask][:5, :, :4].mean(axis=(0, 2))
+    assert np.allclose(result.power[0, 0], expected)
+
+
+def test_spectrogram_mmap():
+    from datetime import datetime
+    from picoquake.data import AcquisitionData, DeviceInfo
+    from picoquake.configuration import Config, SampleRate, Filter, AccRange, GyroRange
+    import tempfile
+    import os
+    rng = np.random.default_rng(5)
+    values = rng.normal(size=(5000, 6))
+    samples = SampleArray(np.arange(5000), values)
+    config = Config(SampleRate.hz_1000, Filter.hz_394, AccRange.g_16, GyroRange.dps_2000)
+    data = AcquisitionData(samples, DeviceInfo("E66368254F89A225", "1.0.0"), config, datetime.now())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "data.pqb")
+        data.to_bin(path)
+        mapped = AcquisitionData.from_file(path, mmap=True)
+        assert isinstance(mapped.samples.values.base, np.memmap)
+        assert mapped.num_samples == 5000
+        result = spectrogram_data(mapped, "acc", nperseg=256, chunk_size=1000)
+        expected = spectrogram(values[:, :3].astype(np.float32), 1000.0, nperseg=256)
+        assert result.channels == ("acc_x", "acc_y", "acc_z")
+        assert np.allclose(result.power, expected.power)
+        del mapped, result
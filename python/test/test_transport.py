@@ -0,0 +1,343 @@
+import os
+import select
+import socket
+import statistics
+import struct
+import time
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from cobs import cobs
+
+from picoquake.data import *
+from picoquake.interface import PicoQuake
+from picoquake.messages import CommandMessage
+from picoquake.msg import messages_pb2
+from picoquake.protocol import FrameDecoder
+from picoquake.transport import *
+
+
+def _packet(packet_id: PacketID, payload: bytes) -> bytes:
+    return b"\x00" + bytes([packet_id.value]) + cobs.encode(payload) + b"\x00"
+
+
+def _status(state: State) -> bytes:
+    msg = messages_pb2.Status()
+    msg.state = state.value
+    msg.temperature = 25.0
+    return _packet(PacketID.STATUS, msg.SerializeToString())
+
+
+def _device_info() -> bytes:
+    msg = messages_pb2.DeviceInfo()
+    msg.unique_id = bytes.fromhex("E66368254F89A225")
+    msg.firmware = b"1.0.0"
+    return _packet(PacketID.DEVICE_INFO, msg.SerializeToString())
+
+
+def _samples(start: int, num: int) -> bytes:
+    return b"".join(_packet(PacketID.IMU_DATA, struct.pack("<Qffffff", i, i * 0.01, 0, 1, 0, 0, 0))
+                    for i in range(start, start + num))
+
+
+def write_session_capture(path: str, num_samples: int, sample_rate: float = 1000.0):
+    """Writes a capture of a handshake followed by an acquisition of `num_samples` samples."""
+    t = time.monotonic_ns()
+    with CaptureWriter(path) as writer:
+        writer.write_chunk(_status(State.IDLE), READ, t)
+        writer.write_chunk(b"handshake", WRITE, t + 1_000_000)
+        writer.write_chunk(_device_info() + _status(State.IDLE), READ, t + 2_000_000)
+        writer.write_chunk(b"start", WRITE, t + 3_000_000)
+        writer.write_chunk(_status(State.SAMPLING), READ, t + 4_000_000)
+        block = 100
+        for i in range(0, num_samples, block):
+            n = min(block, num_samples - i)
+            timestamp = t + 4_000_000 + int((i + n) / sample_rate * 1e9)
+            writer.write_chunk(_samples(i, n) + _status(State.SAMPLING), READ, timestamp)
+        writer.write_chunk(_status(State.IDLE), READ, timestamp + 1_000_000)
+
+
+def test_capture_file():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        with CaptureWriter(path) as writer:
+            writer.write_chunk(b"abc", READ, 10)
+            writer.write_chunk(b"de", WRITE, 20)
+        with open(path, "ab") as f:
+            f.write(b"\x00\x01")  # truncated chunk
+        with CaptureReader(path) as reader:
+            assert abs(reader.wall_time - time.time()) < 10
+            assert list(reader) == [CaptureChunk(10, READ, b"abc"), CaptureChunk(20, WRITE, b"de")]
+        with pytest.raises(ValueError):
+            CaptureReader(__file__)
+
+
+def test_replay_waits_for_writes():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        with CaptureWriter(path) as writer:
+            writer.write_chunk(b"idle", READ, 0)
+            writer.write_chunk(b"cmd", WRITE, 1_000_000)
+            writer.write_chunk(b"response", READ, 2_000_000)
+        with ReplayTransport(path, timeout=0.01) as transport:
+            assert transport.read(2) == b"id"
+            assert transport.read(100) == b"le"
+            assert transport.read(100) == b""
+            transport.write(b"cmd")
+            assert transport.read(100) == b"response"
+            assert transport.read(100) == b"" and transport.finished
+
+
+def test_replay_speed():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        with CaptureWriter(path) as writer:
+            for i in range(5):
+                writer.write_chunk(b"x", READ, i * 50_000_000)
+        with ReplayTransport(path, speed=2.0) as transport:
+            start = time.monotonic()
+            received = b""
+            while len(received) < 5:
+                received += transport.read(10)
+            assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+
+
+def test_replay_acquire():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        write_session_capture(path, 2000)
+        device = PicoQuake(transport=create_transport(f"replay://{path}"))
+        try:
+            assert device.device_info.short_id == DeviceInfo("E66368254F89A225", "").short_id
+            device.configure(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+            start = time.monotonic()
+            data, exception = device.acquire(n_samples=2000)
+            assert time.monotonic() - start < 1.0
+        finally:
+            device.stop()
+        assert exception is None
+        assert data.num_samples == 2000 and data.integrity
+        assert data.samples[10].acc_x == pytest.approx(0.1)
+
+
+def test_replay_trigger_band_limited():
+    from picoquake.filtering import bandpass
+    fs = 1000.0
+    t = np.arange(3000) / fs
+    # slow motion throughout, vibration at 100 Hz from sample 1500
+    acc_x = np.sin(2 * np.pi * 2 * t) + 0.5 * np.sin(2 * np.pi * 100 * t) * (t >= 1.5)
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        t0 = time.monotonic_ns()
+        with CaptureWriter(path) as writer:
+            writer.write_chunk(b"handshake", WRITE, t0)
+            writer.write_chunk(_device_info() + _status(State.IDLE), READ, t0)
+            writer.write_chunk(b"start", WRITE, t0 + 1_000_000)
+            for i in range(0, len(t), 50):
+                block = b"".join(_packet(PacketID.IMU_DATA, struct.pack("<Qffffff", j, acc_x[j], 0, 1, 0, 0, 0))
+                                 for j in range(i, i + 50))
+                writer.write_chunk(block + _status(State.SAMPLING), READ, t0 + 1_000_000 + int((i + 50) / fs * 1e9))
+        device = PicoQuake(transport=ReplayTransport(path, speed=4.0))
+        try:
+            device.configure(SampleRate.hz_1000, Filter.hz_213, AccRange.g_4, GyroRange.dps_1000)
+            data, exception = device.trigger(0.2, pre_seconds=0.2, post_seconds=0.3, axis="x", rms_window=0.1,
+                                             rms_filter=bandpass(80, 120, fs))
+        finally:
+            device.stop()
+    assert exception is None
+    trigger_count = data.samples[0].count + 200
+    assert 1500 <= trigger_count <= 1700
+    assert data.num_samples == pytest.approx(500, abs=5)
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="pseudo-terminals are POSIX only")
+def test_fd_transport():
+    master, slave = os.openpty()
+    try:
+        with FdTransport(os.ttyname(slave), timeout=0.05) as transport:
+            assert transport.read(10) == b""
+            os.write(master, b"\x00\x01\x0a\x0d\x00")
+            time.sleep(0.05)
+            assert transport.read(10) == b"\x00\x01\x0a\x0d\x00"
+            transport.write(b"\x00\x04\x03\x00")
+            assert os.read(master, 10) == b"\x00\x04\x03\x00"
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_socket_transport():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def echo():
+        conn, _ = server.accept()
+        with conn:
+            conn.sendall(conn.recv(100))
+
+    thread = Thread(target=echo)
+    thread.start()
+    transport = create_transport(f"tcp://127.0.0.1:{port}", timeout=1.0)
+    assert isinstance(transport, SocketTransport)
+    with transport:
+        transport.write(b"\x00\x04abc\x00")
+        assert transport.read(100) == b"\x00\x04abc\x00"
+        with pytest.raises(ConnectionError):
+            transport.read(100)
+    thread.join()
+    server.close()
+
+
+def test_incomplete_transport():
+    class ReadOnly(Transport):
+        def open(self):
+            pass
+
+        def read(self, size: int) -> bytes:
+            return b""
+
+    with pytest.raises(TypeError):
+        ReadOnly()
+
+
+def test_create_transport():
+    assert isinstance(create_transport("/dev/ttyACM0"), SerialTransport)
+    assert create_transport("unix:///tmp/pq.sock").address == "/tmp/pq.sock"
+    assert create_transport("fd:///dev/pts/3").path == "/dev/pts/3"
+    replay = create_transport("replay:///tmp/capture.pqcap?speed=4")
+    assert replay.path == "/tmp/capture.pqcap" and replay.speed == 4.0
+    with pytest.raises(ValueError):
+        create_transport("http://example.com")
+
+
+class _FailingReplay(ReplayTransport):
+    """Replay losing the connection once, `fail_after` seconds after it was first opened."""
+
+    def __init__(self, path: str, fail_after: float, **kwargs):
+        super().__init__(path, **kwargs)
+        self.fail_at: Optional[float] = None
+        self.fail_after = fail_after
+        self.opened = 0
+
+    def open(self):
+        super().open()
+        self.opened += 1
+        if self.fail_at is None:
+            self.fail_at = time.monotonic() + self.fail_after
+
+    def read(self, size: int) -> bytes:
+        if self.opened == 1 and time.monotonic() > self.fail_at:
+            raise ConnectionError("port closed")
+        return super().read(size)
+
+
+def test_reconnect():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pqcap")
+        write_session_capture(path, 4000)
+        transport = _FailingReplay(path, fail_after=2.5, speed=1.0)
+        device = PicoQuake(transport=transport, reconnect=True)
+        try:
+            device.configure(SampleRate.hz_1000, Filter.hz_42, AccRange.g_4, GyroRange.dps_1000)
+            device.start_continuos()
+            samples = device.read(3500, timeout=6.0)
+            assert device._exception is None
+        finally:
+            device.stop()
+    assert transport.opened == 2
+    assert len(device.gaps) == 1
+    gap = device.gaps[0]
+    counts = [s.count for s in samples]
+    assert all(b > a for a, b in zip(counts, counts[1:]))
+    assert gap.start_count - 1 in counts and gap.end_count in counts and gap.start_count not in counts
+    # about half a second lost while reconnecting
+    assert gap.num_samples == pytest.approx(1000 * (gap.end_time - gap.start_time).total_seconds(), abs=150)
+
+
+class _PtyDevice:
+    """Simulated device on a pseudo-terminal, recording when commands arrive and samples are sent."""
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.commands = []
+        self.sent = {}
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _run(self):
+        frames = FrameDecoder()
+        next_status = 0.0
+        next_sample = None
+        count = 0
+        while not self._stop.is_set():
+            if select.select([self.master], [], [], 0.0005)[0]:
+                for packet in frames.feed(os.read(self.master, 1000)):
+                    command = CommandID(CommandMessage.decode(cobs.decode(packet[1:])).id)
+                    self.commands.append((command, time.monotonic()))
+                    if command == CommandID.HANDSHAKE:
+                        os.write(self.master, _device_info())
+                    elif command == CommandID.START_SAMPLING:
+                        next_sample = time.monotonic()
+                    else:
+                        next_sample = None
+            now = time.monotonic()
+            if now >= next_status:
+                os.write(self.master, _status(State.IDLE if next_sample is None else State.SAMPLING))
+                next_status = now + 0.5
+            if next_sample is not None and now >= next_sample:
+                self.sent[count] = now
+                os.write(self.master, _samples(count, 1))
+                count += 1
+                next_sample += 1 / self.sample_rate
+
+    def command_delay(self, command: CommandID, since: float) -> float:
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            for c, t in self.commands:
+                if c == command and t >= since:
+                    return t - since
+            time.sleep(0.001)
+        raise TimeoutError(f"{command.name} not received")
+
+
+def _sample_latencies(sim: _PtyDevice, low_latency: bool) -> List[float]:
+    device = PicoQuake(port=sim.port, low_latency=low_latency)
+    try:
+        start = time.monotonic()
+        device.start_continuos()
+        # commands are written without waiting for the read timeout
+        assert sim.command_delay(CommandID.START_SAMPLING, start) < device.transport.timeout
+        latencies = []
+        for _ in range(15):
+            sample = device.read(1, timeout=1.0)[0]
+            latencies.append(time.monotonic() - sim.sent[sample.count])
+        start = time.monotonic()
+        device.stop_continuos()
+        assert sim.command_delay(CommandID.STOP_SAMPLING, start) < device.transport.timeout
+    finally:
+        device.stop()
+    return latencies
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="pseudo-terminals are POSIX only")
+def test_low_latency():
+    with _PtyDevice(sample_rate=25) as sim:
+        low_latencies = _sample_latencies(sim, low_latency=True)
+        # samples wait for the read timeout by default
+        latencies = _sample_latencies(sim, low_latency=False)
+    assert statistics.median(low_latencies) < statistics.median(latencies) / 2
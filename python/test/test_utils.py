@@ -1,6 +1,7 @@
 import os
 from tempfile import TemporaryDirectory
 
+from picoquake.data import IMUSample
 from picoquake.utils import *
 
 
@@ -30,6 +31,14 @@ def test_deque_get_last_n():
     assert deque_get_last_n(d, -1) == []
 
 
+def test_deque_get_after():
+    d = deque(IMUSample(i, 0, 0, 0, 0, 0, 0) for i in range(5, 10))
+    assert [s.count for s in deque_get_after(d, 7)] == [8, 9]
+    assert [s.count for s in deque_get_after(d, -1)] == [5, 6, 7, 8, 9]
+    assert deque_get_after(d, 9) == []
+    assert deque_get_after(deque(), 0) == []
+
+
 def test_deque_slice():
     dq = deque([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
     test_slices = [(None, None), (None, 3), (0, 3), (0, 10), (3, 7),